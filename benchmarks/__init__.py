@@ -0,0 +1,6 @@
+"""
+Micro-benchmarks for Mongothon's hot paths. None of these need a database;
+run them from the repository root, e.g.:
+
+    python -m benchmarks.hydration
+"""
@@ -0,0 +1,72 @@
+"""Shared fixtures for the benchmarks."""
+
+import timeit
+from datetime import datetime
+from bson import ObjectId
+from mongothon import create_model_offline, Schema, Array
+
+
+line_item_schema = Schema({
+    "sku":          {"type": basestring, "required": True},
+    "name":         {"type": basestring},
+    "quantity":     {"type": int, "default": 1},
+    "price":        {"type": float, "required": True},
+    "tags":         {"type": Array(basestring)}
+})
+
+order_schema = Schema({
+    "customer":     {"type": Schema({
+        "name":         {"type": basestring, "required": True},
+        "email":        {"type": basestring},
+        "address":      {"type": Schema({
+            "street":       {"type": basestring},
+            "city":         {"type": basestring},
+            "postcode":     {"type": basestring}
+        })}
+    }), "required": True},
+    "items":        {"type": Array(line_item_schema)},
+    "total_due":    {"type": float},
+    "status":       {"type": basestring, "default": "new"},
+    "created_date": {"type": datetime}
+})
+
+
+def create_order_model():
+    """Creates an Order model which isn't backed by a real collection."""
+    return create_model_offline(order_schema, lambda: None, 'Order')
+
+
+def sample_order(i, num_items=10):
+    """Returns a raw order document, as pymongo would return it."""
+    return {
+        u"_id": ObjectId(),
+        u"customer": {
+            u"name": u"Customer {}".format(i),
+            u"email": u"customer{}@example.com".format(i),
+            u"address": {
+                u"street": u"{} High Street".format(i),
+                u"city": u"London",
+                u"postcode": u"N1 1AA"
+            }
+        },
+        u"items": [{
+            u"sku": u"SKU-{}".format(n),
+            u"name": u"Item {}".format(n),
+            u"quantity": n,
+            u"price": 9.99 * n,
+            u"tags": [u"red", u"large"]
+        } for n in range(num_items)],
+        u"total_due": 549.45,
+        u"status": u"new",
+        u"created_date": datetime(2014, 1, 1)
+    }
+
+
+def best_of(fn, repeat=5, number=1):
+    """Returns the best wall-clock time of `repeat` runs of `fn`, in seconds."""
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def report(label, seconds, count, unit='doc'):
+    print("{:<45} {:>10.2f} ms {:>10.2f} us/{}".format(
+        label, seconds * 1000, seconds * 1e6 / count, unit))
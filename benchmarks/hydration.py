@@ -0,0 +1,33 @@
+"""
+Compares the per-document cost of turning a 10k document query result into
+models through the regular constructor and through Model.hydrate, the path
+used by find_one and cursors.
+
+    python -m benchmarks.hydration
+"""
+
+from mongothon.model import CursorWrapper
+from .common import create_order_model, sample_order, best_of, report
+
+
+NUM_DOCS = 10000
+
+
+def main():
+    Order = create_order_model()
+    docs = [sample_order(i) for i in range(NUM_DOCS)]
+
+    def construct():
+        for doc in docs:
+            Order(doc, initial_state=Order.PERSISTED)
+
+    def scan():
+        for order in CursorWrapper(docs, Order):
+            pass
+
+    report("constructor (PERSISTED)", best_of(construct), NUM_DOCS)
+    report("cursor scan (Model.hydrate)", best_of(scan), NUM_DOCS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measures the memory held per document by 10k models loaded through a cursor:
+straight after loading, once every field has been read and once a field of
+each has been changed, as well as by models built through the constructor.
+The sizes include the raw documents the models are built from, which are
+given on their own for comparison.
+
+    python -m benchmarks.memory
+"""
+
+import gc
+import sys
+import types
+from mongothon.model import CursorWrapper
+from .common import create_order_model, sample_order
+
+
+NUM_DOCS = 10000
+
+
+def deep_sizeof(root):
+    """
+    Returns the total size in bytes of the given object and everything it
+    references, excluding classes and modules.
+    """
+    seen = set()
+    stack = [root]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+def read_all(value):
+    """Reads every nested value, as e.g. serializing a model would."""
+    if isinstance(value, dict):
+        for item in value.itervalues():
+            read_all(item)
+    elif isinstance(value, list):
+        for item in value:
+            read_all(item)
+
+
+def report(label, size):
+    print("{:<45} {:>10.2f} MB {:>10.0f} bytes/doc".format(
+        label, size / 1e6, float(size) / NUM_DOCS))
+
+
+def main():
+    Order = create_order_model()
+    docs = [sample_order(i) for i in range(NUM_DOCS)]
+    report("raw documents", deep_sizeof(docs))
+
+    orders = list(CursorWrapper(docs, Order))
+    report("hydrated", deep_sizeof(orders))
+
+    for order in orders:
+        read_all(order)
+    report("hydrated, all fields read", deep_sizeof(orders))
+
+    for order in orders:
+        order['customer']['address']['city'] = u"Paris"
+        order['items'].append({u"sku": u"SKU-X", u"price": 1.0})
+    report("hydrated, changed", deep_sizeof(orders))
+    del orders
+
+    orders = [Order(doc, initial_state=Order.PERSISTED) for doc in docs]
+    report("constructor (PERSISTED)", deep_sizeof(orders))
+
+
+if __name__ == '__main__':
+    main()
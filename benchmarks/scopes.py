@@ -0,0 +1,76 @@
+"""
+Measures the cost of building 5-step scope chains, as an API handling many
+requests per second would for every request, and of merging them into a
+query. No queries are run.
+
+    python -m benchmarks.scopes
+"""
+
+from datetime import datetime
+from bson import ObjectId
+from mongothon.queries import deep_merge
+from .common import create_order_model, best_of, report
+
+
+NUM_CHAINS = 10000
+
+
+def main():
+    Order = create_order_model()
+
+    @Order.scope
+    def for_customer(name):
+        return {'customer.name': name}
+
+    @Order.scope
+    def with_status(*statuses):
+        return {'status': {'$in': list(statuses)}}
+
+    @Order.scope
+    def since(date):
+        return {'created_date': {'$gte': date}}
+
+    @Order.scope
+    def summary():
+        return {}, {'customer.name': 1, 'total_due': 1, 'status': 1}
+
+    @Order.scope
+    def recent(n):
+        return {}, {}, {'sort': [('created_date', -1)], 'limit': n}
+
+    @Order.scope
+    def with_ids(ids):
+        return {'_id': {'$in': ids}}
+
+    date = datetime(2014, 1, 1)
+    ids = [ObjectId() for i in range(10000)]
+
+    def chains():
+        for i in range(NUM_CHAINS):
+            Order.for_customer('Customer').with_status('new', 'paid') \
+                .since(date).summary().recent(20)
+
+    def merged_chains():
+        for i in range(NUM_CHAINS):
+            Order.for_customer('Customer').with_status('new', 'paid') \
+                .since(date).summary().recent(20).query
+
+    def large_in_chains():
+        for i in range(NUM_CHAINS // 100):
+            Order.with_ids(ids).with_status('new', 'paid') \
+                .since(date).summary().recent(20).query
+
+    report("5-step scope chain", best_of(chains), NUM_CHAINS, 'chain')
+    report("5-step scope chain, merged", best_of(merged_chains), NUM_CHAINS, 'chain')
+    report("5-step chain with 10k $in, merged", best_of(large_in_chains),
+           NUM_CHAINS // 100, 'chain')
+
+    other_ids = ids[5000:] + [ObjectId() for i in range(5000)]
+
+    def merge_in_lists():
+        deep_merge({'_id': {'$in': other_ids}}, {'_id': {'$in': list(ids)}})
+
+    report("deep_merge of two 10k $in lists", best_of(merge_in_lists), 1, 'merge')
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
 import inspect
 from inflection import camelize
 from document import Document
-from model import Model, NotFoundException
+from model import Model, NotFoundException, BulkSaveException
+from exceptions import UnindexedQueryException
+from indexes import Index
+from queries import WriteBatch
+from session import Session
 from schema import Schema
 from schemer import Mixed, ValidationException, Array
 
@@ -16,7 +20,7 @@ def _module_name_from_previous_frame(num_frames_back):
     return inspect.getmodule(frm[0]).__name__
 
 
-def create_model(schema, collection, class_name=None):
+def create_model(schema, collection, class_name=None, indexes=()):
     """
     Main entry point to creating a new mongothon model. Both
     schema and Pymongo collection objects must be provided.
@@ -27,13 +31,17 @@ def create_model(schema, collection, class_name=None):
     from the provided collection (converted to camel case).
     Optionally, a class_name argument can be provided to
     override this.
+
+    The collection's indexes can be declared alongside the schema, as a
+    list of mongothon.Index objects (see Model.ensure_indexes).
     """
     if not class_name:
         class_name = camelize(str(collection.name))
 
     model_class = type(class_name,
                        (Model,),
-                       dict(schema=schema, _collection_factory=staticmethod(lambda: collection)))
+                       dict(schema=schema, indexes=list(indexes),
+                            _collection_factory=staticmethod(lambda: collection)))
 
     # Since we are dynamically creating this class here, we modify __module__ on the
     # created class to point back to the module from which `create_model` was called
@@ -42,7 +50,7 @@ def create_model(schema, collection, class_name=None):
     return model_class
 
 
-def create_model_offline(schema, collection_factory, class_name):
+def create_model_offline(schema, collection_factory, class_name, indexes=()):
     """
     Entry point for creating a new Mongothon model without instantiating
     a database connection. The collection is instead provided through a closure
@@ -50,7 +58,8 @@ def create_model_offline(schema, collection_factory, class_name):
     """
     model_class = type(class_name,
                        (Model,),
-                       dict(schema=schema, _collection_factory=staticmethod(collection_factory)))
+                       dict(schema=schema, indexes=list(indexes),
+                            _collection_factory=staticmethod(collection_factory)))
 
     # Since we are dynamically creating this class here, we modify __module__ on the
     # created class to point back to the module from which `create_model_offline` was called
@@ -0,0 +1,336 @@
+"""
+Asynchronous models for Tornado applications, backed by a collection from
+motor's Tornado API (or anything with the same interface, i.e. whose methods
+return Futures). Python 2 has no asyncio, so the awaitable methods here are
+Tornado coroutines, to be yielded from within other coroutines:
+
+    Car = create_async_model(car_schema, motor_db.cars)
+
+    @gen.coroutine
+    def rename(car_id):
+        car = yield Car.find_by_id(car_id)
+        car['make'] = 'Volvo'
+        yield car.save()
+
+        cursor = Car.find({'make': 'Volvo'})
+        while (yield cursor.fetch_next):
+            car = cursor.next_object()
+
+        cars = yield Car.find({'make': 'Volvo'}).to_list()
+        cars = yield Car.by_make('Volvo')   # scopes can be yielded directly
+        if (yield Car.by_make('Volvo').exists()):
+            yield Car.by_make('Volvo').update_all({'$set': {'checked': True}})
+
+Event handlers may be coroutines too, in which case the lifecycle methods
+(find_one, find_by_id, find, validate, save, remove, update_instance and
+reload) wait for them to complete. Events emitted synchronously, i.e. did_init
+when a model is constructed, the apply_defaults events and those passed to
+emit, can't wait for them: a handler returning a Future raises a TypeError.
+
+This module requires Tornado.
+"""
+
+from collections import deque
+from inflection import camelize
+from tornado import gen
+from tornado.concurrent import is_future
+from . import _module_name_from_previous_frame
+from .model import Model, CursorWrapper
+from .queries import ScopeBuilder
+from .exceptions import NotFoundException
+
+
+def _sync_only(name):
+    """
+    Returns a method which raises a TypeError, standing in for the method of
+    the given name which only synchronous models support.
+    """
+    def sync_only(*args, **kwargs):
+        raise TypeError("{} is only supported by synchronous models".format(name))
+    sync_only.__name__ = name
+    return sync_only
+
+
+class AsyncScopeBuilder(ScopeBuilder):
+    """
+    Scope builder for asynchronous models. exists, update_all and delete_all
+    are coroutines, and first and count return Futures. Pagination, cached
+    scopes, explain, splitting $in lists and batched writes are only
+    supported by synchronous models, and raise a TypeError.
+    """
+
+    # Splitting scopes with long $in lists relies on synchronous cursors.
+    split_in_threshold = None
+
+    @gen.coroutine
+    def exists(self):
+        """See ScopeBuilder.exists."""
+        kwargs = {'hint': self.options['hint']} if 'hint' in self.options else {}
+        cursor = self.model.collection.find(self.query, {'_id': 1}, **kwargs).limit(1)
+        raise gen.Return(bool((yield cursor.to_list(1))))
+
+    @gen.coroutine
+    def update_all(self, update, batch_size=None, **kwargs):
+        """See ScopeBuilder.update_all. batch_size isn't supported."""
+        if batch_size:
+            raise TypeError("Batched update_all is only supported by synchronous models")
+        result = yield self.model.collection.update_many(self.query, update, **kwargs)
+        raise gen.Return(result.matched_count)
+
+    @gen.coroutine
+    def delete_all(self, batch_size=None, **kwargs):
+        """See ScopeBuilder.delete_all. batch_size isn't supported."""
+        if batch_size:
+            raise TypeError("Batched delete_all is only supported by synchronous models")
+        result = yield self.model.collection.delete_many(self.query, **kwargs)
+        raise gen.Return(result.deleted_count)
+
+    paginate = _sync_only('paginate')
+    cached = _sync_only('cached')
+    explain = _sync_only('explain')
+    split = _sync_only('split')
+
+
+class AsyncModel(Model):
+    """
+    Model base class for asynchronous models, see create_async_model.
+
+    Sessions, caching, find_by_ids, save_many and raw reads are only
+    supported by synchronous models; the corresponding methods raise a
+    TypeError. So do some scope methods, see AsyncScopeBuilder.
+    """
+
+    @classmethod
+    @gen.coroutine
+    def _hydrate_async(cls, document):
+        model = cls._from_db(document)
+        yield model.emit_async('did_init')
+        yield model.emit_async('did_find')
+        raise gen.Return(model)
+
+    @gen.coroutine
+    def _emit_async(self, event, document, *args, **kwargs):
+        """
+        Asynchronous version of _emit, which waits for any handlers which
+        return a Future before calling the next.
+        """
+        for fn in list(self.handlers(event)):
+            result = fn(document, *args, **kwargs)
+            if is_future(result):
+                yield result
+
+    def _emit(self, event, document, *args, **kwargs):
+        """
+        Synchronous _emit, which raises a TypeError for handlers which return
+        a Future, since they can't be waited for.
+        """
+        for fn in list(self.handlers(event)):
+            if is_future(fn(document, *args, **kwargs)):
+                raise TypeError("A handler of {} returned a Future, but the event "
+                                "was emitted synchronously; use emit_async".format(event))
+
+    def emit_async(self, event, *args, **kwargs):
+        """
+        Emits the given event like emit, returning a Future which completes
+        once every handler (including coroutines) has.
+        """
+        return self._emit_async(event, self, *args, **kwargs)
+
+    @classmethod
+    @gen.coroutine
+    def find_one(cls, *args, **kwargs):
+        obj = yield cls.collection.find_one(*args, **kwargs)
+        if obj:
+            raise gen.Return((yield cls._hydrate_async(obj)))
+        raise gen.Return(None)
+
+    @classmethod
+    @gen.coroutine
+    def find_by_id(cls, id):
+        obj = yield cls.find_one(cls._id_spec(id))
+        if not obj:
+            raise NotFoundException(cls.collection, id)
+        raise gen.Return(obj)
+
+    @classmethod
+    def find(cls, *args, **kwargs):
+        return AsyncCursorWrapper(cls.collection.find(*args, **kwargs), cls)
+
+    @classmethod
+    def update(cls, spec, document, multi=False, **kwargs):
+        """
+        Updates the documents matching the given spec, using update_one or
+        update_many if the given document consists of update operators, or
+        replace_one otherwise. Returns a Future.
+        """
+        if document and all(key.startswith('$') for key in document):
+            method = cls.collection.update_many if multi else cls.collection.update_one
+        else:
+            method = cls.collection.replace_one
+        return method(spec, document, **kwargs)
+
+    @gen.coroutine
+    def validate(self):
+        yield self._do_validate_async(self._create_working())
+
+    @gen.coroutine
+    def _do_validate_async(self, document):
+        yield self._emit_async('will_validate', document)
+        self.schema.validate(document)
+        yield self._emit_async('did_validate', document)
+
+    @gen.coroutine
+    def save(self, **kwargs):
+        """
+        Saves the model as Model.save does, passing any keyword arguments on
+        to the collection's insert_one, replace_one or update_one.
+        """
+        working = self._create_working()
+        yield self._do_validate_async(working)
+
+        yield self._emit_async('will_save', working)
+
+        update = self._partial_update(working)
+        if update is None:
+            if '_id' in working:
+                yield self.collection.replace_one({'_id': working['_id']}, working,
+                                                  upsert=True, **kwargs)
+            else:
+                yield self.collection.insert_one(working, **kwargs)
+        elif update:
+            yield self.collection.update_one({'_id': working['_id']}, update, **kwargs)
+        self._state = Model.PERSISTED
+
+        yield self._emit_async('did_save', working)
+
+        self._populate(working)
+
+    @gen.coroutine
+    def remove(self, **kwargs):
+        yield self.emit_async('will_remove', **kwargs)
+        yield self.collection.delete_one({'_id': self['_id']}, **kwargs)
+        yield self.emit_async('did_remove', **kwargs)
+        self._state = Model.DELETED
+
+    @gen.coroutine
+    def update_instance(self, *args, **kwargs):
+        yield self.emit_async('will_update', *args, **kwargs)
+        result = yield type(self).update({'_id': self['_id']}, *args, **kwargs)
+        yield self.emit_async('did_update', *args, **kwargs)
+        raise gen.Return(result)
+
+    @gen.coroutine
+    def reload(self):
+        yield self.emit_async('will_reload')
+        self._populate((yield self.collection.find_one(type(self)._id_spec(self['_id']))))
+        yield self.emit_async('did_reload')
+
+    _scope_builder_base = AsyncScopeBuilder
+
+    find_by_ids = classmethod(_sync_only('find_by_ids'))
+    save_many = classmethod(_sync_only('save_many'))
+    enable_cache = classmethod(_sync_only('enable_cache'))
+    read_only = classmethod(_sync_only('read_only'))
+    session = classmethod(_sync_only('session'))
+
+
+class AsyncCursorWrapper(object):
+    """
+    Asynchronous counterpart of CursorWrapper for motor cursors. Documents
+    are fetched `batch_size` at a time, and the next batch is requested as
+    soon as the previous one arrives so that it's usually ready by the time
+    it is needed.
+
+        while (yield cursor.fetch_next):
+            model = cursor.next_object()
+
+        models = yield cursor.to_list()
+    """
+    RETURNS_CURSOR = CursorWrapper.RETURNS_CURSOR
+
+    def __init__(self, wrapped_cursor, model_class, batch_size=100):
+        self._wrapped = wrapped_cursor
+        self._model_class = model_class
+        self._batch_size = batch_size
+        self._buffer = deque()
+        self._next_batch = None
+        self._exhausted = False
+
+    def batch_size(self, batch_size):
+        return AsyncCursorWrapper(self._wrapped.batch_size(batch_size),
+                                  self._model_class, batch_size)
+
+    def raw(self):
+        """Returns the underlying motor cursor, see CursorWrapper.raw."""
+        return self._wrapped
+
+    @property
+    def fetch_next(self):
+        """
+        A Future which resolves to True once the next model is available
+        through next_object, or to False if there are no more.
+        """
+        return self._fetch_next()
+
+    @gen.coroutine
+    def _fetch_next(self):
+        if not self._buffer and not self._exhausted:
+            if self._next_batch is None:
+                self._next_batch = self._wrapped.to_list(self._batch_size)
+            documents = yield self._next_batch
+            self._next_batch = None
+            if len(documents) < self._batch_size:
+                self._exhausted = True
+            else:
+                # Prefetch the following batch while this one is being used
+                self._next_batch = self._wrapped.to_list(self._batch_size)
+            for document in documents:
+                self._buffer.append((yield self._model_class._hydrate_async(document)))
+        raise gen.Return(bool(self._buffer))
+
+    def next_object(self):
+        """Returns the model made available by fetch_next, or None."""
+        if self._buffer:
+            return self._buffer.popleft()
+        return None
+
+    @gen.coroutine
+    def to_list(self, length=None):
+        """Returns a list of up to `length` models (or all of them)."""
+        models = []
+        while (length is None or len(models) < length) and (yield self.fetch_next):
+            models.append(self.next_object())
+        raise gen.Return(models)
+
+    def __getattr__(self, name):
+        attr = getattr(self._wrapped, name)
+        if name in self.RETURNS_CURSOR:
+            def attr_wrapper(*args, **kwargs):
+                return AsyncCursorWrapper(attr(*args, **kwargs), self._model_class,
+                                          self._batch_size)
+
+            return attr_wrapper
+        return attr
+
+
+if hasattr(gen.convert_yielded, 'register'):
+    # Allows scopes of asynchronous models to be yielded directly, resolving to
+    # a list of all the models they match.
+    @gen.convert_yielded.register(ScopeBuilder)
+    def _convert_scope(builder):
+        return builder.to_list()
+
+
+def create_async_model(schema, collection, class_name=None):
+    """
+    Creates a new asynchronous model class, backed by the given motor
+    collection, in the same way as mongothon.create_model.
+    """
+    if not class_name:
+        class_name = camelize(str(collection.name))
+
+    model_class = type(class_name,
+                       (AsyncModel,),
+                       dict(schema=schema, _collection_factory=staticmethod(lambda: collection)))
+    model_class.__module__ = _module_name_from_previous_frame(1)
+    return model_class
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend(object):
+    """
+    Interface for the stores used to cache documents (see Model.enable_cache).
+    Keys are strings and values are byte strings (BSON-encoded documents), so
+    that a backend can be implemented on top of an external store such as
+    memcached or redis as easily as in-process.
+
+    Backends may be used from several threads at once.
+    """
+
+    def get(self, key):
+        """Returns the value stored against the given key, or None."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores the given value against the given key, for at most `ttl`
+        seconds if given.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Removes the value stored against the given key, if any."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Removes all values."""
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """
+    In-process cache backend holding up to `max_size` values, evicting the
+    least recently used value to make room for new ones. Values expire after
+    `ttl` seconds, unless a different ttl is given when they are set; by
+    default they never do.
+    """
+
+    def __init__(self, max_size=1000, ttl=None, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= self._clock():
+                return None
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,135 @@
+"""
+Columnar export of query results, see CursorWrapper.to_columns.
+
+Columns are numpy arrays when numpy is installed, and array.array buffers
+otherwise.
+"""
+
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Capacity of numpy columns before the first document is read; they double in
+# size whenever they fill up.
+INITIAL_CAPACITY = 1024
+
+# Used for fields without a dtype.
+DEFAULT_DTYPE = 'd'
+
+
+class Columns(dict):
+    """
+    The result of to_columns: a dict of field paths to columns of values, one
+    value per document. Documents in which a field is missing or null have
+    a zero (or None) in that field's column and True in its mask, in
+    `masks`. The number of documents read is in `length`.
+    """
+
+    def __init__(self, columns, masks, length):
+        super(Columns, self).__init__(columns)
+        self.masks = masks
+        self.length = length
+
+
+def _get_path(document, path):
+    """
+    Returns the value at the given list of keys in the given document, or None
+    if there isn't one. Numeric keys index into lists.
+    """
+    value = document
+    for key in path:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+class _Column(object):
+    """Accumulates the values of one field in an array.array or a list."""
+
+    def __init__(self, dtype):
+        if dtype is object:
+            self.values, self.null = [], None
+        else:
+            self.values, self.null = array(dtype), array(dtype, [0])[0]
+        self.mask = array('b')
+
+    def append(self, value):
+        if value is None:
+            self.values.append(self.null)
+            self.mask.append(True)
+        else:
+            self.values.append(value)
+            self.mask.append(False)
+
+    def finish(self, length):
+        return self.values, self.mask
+
+
+class _NumpyColumn(object):
+    """
+    Accumulates the values of one field in a preallocated numpy array,
+    growing it as needed.
+    """
+
+    def __init__(self, dtype):
+        self.values = numpy.zeros(INITIAL_CAPACITY, dtype=dtype)
+        self.mask = numpy.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.values):
+            self.values = numpy.resize(self.values, 2 * self.size)
+            self.mask = numpy.resize(self.mask, 2 * self.size)
+        if value is None:
+            self.values[self.size] = self.values.dtype.type()
+            self.mask[self.size] = True
+        else:
+            self.values[self.size] = value
+            self.mask[self.size] = False
+        self.size += 1
+
+    def finish(self, length):
+        return self.values[:length].copy(), self.mask[:length].copy()
+
+
+def to_columns(documents, fields, dtypes=None, use_numpy=None):
+    """
+    Reads the given fields out of the given documents into columns, returning
+    a Columns instance. Fields may be dotted paths into embedded documents
+    (or lists, by index).
+
+    `dtypes` maps fields to their column type: a numpy dtype for numpy
+    columns, or an array.array typecode otherwise. Fields default to
+    double-precision floats. `object` keeps any values, in an object array or
+    a list. numpy is used if it is installed, unless use_numpy is False.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("numpy is not installed")
+    column_class = _NumpyColumn if use_numpy else _Column
+
+    dtypes = dtypes or {}
+    paths = [(field, field.split('.')) for field in fields]
+    columns = [column_class(dtypes.get(field, DEFAULT_DTYPE)) for field in fields]
+
+    length = 0
+    for document in documents:
+        for (field, path), column in zip(paths, columns):
+            column.append(_get_path(document, path))
+        length += 1
+
+    values, masks = {}, {}
+    for field, column in zip(fields, columns):
+        values[field], masks[field] = column.finish(length)
+    return Columns(values, masks, length)
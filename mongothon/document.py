@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from copy import deepcopy
 
 def wrap(value):
@@ -14,19 +15,91 @@ def wrap(value):
         return value
 
 
+def hydrate(value):
+    """
+    Like wrap, but builds any Documents and DocumentLists straight from the
+    given raw value without change tracking, leaving the nested values to be
+    wrapped when they are first accessed. Intended for values which are known
+    to be unchanged and which nothing else holds on to, such as documents
+    loaded from Mongo.
+    """
+    if isinstance(value, Document) or isinstance(value, DocumentList):
+        return value
+    elif isinstance(value, dict):
+        return Document.hydrate(value)
+    elif isinstance(value, list):
+        return DocumentList.hydrate(value)
+    else:
+        return value
+
+
+def join_path(prefix, key):
+    """
+    Appends the given key (or list index) to the given dotted path prefix.
+    """
+    if prefix:
+        return u"{}.{}".format(prefix, key)
+    return key
+
+
+def shared_ids(values):
+    """
+    Returns the ids of the Documents and DocumentLists among the given values.
+    """
+    return set(id(value) for value in values
+               if isinstance(value, Document) or isinstance(value, DocumentList))
+
+
 def unwrap(value):
     """
-    Unwraps the given Document or DocumentList as applicable.
+    Unwraps the given Document or DocumentList as applicable. Raw dicts and
+    lists which haven't been wrapped yet are copied, so that changes to the
+    result never reach the document they came from.
     """
     if isinstance(value, Document):
         return value.to_dict()
     elif isinstance(value, DocumentList):
         return value.to_list()
+    elif isinstance(value, (dict, list)):
+        return deepcopy(value)
     else:
         return value
 
 
+def _get_slots_state(self):
+    """__getstate__ for the slotted trackers, which pickle can't handle otherwise."""
+    return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+def _set_slots_state(self, state):
+    for name, value in state.iteritems():
+        setattr(self, name, value)
+
+
+def _unpickle(cls, values):
+    """
+    Rebuilds a pickled Document or DocumentList from its contents without
+    recording them as changes. The change tracking state is restored
+    afterwards, from the instance's __dict__.
+    """
+    instance = cls.__new__(cls)
+    if isinstance(instance, Document):
+        dict.update(instance, values)
+    else:
+        list.extend(instance, values)
+    return instance
+
+
 class ChangeTracker(object):
+    """
+    Records the fields added to, changed on and deleted from a Document. Documents
+    only create a tracker when they're first changed, so that the many which are
+    just read never pay for one.
+    """
+    __slots__ = ('_instance', '_added', '_previous', '_deleted')
+    __getstate__ = _get_slots_state
+    __setstate__ = _set_slots_state
+
     def __init__(self, instance):
         self._instance = instance
         self.reset_changes()
@@ -36,13 +109,14 @@ class ChangeTracker(object):
         Resets the document's internal change-tracking state. All field additions,
         changes and deletions are forgotten.
         """
-        self._added = []
+        # An ordered set of the added keys (the values are unused).
+        self._added = OrderedDict()
         self._previous = {}
         self._deleted = {}
 
     def update(self, other):
         self.reset_changes()
-        self._added.extend(other._added)
+        self._added.update(other._added)
         self._previous.update(other._previous)
         self._deleted.update(other._deleted)
 
@@ -53,9 +127,11 @@ class ChangeTracker(object):
         deleted or added to ensure the change state purely reflects the diff since
         last reset.
         """
+        current = dict.__getitem__(self._instance, key)
+
         # If we're changing the value and we haven't done so already, note it.
-        if value != self._instance[key] and key not in self._previous and key not in self._added:
-            self._previous[key] = self._instance[key]
+        if value != current and key not in self._previous and key not in self._added:
+            self._previous[key] = current
 
         # If we're setting the value back to the original value, discard the change note
         if key in self._previous and value == self._previous[key]:
@@ -73,7 +149,7 @@ class ChangeTracker(object):
                 self._previous[key] = self._deleted[key]
             del self._deleted[key]
         else:
-            self._added.append(key)
+            self._added[key] = None
 
     def note_deletion(self, key):
         """
@@ -81,14 +157,14 @@ class ChangeTracker(object):
         """
         # If we'rew deleting a key we previously added, then there is no diff
         if key in self._added:
-            self._added.remove(key)
+            del self._added[key]
         else:
             # If the deleted key was previously changed, use the original value
             if key in self._previous:
                 self._deleted[key] = self._previous[key]
                 del self._previous[key]
             else:
-                self._deleted[key] = self._instance[key]
+                self._deleted[key] = dict.__getitem__(self._instance, key)
 
     @property
     def changed(self):
@@ -140,23 +216,63 @@ class Document(dict):
     Subclass of dict which adds some useful functionality around change tracking.
     """
 
+    # Set on documents which may hold values that haven't been wrapped yet or
+    # which are still shared with another document; such values are dealt
+    # with as they're accessed (see _materialize).
+    _lazy = False
+
+    # Ids of the nested values still shared with the document this one was
+    # copied from, see copy_on_write.
+    _cow_shared = None
+
+    # Created on the first change, see _tracker.
+    _change_tracker = None
+
     def __init__(self, initial=None, **kwargs):
+        # The initial contents are the baseline for change tracking, so they're
+        # stored directly rather than recorded as additions.
         if initial:
-            self.update(initial, **kwargs)
-        elif kwargs:
-            self.update(**kwargs)
-        self.reset_changes()
+            for key in initial:
+                dict.__setitem__(self, key, wrap(initial[key]))
+        for key, value in kwargs.iteritems():
+            dict.__setitem__(self, key, wrap(value))
 
     @property
     def _tracker(self):
-        try:
-            return self._change_tracker
-        except AttributeError:
+        """The document's change tracker, created on first use."""
+        if self._change_tracker is None:
             self._change_tracker = ChangeTracker(self)
-            return self._change_tracker
+        return self._change_tracker
+
+    @property
+    def _changes(self):
+        """
+        The document's change tracker, or an empty one (which must not be changed)
+        if the document has never been changed.
+        """
+        return self._change_tracker or _UNCHANGED
+
+    @classmethod
+    def hydrate(cls, values):
+        """
+        Creates a new instance holding the given values, e.g. a document loaded
+        from Mongo, bypassing __init__ and change tracking altogether. Nested
+        dicts and lists are only wrapped once they are accessed, so the given
+        values shouldn't be changed afterwards.
+        """
+        document = cls.__new__(cls)
+        document._fill(values)
+        return document
+
+    def _fill(self, values):
+        """Adds the given values to this document without tracking or wrapping them."""
+        dict.update(self, values)
+        self._lazy = True
 
     def reset_changes(self):
-        self._tracker.reset_changes()
+        # A document which has never been changed has nothing to reset.
+        if self._change_tracker is not None:
+            self._change_tracker.reset_changes()
 
     def reset_all_changes(self):
         """
@@ -164,30 +280,109 @@ class Document(dict):
         DocumentLists.
         """
         self.reset_changes()
-        for value in self.values():
+        # Resetting establishes a new baseline, after which this document owns
+        # everything it holds.
+        if self._cow_shared is not None:
+            self._cow_shared = None
+        for value in dict.itervalues(self):
             if isinstance(value, Document) or isinstance(value, DocumentList):
                 value.reset_all_changes()
 
+    def __reduce_ex__(self, protocol):
+        # Pickle would otherwise rebuild the contents through __setitem__,
+        # tracking them as additions on documents without a tracker.
+        return _unpickle, (type(self), dict(self)), self.__dict__ or None
+
     def __deepcopy__(self, memo):
         clone = type(self)(deepcopy(dict(self), memo))
-        clone._tracker.update(self._tracker)
+        if self._change_tracker is not None:
+            clone._tracker.update(self._change_tracker)
+        return clone
+
+    def copy_on_write(self):
+        """
+        Returns a shallow copy of this document (of the same type) which shares
+        its nested Documents and DocumentLists with the original until they are
+        first accessed through the copy, at which point they are copied in the
+        same way. Changes made through the copy never reach the original, and
+        the cost of the copy is proportional to how much of it is actually used.
+        Change tracking state is carried over to the copy.
+
+        The original should not be changed while the copy is in use.
+        """
+        cls = type(self)
+        clone = cls.__new__(cls)
+        dict.update(clone, self)
+        clone.__dict__.update(self.__dict__)
+        if self._change_tracker is not None:
+            clone._change_tracker = ChangeTracker(clone)
+            clone._change_tracker.update(self._change_tracker)
+        clone._cow_shared = shared_ids(dict.itervalues(self))
+        clone._lazy = True
         return clone
 
+    def _materialize(self, key, value):
+        """
+        Makes sure the given value, stored under the given key, is ready to be
+        handed out: raw dicts and lists are wrapped, and values still shared
+        with the document this one was copied from are replaced with copies.
+        """
+        if isinstance(value, Document) or isinstance(value, DocumentList):
+            if not self._cow_shared or id(value) not in self._cow_shared:
+                return value
+            self._cow_shared.discard(id(value))
+            value = value.copy_on_write()
+        elif isinstance(value, (dict, list)):
+            value = hydrate(value)
+        else:
+            return value
+        dict.__setitem__(self, key, value)
+        return value
+
     @property
     def changed(self):
-        return self._tracker.changed
+        return self._changes.changed
 
     @property
     def changes(self):
-        return self._tracker.changes
+        return self._changes.changes
 
     @property
     def added(self):
-        return self._tracker.added
+        return self._changes.added
 
     @property
     def deleted(self):
-        return self._tracker.deleted
+        if self._change_tracker is None:
+            return {}
+        return self._change_tracker.deleted
+
+    def __getitem__(self, key):
+        value = super(Document, self).__getitem__(key)
+        if self._lazy:
+            return self._materialize(key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def iteritems(self):
+        if not self._lazy:
+            return super(Document, self).iteritems()
+        return ((key, self[key]) for key in self.keys())
+
+    def itervalues(self):
+        if not self._lazy:
+            return super(Document, self).itervalues()
+        return (self[key] for key in self.keys())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
 
     def __setitem__(self, key, value):
         if key in self:
@@ -210,56 +405,385 @@ class Document(dict):
                 self[key] = value
 
     def setdefault(self, key, default):
-        return super(Document, self).setdefault(key, wrap(default))
+        if key in self:
+            return self[key]
+        self[key] = default
+        return self[key]
+
+    def pop(self, key, *args):
+        if key not in self:
+            return super(Document, self).pop(key, *args)
+        value = self[key]
+        self._tracker.note_deletion(key)
+        super(Document, self).__delitem__(key)
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): dictionary is empty')
+        key = next(self.iterkeys())
+        return key, self.pop(key)
+
+    def clear(self):
+        if self:
+            tracker = self._tracker
+            for key in self.keys():
+                tracker.note_deletion(key)
+        super(Document, self).clear()
 
     def populate(self, other):
         """Like update, but clears the contents first."""
-        self.clear()
-        self.update(other)
+        super(Document, self).clear()
+        if other:
+            for key in other:
+                dict.__setitem__(self, key, wrap(other[key]))
+        self.reset_all_changes()
+
+    def _populate(self, values):
+        """
+        Like populate, but takes the given values (e.g. a working copy, or a
+        document just loaded from Mongo) as they are rather than copying them,
+        so nothing else should use them afterwards.
+        """
+        super(Document, self).clear()
+        if values:
+            self._fill(values)
         self.reset_all_changes()
 
     def to_dict(self):
         """
         Returns the contents of the Document as a raw dict. Also recurses
         into child Documents and DocumentLists converting those to dicts
-        and lists respectively.
+        and lists respectively. Nested values which have never been accessed
+        are still in their raw form, and are copied.
+        """
+        return {key: unwrap(value) for key, value in dict.iteritems(self)}
+
+    def to_update(self):
+        """
+        Returns a Mongo update document which, when applied to the stored copy
+        of this document, brings it in line with the changes made since it was
+        loaded or last saved. Nested Documents are reached into using dotted
+        paths, so only the fields which were actually touched are written.
+
+            doc['name'] = 'clive'
+            del doc['age']
+            doc['address']['city'] = 'London'
+            doc.to_update()     # => {'$set': {'name': 'clive', 'address.city': 'London'},
+                                #     '$unset': {'age': ''}}
+        """
+        update = {}
+        self._collect_update(None, update)
+        return update
+
+    def _collect_update(self, prefix, update):
+        tracker = self._changes
+        written = set(tracker._added) | set(tracker._previous)
+
+        for key in written:
+            update.setdefault('$set', {})[join_path(prefix, key)] = unwrap(dict.__getitem__(self, key))
+
+        for key in tracker._deleted:
+            update.setdefault('$unset', {})[join_path(prefix, key)] = ''
+
+        for key, value in dict.iteritems(self):
+            if key not in written and isinstance(value, (Document, DocumentList)):
+                value._collect_update(join_path(prefix, key), update)
+
+
+_UNCHANGED = ChangeTracker(None)
+
+
+class ListChangeTracker(object):
+    """
+    Tracks changes to a DocumentList in terms of the array update operators
+    Mongo offers: items appended to the end of the list ($push), scalar items
+    removed from it ($pull) and items replaced at a given index ($set on a
+    positional path). Mongo refuses to apply more than one of these to the
+    same array in a single update, so as soon as changes of different kinds
+    are mixed (or the list is changed in some other way, such as a sort or
+    an insert) the list is instead flagged to be rewritten in full.
+    """
+    __slots__ = ('_instance', '_rewrite', '_appended', '_pulled', '_replaced')
+    __getstate__ = _get_slots_state
+    __setstate__ = _set_slots_state
+
+    def __init__(self, instance):
+        self._instance = instance
+        self.reset_changes()
+
+    def reset_changes(self):
+        self._rewrite = False
+        self._appended = 0
+        self._pulled = []
+        self._replaced = set()
+
+    def update(self, other):
+        self._rewrite = other._rewrite
+        self._appended = other._appended
+        self._pulled = list(other._pulled)
+        self._replaced = set(other._replaced)
+
+    def _original_length(self):
+        return len(self._instance) - self._appended
+
+    def note_rewrite(self):
+        self._rewrite = True
+
+    def note_append(self, count=1):
+        if self._pulled or self._replaced:
+            self._rewrite = True
+        else:
+            self._appended += count
+
+    def note_replace(self, index):
+        """Notes the replacement of the item at the given (positive) index."""
+        if index >= self._original_length():
+            # The item was appended since the last reset and will be pushed
+            # with whatever value it holds at that point.
+            return
+        if self._appended or self._pulled:
+            self._rewrite = True
+        else:
+            self._replaced.add(index)
+
+    def note_removal(self, index):
+        """
+        Notes the removal of the item at the given (positive) index. Must be
+        called before the item is actually removed.
         """
-        return {key: unwrap(value) for key, value in self.iteritems()}
+        if index >= self._original_length():
+            self._appended -= 1
+            return
+
+        value = list.__getitem__(self._instance, index)
+        if self._appended or self._replaced or isinstance(value, (dict, list)):
+            self._rewrite = True
+        else:
+            self._pulled.append(value)
+
+    def collect_update(self, prefix, update):
+        """
+        Adds the operations needed to apply the changes to the tracked list,
+        stored at the given path, to the given update document.
+        """
+        instance = self._instance
+
+        # $pull removes every matching item, so it's only usable if none of the
+        # removed values are still present in the list.
+        if self._rewrite or any(value in instance for value in self._pulled):
+            update.setdefault('$set', {})[prefix] = instance.to_list()
+            return
+
+        original_length = self._original_length()
+        nested = {}
+        for index in xrange(original_length):
+            value = list.__getitem__(instance, index)
+            if index in self._replaced:
+                nested.setdefault('$set', {})[join_path(prefix, index)] = unwrap(value)
+            elif isinstance(value, (Document, DocumentList)):
+                value._collect_update(join_path(prefix, index), nested)
+
+        # Changes to existing items can't be combined with a $push or $pull.
+        if nested and (self._appended or self._pulled):
+            update.setdefault('$set', {})[prefix] = instance.to_list()
+            return
+
+        for operator, fields in nested.iteritems():
+            update.setdefault(operator, {}).update(fields)
+
+        if self._appended:
+            update.setdefault('$push', {})[prefix] = {
+                '$each': [unwrap(value) for value in
+                          list.__getitem__(instance, slice(original_length, None))]}
+
+        if self._pulled:
+            update.setdefault('$pull', {})[prefix] = {'$in': list(self._pulled)}
 
 
 class DocumentList(list):
     """
     Subclass of list which provides some additional details around change tracking.
     """
+
+    # See Document._lazy, Document._cow_shared and Document._change_tracker
+    _lazy = False
+    _cow_shared = None
+    _change_tracker = None
+
     def __init__(self, initial=None):
         if initial:
-            self.extend(initial)
+            list.extend(self, [wrap(value) for value in initial])
+
+    @property
+    def _tracker(self):
+        """The list's change tracker, created on first use."""
+        if self._change_tracker is None:
+            self._change_tracker = ListChangeTracker(self)
+        return self._change_tracker
+
+    @classmethod
+    def hydrate(cls, values):
+        """See Document.hydrate."""
+        document_list = cls.__new__(cls)
+        list.extend(document_list, values)
+        document_list._lazy = True
+        return document_list
+
+    def __reduce_ex__(self, protocol):
+        # See Document.__reduce_ex__
+        return _unpickle, (type(self), list(self)), self.__dict__ or None
+
+    def __deepcopy__(self, memo):
+        clone = type(self)(deepcopy(list(self), memo))
+        if self._change_tracker is not None:
+            clone._tracker.update(self._change_tracker)
+        return clone
+
+    def copy_on_write(self):
+        """
+        Returns a shallow copy of this list which shares its nested Documents and
+        DocumentLists with the original until they are accessed through the copy.
+        See Document.copy_on_write.
+        """
+        cls = type(self)
+        clone = cls.__new__(cls)
+        list.extend(clone, self)
+        clone.__dict__.update(self.__dict__)
+        if self._change_tracker is not None:
+            clone._change_tracker = ListChangeTracker(clone)
+            clone._change_tracker.update(self._change_tracker)
+        clone._cow_shared = shared_ids(list.__iter__(self))
+        clone._lazy = True
+        return clone
+
+    def _materialize(self, index, value):
+        """See Document._materialize."""
+        if isinstance(value, Document) or isinstance(value, DocumentList):
+            if not self._cow_shared or id(value) not in self._cow_shared:
+                return value
+            self._cow_shared.discard(id(value))
+            value = value.copy_on_write()
+        elif isinstance(value, (dict, list)):
+            value = hydrate(value)
+        else:
+            return value
+        list.__setitem__(self, index, value)
+        return value
+
+    def __getitem__(self, index):
+        if not self._lazy:
+            return super(DocumentList, self).__getitem__(index)
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        return self._materialize(index, super(DocumentList, self).__getitem__(index))
+
+    def __getslice__(self, i, j):
+        return self[max(0, i):max(0, j):]
+
+    def __iter__(self):
+        if not self._lazy:
+            return super(DocumentList, self).__iter__()
+        return self._iter_materialized(xrange(len(self)))
+
+    def __reversed__(self):
+        if not self._lazy:
+            return super(DocumentList, self).__reversed__()
+        return self._iter_materialized(reversed(xrange(len(self))))
+
+    def _iter_materialized(self, indexes):
+        for index in indexes:
+            if index >= len(self):
+                return
+            yield self[index]
+
+    def _index(self, index):
+        """Converts the given (possibly negative) index into a positive one."""
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('list index out of range')
+        return index
+
+    def reset_changes(self):
+        if self._change_tracker is not None:
+            self._change_tracker.reset_changes()
 
     def reset_all_changes(self):
-        for value in self:
+        self.reset_changes()
+        if self._cow_shared is not None:
+            self._cow_shared = None
+        for value in list.__iter__(self):
             if isinstance(value, Document) or isinstance(value, DocumentList):
                 value.reset_all_changes()
 
     def __setslice__(self, i, j, sequence):
+        self._tracker.note_rewrite()
         super(DocumentList, self).__setslice__(i, j, [wrap(value) for value in sequence])
 
+    def __delslice__(self, i, j):
+        self._tracker.note_rewrite()
+        super(DocumentList, self).__delslice__(i, j)
+
     def __setitem__(self, index, value):
-        super(DocumentList, self).__setitem__(index, wrap(value))
+        if isinstance(index, slice):
+            self._tracker.note_rewrite()
+            value = [wrap(item) for item in value]
+        else:
+            self._tracker.note_replace(self._index(index))
+            value = wrap(value)
+        super(DocumentList, self).__setitem__(index, value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            self._tracker.note_rewrite()
+        else:
+            self._tracker.note_removal(self._index(index))
+        super(DocumentList, self).__delitem__(index)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, count):
+        self._tracker.note_rewrite()
+        return super(DocumentList, self).__imul__(count)
 
     def extend(self, other):
-        super(DocumentList, self).extend([wrap(value) for value in other])
+        values = [wrap(value) for value in other]
+        if values:
+            self._tracker.note_append(len(values))
+        super(DocumentList, self).extend(values)
 
     def append(self, item):
+        self._tracker.note_append()
         super(DocumentList, self).append(wrap(item))
 
     def insert(self, i, item):
+        self._tracker.note_rewrite()
         super(DocumentList, self).insert(i, wrap(item))
 
     def remove(self, item):
-        super(DocumentList, self).remove(item)
+        index = self.index(item)
+        self._tracker.note_removal(index)
+        super(DocumentList, self).__delitem__(index)
+
+    def pop(self, index=-1):
+        if not self:
+            raise IndexError('pop from empty list')
+        index = self._index(index)
+        value = self[index]
+        self._tracker.note_removal(index)
+        super(DocumentList, self).__delitem__(index)
+        return value
 
-    def pop(self, *args):
-        return super(DocumentList, self).pop(*args)
+    def sort(self, *args, **kwargs):
+        self._tracker.note_rewrite()
+        super(DocumentList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        self._tracker.note_rewrite()
+        super(DocumentList, self).reverse()
 
     def to_list(self):
         """
@@ -267,4 +791,10 @@ class DocumentList(list):
         into child Documents and DocumentLists converting those to dicts
         and lists respectively.
         """
-        return [unwrap(value) for value in self]
+        return [unwrap(value) for value in list.__iter__(self)]
+
+    def _collect_update(self, prefix, update):
+        # An unchanged list may still hold changed items, so a throwaway tracker
+        # is used to collect their updates.
+        tracker = self._change_tracker or ListChangeTracker(self)
+        tracker.collect_update(prefix, update)
@@ -7,3 +7,31 @@ class NotFoundException(Exception):
 
     def __str__(self):
         return u"{} {} not found".format(self._collection.name, self._id)
+
+
+class BulkSaveException(Exception):
+    """Exception raised by Model.save_many when some of the given models
+    could not be saved. `errors` holds a (model, error) pair for each model
+    which failed, where the error is either the ValidationException raised
+    for it or the write error reported by Mongo. `unsaved` holds every model
+    which wasn't saved, in order, including any which weren't attempted
+    because an ordered save stopped early."""
+    def __init__(self, errors, unsaved):
+        self.errors = errors
+        self.unsaved = unsaved
+
+    def __str__(self):
+        return u"{} models could not be saved ({} errors)".format(
+            len(self.unsaved), len(self.errors))
+
+
+class UnindexedQueryException(Exception):
+    """Exception raised by ScopeBuilder.explain in strict mode when a scope's
+    query would scan the whole collection. `report` holds the result of the
+    explain."""
+    def __init__(self, report):
+        self.report = report
+
+    def __str__(self):
+        return u"Query {!r} with sort {!r} scans the whole collection".format(
+            self.report['query'], self.report['sort'])
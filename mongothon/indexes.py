@@ -0,0 +1,146 @@
+from pymongo import ASCENDING, IndexModel
+
+
+class Index(object):
+    """
+    Declares an index on a model's collection, to be passed to create_model
+    along with the schema and created by Model.ensure_indexes:
+
+        Index('email', unique=True)
+        Index([('team_id', 1), ('created_date', -1)])       # compound
+        Index('due_date', partial={'status': 'unpaid'})     # partial
+        Index('created_date', ttl=30 * 24 * 3600)           # TTL, in seconds
+
+    Keys are a field name (for an ascending index on it) or a list of field
+    names and (field, direction) pairs. Any further keyword arguments are
+    passed to pymongo's create_indexes, as index options.
+    """
+
+    def __init__(self, keys, name=None, unique=False, sparse=False, partial=None,
+                 ttl=None, **kwargs):
+        if isinstance(keys, basestring):
+            keys = [keys]
+        self.keys = [(key, ASCENDING) if isinstance(key, basestring) else tuple(key)
+                     for key in keys]
+        self.name = name or "_".join(u"{}_{}".format(field, direction)
+                                     for field, direction in self.keys)
+        self.unique = unique
+        self.sparse = sparse
+        self.partial = partial
+        self.ttl = ttl
+        self.options = kwargs
+
+    @property
+    def fields(self):
+        """The names of the indexed fields, in order."""
+        return [field for field, _ in self.keys]
+
+    def index_model(self):
+        """Returns the pymongo IndexModel for creating this index."""
+        options = dict(self.options, name=self.name)
+        if self.unique:
+            options['unique'] = True
+        if self.sparse:
+            options['sparse'] = True
+        if self.partial is not None:
+            options['partialFilterExpression'] = self.partial
+        if self.ttl is not None:
+            options['expireAfterSeconds'] = self.ttl
+        return IndexModel(self.keys, **options)
+
+    def supports(self, query, sort=None):
+        """
+        Returns whether this index can serve the given query and sort on its
+        own, i.e. every field the query matches on is in the index, the fields
+        matched by equality come first, and the sort follows on from them in
+        the index's order (or its reverse). A partial index only supports
+        queries which match on the fields of its filter, which needn't be
+        indexed.
+        """
+        fields = query_fields(query)
+        sort = list(sort or [])
+        if fields is None or not (fields or sort):
+            return False
+        # Fields in a partial index's filter are matched by the filter
+        filtered = set(query_fields(self.partial) or ()) if self.partial else set()
+        if not filtered <= set(fields) or not set(fields) <= set(self.fields) | filtered:
+            return False
+        first = self.keys[0][0]
+        if first not in fields and not (sort and sort[0][0] == first):
+            return False
+        if not sort:
+            return True
+
+        # Leading fields matched by equality can be left out of the sort
+        sort_fields = [field for field, _ in sort]
+        keys = list(self.keys)
+        while keys and fields.get(keys[0][0]) and keys[0][0] not in sort_fields:
+            keys.pop(0)
+        if sort_fields != [field for field, _ in keys[:len(sort)]]:
+            return False
+        same = [direction == key_direction
+                for (_, direction), (_, key_direction) in zip(sort, keys)]
+        return all(same) or not any(same)
+
+    def __repr__(self):
+        return "Index({!r}, name={!r})".format(self.keys, self.name)
+
+
+# The index every collection has, on _id.
+ID_INDEX = Index('_id', name='_id_')
+
+
+def query_fields(query):
+    """
+    Returns a dict of the fields the given query matches on to whether they
+    are matched by equality, including those in $and clauses. Returns None if
+    the query uses other top-level operators (such as $or or $where), which
+    can't be served by a single index.
+    """
+    fields = {}
+    for field, condition in query.iteritems():
+        if field == '$and':
+            for clause in condition:
+                clause_fields = query_fields(clause)
+                if clause_fields is None:
+                    return None
+                for clause_field, equality in clause_fields.iteritems():
+                    fields[clause_field] = fields.get(clause_field, True) and equality
+        elif field.startswith('$'):
+            return None
+        else:
+            fields[field] = _is_equality(condition)
+    return fields
+
+
+def _is_equality(condition):
+    """Returns whether the given query condition matches a single value."""
+    if not isinstance(condition, dict):
+        return True
+    operators = [key for key in condition if key.startswith('$')]
+    return not operators or operators == ['$eq']
+
+
+def find_index(indexes, query, sort=None):
+    """
+    Returns the first of the given indexes which supports the given query and
+    sort, or None.
+    """
+    for index in indexes:
+        if index.supports(query, sort):
+            return index
+    return None
+
+
+def plan_stages(plan):
+    """Returns the names of every stage in the given explained query plan."""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.itervalues():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
@@ -1,16 +1,34 @@
 import re
+import threading
 import types
-from copy import deepcopy, copy
-from bson import ObjectId
+import uuid
+from binascii import hexlify
+from collections import OrderedDict, deque
+from copy import copy
+from Queue import Queue, Full
+from bson import ObjectId, BSON
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, ReplaceOne, UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError
+from schemer import ValidationException
 from .document import Document
-from .queries import ScopeBuilder
-from .exceptions import NotFoundException
+from .queries import ScopeBuilder, WriteBatch
+from .exceptions import NotFoundException, BulkSaveException
+from .session import Session, current_session
+from .cache import LRUCache
+from .columns import to_columns
+from . import pool
 from .events import EventHandlerRegistrar
 from .scopes import STANDARD_SCOPES
 
 
 OBJECTIDEXPR = re.compile(r"^[a-fA-F0-9]{24}$")
 
+# Arguments of collection.save which set the write concern, and those which
+# only apply to collection.save itself, see Model._update_options.
+WRITE_CONCERN_OPTIONS = ('w', 'wtimeout', 'j', 'fsync')
+SAVE_ONLY_OPTIONS = ('manipulate', 'check_keys')
+
 
 class ModelMeta(type):
     """
@@ -47,6 +65,24 @@ class Model(Document):
     PERSISTED = 2
     DELETED = 3
 
+    # The backend and TTL used to cache lookups by _id, see enable_cache.
+    _cache = None
+    _cache_ttl = None
+
+    # The in-process backend used to cache scope results when the model has
+    # no cache of its own, see ScopeBuilder.cached.
+    _scope_cache = None
+
+    # The Index declarations for the model's collection, see ensure_indexes.
+    indexes = ()
+
+    # The class the model's scope builder is made from, see scope.
+    _scope_builder_base = ScopeBuilder
+
+    # Whether the instance was loaded with a projection, and so may be missing
+    # fields. Partial instances are kept out of sessions.
+    _partial = False
+
     def __init__(self, inital_doc=None, initial_state=NEW, **kwargs):
         self._state = initial_state
         super(Model, self).__init__(inital_doc, **kwargs)
@@ -54,8 +90,74 @@ class Model(Document):
         if initial_state == self.PERSISTED:
             self.emit('did_find')
 
+    @classmethod
+    def hydrate(cls, document, partial=False):
+        """
+        Creates a persisted model instance from the given document, as loaded
+        from the database. This skips the change tracking which the regular
+        constructor applies, since there is nothing to track for a document
+        which has just been read.
+
+        Within a session, the instance already loaded for the document's _id
+        is returned instead, if there is one (see Session). Pass partial=True
+        for documents loaded with a projection: these always get a new
+        instance, which isn't registered with the session.
+        """
+        session = current_session()
+        if session is not None and not partial:
+            model = session.get(cls, document.get('_id'))
+            if model is not None:
+                return model
+        return cls._loaded(cls._from_db(document, partial))
+
+    @classmethod
+    def _from_db(cls, document, partial=False):
+        """Like hydrate, but without sessions or events."""
+        model = super(Model, cls).hydrate(document)
+        model._state = Model.PERSISTED
+        if partial:
+            model._partial = True
+        return model
+
+    @classmethod
+    def _loaded(cls, model):
+        """
+        Completes the loading of a model built by _from_db: emits did_init and
+        did_find and registers it with the current session, if any. Returns the
+        instance to hand out, which within a session may be one loaded earlier.
+        """
+        session = current_session()
+        if model._partial:
+            session = None
+        if session is not None:
+            existing = session.get(cls, model.get('_id'))
+            if existing is not None:
+                return existing
+        model.emit('did_init')
+        model.emit('did_find')
+        if session is not None:
+            session.add(model)
+        return model
+
+    @classmethod
+    def session(cls):
+        """
+        Returns a new Session, an identity map for the models loaded within a
+        `with` block:
+
+            with Model.session():
+                ...
+        """
+        return Session()
+
+    def _did_persist(self):
+        """Registers this model with the current session, if any, once saved."""
+        session = current_session()
+        if session is not None:
+            session.add(self)
+
     def _create_working(self):
-        working = deepcopy(self)
+        working = self.copy_on_write()
         self.schema.apply_defaults(working)
         return working
 
@@ -122,14 +224,148 @@ class Model(Document):
 
         self._emit('will_save', working)
 
-        # Attempt to save
-        self.collection.save(working, *args, **kwargs)
+        # Attempt to save. Documents which already exist in the collection only
+        # have their changed fields written; anything else is saved in full.
+        update = self._partial_update(working)
+        if update is None:
+            self.collection.save(working, *args, **kwargs)
+        elif update:
+            collection, kwargs = self._update_options(kwargs)
+            collection.update_one({'_id': working['_id']}, update, **kwargs)
         self._state = Model.PERSISTED
 
         self._emit('did_save', working)
 
         # On successful completion, update from the working copy
-        self.populate(working)
+        self._populate(working)
+        self._did_persist()
+
+    def _update_options(self, kwargs):
+        """
+        Translates the given keyword arguments for collection.save into those
+        for update_one. Write concern options (w, wtimeout, j and fsync) are
+        applied to the collection through with_options, and the save-only
+        manipulate and check_keys are dropped. Returns the collection to update
+        and the remaining arguments.
+        """
+        kwargs = dict(kwargs)
+        for key in SAVE_ONLY_OPTIONS:
+            kwargs.pop(key, None)
+        write_concern = dict((key, kwargs.pop(key)) for key in WRITE_CONCERN_OPTIONS
+                             if key in kwargs)
+        if write_concern:
+            return self.collection.with_options(write_concern=WriteConcern(**write_concern)), kwargs
+        return self.collection, kwargs
+
+    def _partial_update(self, working):
+        """
+        Returns the $set/$unset update which would bring the stored copy of this
+        model in line with the given working copy, or None if the working copy
+        has to be saved in full (e.g. because the model is new or its _id has
+        changed).
+        """
+        if not self.is_persisted() or '_id' not in working:
+            return None
+
+        update = working.to_update()
+        for operator in update.itervalues():
+            if '_id' in operator:
+                return None
+        return update
+
+    def _save_operation(self, working):
+        """
+        Returns the bulk write operation which saves the given working copy of
+        this model, mirroring what save does, or None if there is nothing to
+        write.
+        """
+        update = self._partial_update(working)
+        if update is None:
+            if '_id' in working:
+                return ReplaceOne({'_id': working['_id']}, working, upsert=True)
+            return InsertOne(working)
+        elif update:
+            return UpdateOne({'_id': working['_id']}, update)
+        return None
+
+    @classmethod
+    def save_many(cls, models, ordered=False, batch_size=1000, **kwargs):
+        """
+        Saves the given models using one bulk_write per `batch_size` models
+        rather than a round trip per model. Each model goes through the same
+        steps as it would in save: defaults are applied to a working copy which
+        is validated, `will_save` and `did_save` are emitted and the model is
+        only updated from its working copy once it has been written. New models
+        are inserted, and persisted models only have their changes written.
+        Any further keyword arguments are passed to bulk_write.
+
+        Models which fail validation or which Mongo refuses to write are left
+        unsaved, and a BulkSaveException listing them is raised once all the
+        batches have been written. If `ordered` is True, saving stops at the
+        first failure instead.
+        """
+        models = list(models)
+        errors = []
+        saved = set()
+        for start in xrange(0, len(models), batch_size):
+            saved.update(cls._save_batch(models[start:start + batch_size],
+                                         ordered, errors, **kwargs))
+            if ordered and errors:
+                break
+
+        if errors:
+            unsaved = [model for model in models if id(model) not in saved]
+            raise BulkSaveException(errors, unsaved)
+
+    @classmethod
+    def _save_batch(cls, models, ordered, errors, **kwargs):
+        """
+        Saves a single batch of models for save_many, adding any errors to the
+        given list. Returns the ids of the models which were saved.
+        """
+        pending = []
+        for model in models:
+            working = model._create_working()
+            try:
+                model._do_validate(working)
+            except ValidationException as e:
+                errors.append((model, e))
+                if ordered:
+                    break
+                continue
+            model._emit('will_save', working)
+            pending.append((model, working, model._save_operation(working)))
+
+        operations = [operation for _, _, operation in pending if operation]
+        write_errors = {}
+        if operations:
+            try:
+                cls.collection.bulk_write(operations, ordered=ordered, **kwargs)
+            except BulkWriteError as e:
+                if not e.details.get('writeErrors'):
+                    raise
+                for error in e.details['writeErrors']:
+                    write_errors[error['index']] = error
+
+        # Write errors are reported against the index of the failed operation,
+        # and an ordered bulk write stops at the first of them.
+        saved = set()
+        index = 0
+        for model, working, operation in pending:
+            if operation:
+                error = write_errors.get(index)
+                index += 1
+                if error:
+                    errors.append((model, error))
+                    if ordered:
+                        break
+                    continue
+            model._state = Model.PERSISTED
+            model._emit('did_save', working)
+            model._populate(working)
+            model._did_persist()
+            saved.add(id(model))
+        return saved
 
     @classmethod
     def insert(cls, *args, **kwargs):
@@ -163,21 +399,225 @@ class Model(Document):
         self.collection.remove(self['_id'], *args, **kwargs)
         self.emit('did_remove', *args, **kwargs)
         self._state = Model.DELETED
+        session = current_session()
+        if session is not None:
+            session.discard(self)
 
     @classmethod
-    def count(cls):
-        return cls.collection.count()
+    def count(cls, filter=None, **kwargs):
+        """
+        Returns the number of documents in the collection, or those matching
+        the given filter. Keyword arguments (e.g. limit, skip, hint) are
+        passed to pymongo's count_documents.
+        """
+        return cls.collection.count_documents(filter or {}, **kwargs)
+
+    @classmethod
+    def estimated_count(cls, **kwargs):
+        """
+        Returns the number of documents in the collection from its metadata,
+        without scanning it. The count may be off after an unclean shutdown
+        or while chunks are migrating in a sharded cluster.
+        """
+        return cls.collection.estimated_document_count(**kwargs)
 
     @classmethod
     def find_one(cls, *args, **kwargs):
+        """
+        Finds a single document, returning it as a model instance or None.
+        Pass raw=True to get a read-only model instead (see ReadOnlyModel).
+
+        Within a session, a lookup by _id alone returns the instance already
+        loaded for that _id without querying, if there is one. Otherwise, such
+        lookups go through the model's cache, if enabled (see enable_cache).
+        """
+        if kwargs.pop('raw', False):
+            return cls.read_only().find_one(*args, **kwargs)
+        spec = args[0] if len(args) == 1 and not kwargs else None
+        if isinstance(spec, dict) and spec.keys() == ['_id']:
+            session = current_session()
+            if session is not None:
+                model = session.get(cls, spec['_id'])
+                if model is not None:
+                    return model
+            if cls._cache is not None and not isinstance(spec['_id'], dict):
+                return cls._find_one_cached(spec['_id'])
         obj = cls.collection.find_one(*args, **kwargs)
         if obj:
-            return cls(obj, initial_state=Model.PERSISTED)
+            return cls.hydrate(obj, _has_projection(args, kwargs))
+        return None
+
+    @classmethod
+    def _find_one_cached(cls, id):
+        codec_options = cls.collection.codec_options
+        # The key is taken before the document is fetched, so that if the
+        # document is written (and so invalidated) in the meantime, what was
+        # fetched is cached under a key which is no longer used.
+        key = cls._document_cache_key(id)
+        cached = cls._cache.get(key)
+        if cached is not None:
+            return cls.hydrate(BSON(cached).decode(codec_options=codec_options))
+
+        obj = cls.collection.find_one({'_id': id})
+        if obj:
+            cls._cache.set(key, BSON.encode(obj, codec_options=codec_options),
+                           cls._cache_ttl)
+            return cls.hydrate(obj)
         return None
 
+    @classmethod
+    def _cache_key(cls, id):
+        """
+        Returns the cache key for the document with the given _id, under
+        which the version of its cached copy is held. The _id is BSON encoded,
+        so that values Mongo treats as equal (such as str and unicode strings)
+        share a key.
+        """
+        return u"{}:{}".format(cls.collection.name, hexlify(BSON.encode({'_id': id})))
+
+    @classmethod
+    def _document_cache_key(cls, id):
+        """
+        Returns the key under which the document with the given _id is
+        cached. Keys include a version, held in the cache itself, which is
+        dropped to invalidate the document, as scope results are invalidated
+        by their generation (see _scope_cache_key).
+        """
+        version_key = cls._cache_key(id)
+        version = cls._cache.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            cls._cache.set(version_key, version, cls._cache_ttl)
+        return u"{}:{}".format(version_key, version)
+
+    @classmethod
+    def _scope_cache_backend(cls):
+        """
+        Returns the backend in which scope results are cached (see
+        ScopeBuilder.cached): the model's cache if enabled, or otherwise an
+        in-process LRUCache of its own.
+        """
+        if cls._cache is not None:
+            return cls._cache
+        if cls.__dict__.get('_scope_cache') is None:
+            cls._scope_cache = LRUCache()
+            cls._watch_scope_cache()
+        return cls._scope_cache
+
+    @classmethod
+    def _scope_cache_key(cls, digest):
+        """
+        Returns the key of the cached scope result with the given digest.
+        Keys include a generation, held in the backend itself, which is
+        replaced to invalidate every cached scope result of the model at
+        once.
+        """
+        backend = cls._scope_cache_backend()
+        generation_key = u"{}:scopes".format(cls.collection.name)
+        generation = backend.get(generation_key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            backend.set(generation_key, generation)
+        return u"{}:scopes:{}:{}".format(cls.collection.name, generation, digest)
+
+    @classmethod
+    def _watch_scope_cache(cls):
+        """
+        Registers the handlers which invalidate the model's cached scope
+        results when its instances are written. Called when the backend
+        holding them is set up: by enable_cache, whose backend may be shared
+        with other processes which write to the model without caching scopes
+        themselves, or when the in-process backend is created.
+        """
+        for event in CACHE_INVALIDATING_EVENTS:
+            cls.on(event, _invalidate_cached_scopes)
+
+    @classmethod
+    def _invalidate_scope_cache(cls):
+        """Invalidates every cached scope result of the model."""
+        if cls._cache is None and cls.__dict__.get('_scope_cache') is None:
+            # Nothing has been cached
+            return
+        backend = cls._scope_cache_backend()
+        backend.set(u"{}:scopes".format(cls.collection.name), uuid.uuid4().hex)
+
+    @classmethod
+    def ensure_indexes(cls, max_workers=4):
+        """
+        Creates the model's declared indexes on its collection, unless they
+        already exist, with up to `max_workers` of them being created
+        concurrently. Returns the names of the indexes. Typically called once
+        for each model when an application starts up.
+        """
+        def create(index):
+            return cls.collection.create_indexes([index.index_model()])[0]
+
+        if len(cls.indexes) > 1 and max_workers > 1:
+            return list(pool.imap(create, cls.indexes, max_workers))
+        return map(create, cls.indexes)
+
+    @classmethod
+    def enable_cache(cls, backend=None, ttl=None):
+        """
+        Caches the documents loaded by lookups by _id alone, i.e. find_by_id
+        and find_one({'_id': ...}), in the given CacheBackend (by default an
+        in-process LRUCache), for up to `ttl` seconds if given. Intended for
+        models which are read far more often than they change.
+
+        Cached documents are invalidated by did_save, did_update and did_remove
+        handlers registered against the model. Writes which don't emit these
+        events, such as the class-level Model.update, aren't seen by the cache,
+        and nor are writes made outside this process unless `ttl` is set. Note
+        that remove_all_handlers removes the invalidating handlers too.
+
+        Cached scope results (see ScopeBuilder.cached) are kept in the same
+        backend, and are invalidated by handlers registered here too.
+        """
+        cls.disable_cache()
+        cls._cache = backend if backend is not None else LRUCache()
+        cls._cache_ttl = ttl
+        for event in CACHE_INVALIDATING_EVENTS:
+            cls.on(event, _invalidate_cached)
+        cls._watch_scope_cache()
+        return cls._cache
+
+    @classmethod
+    def disable_cache(cls):
+        """Stops caching lookups by _id, see enable_cache."""
+        if cls._cache is not None:
+            for event in CACHE_INVALIDATING_EVENTS:
+                cls.remove_handler(event, _invalidate_cached)
+                # The in-process scope cache, if any, still needs invalidating
+                if cls.__dict__.get('_scope_cache') is None:
+                    cls.remove_handler(event, _invalidate_cached_scopes)
+            cls._cache = None
+
     @classmethod
     def find(cls, *args, **kwargs):
-        return CursorWrapper(cls.collection.find(*args, **kwargs), cls)
+        """
+        Returns a cursor over the matching documents, each returned as a model
+        instance. Pass raw=True to get read-only models instead (see
+        ReadOnlyModel).
+        """
+        if kwargs.pop('raw', False):
+            return cls.read_only().find(*args, **kwargs)
+        return CursorWrapper(cls.collection.find(*args, **kwargs), cls,
+                             partial=_has_projection(args, kwargs))
+
+    @classmethod
+    def read_only(cls):
+        """
+        Returns the read-only counterpart of this model class, used to wrap the
+        results of find(..., raw=True). The class is created on first use.
+        """
+        if '_read_only_class' not in cls.__dict__:
+            # Resolve the handler registrar up front so that the subclass
+            # shares it rather than creating its own.
+            cls.handler_registrar()
+            cls._read_only_class = type('ReadOnly' + cls.__name__,
+                                        (ReadOnlyModel, cls),
+                                        dict(__module__=cls.__module__))
+        return cls._read_only_class
 
     @classmethod
     def find_by_id(cls, id):
@@ -192,11 +632,72 @@ class Model(Document):
             raise NotFoundException(cls.collection, id)
         return obj
 
+    @classmethod
+    def find_by_ids(cls, ids, ordered=True, missing='raise', chunk_size=250,
+                    max_workers=8, **kwargs):
+        """
+        Finds the documents with the given IDs, querying for them in chunks of
+        `chunk_size` IDs using $in, with up to `max_workers` chunks queried
+        concurrently. Any further keyword arguments are passed to find.
+
+        By default the models are returned in the order of the given IDs, and
+        a NotFoundException listing the missing IDs is raised if any of them
+        don't exist. `missing` can instead be 'skip', to leave them out of the
+        results, or 'none', to return None in their place. If `ordered` is
+        False, the models are returned in whichever order they were found in
+        and missing IDs are simply skipped (unless `missing` is 'raise').
+
+        An ID which is given more than once maps to the same model instance.
+        Within a session, models already loaded are taken from the session
+        rather than queried for.
+        """
+        if missing not in ('raise', 'skip', 'none'):
+            raise ValueError("missing must be 'raise', 'skip' or 'none'")
+
+        ids = [cls._ensure_object_id(id) for id in ids]
+        unique_ids = list(OrderedDict.fromkeys(ids))
+
+        models = OrderedDict()
+        session = current_session()
+        if session is not None:
+            for id in unique_ids:
+                model = session.get(cls, id)
+                if model is not None:
+                    models[id] = model
+
+        to_find = [id for id in unique_ids if id not in models]
+        chunks = [to_find[start:start + chunk_size]
+                  for start in xrange(0, len(to_find), chunk_size)]
+
+        def find_chunk(chunk):
+            return list(cls.collection.find({'_id': {'$in': chunk}}, **kwargs))
+
+        if len(chunks) > 1 and max_workers > 1:
+            results = pool.imap(find_chunk, chunks, max_workers)
+        else:
+            results = map(find_chunk, chunks)
+
+        partial = kwargs.get('projection') is not None
+        for documents in results:
+            for document in documents:
+                models[document['_id']] = cls.hydrate(document, partial)
+
+        if missing == 'raise':
+            missing_ids = [id for id in unique_ids if id not in models]
+            if missing_ids:
+                raise NotFoundException(cls.collection, missing_ids)
+
+        if not ordered:
+            return models.values()
+        if missing == 'none':
+            return [models.get(id) for id in ids]
+        return [models[id] for id in ids if id in models]
+
     def reload(self):
         """Reloads the current model's data from the underlying
         database record, updating it in-place."""
         self.emit('will_reload')
-        self.populate(self.collection.find_one(type(self)._id_spec(self['_id'])))
+        self._populate(self.collection.find_one(type(self)._id_spec(self['_id'])))
         self.emit('did_reload')
 
     @classmethod
@@ -288,15 +789,188 @@ class Model(Document):
             cls.scopes = copy(STANDARD_SCOPES)
 
         cls.scopes.append(f)
+        cls._scope_builder = cls._scope_builder_base.for_scopes(cls.scopes,
+                                                                cls.__name__ + 'ScopeBuilder')
 
         def create_builder(self, *args, **kwargs):
-            bldr = ScopeBuilder(cls, cls.scopes)
+            bldr = cls._scope_builder(cls, cls.scopes)
             return getattr(bldr, f.__name__)(*args, **kwargs)
 
         setattr(cls, f.__name__, classmethod(create_builder))
         return f
 
 
+CACHE_INVALIDATING_EVENTS = ('did_save', 'did_update', 'did_remove')
+
+
+def _has_projection(args, kwargs):
+    """
+    Whether the given arguments to collection.find or find_one include a
+    projection, so that the documents returned may be missing fields.
+    """
+    projection = args[1] if len(args) > 1 else kwargs.get('projection')
+    return projection is not None
+
+
+def _invalidate_cached(document, *args, **kwargs):
+    """
+    Event handler which drops the given model, or the models in the given
+    WriteBatch, from its class's cache.
+    """
+    if isinstance(document, WriteBatch):
+        model_class, ids = document.model_class, document
+    else:
+        model_class, ids = type(document), [document['_id']] if '_id' in document else []
+    if model_class._cache is not None:
+        for id in ids:
+            model_class._cache.delete(model_class._cache_key(id))
+
+
+def _invalidate_cached_scopes(document, *args, **kwargs):
+    """Event handler which invalidates the cached scope results of its class."""
+    if isinstance(document, WriteBatch):
+        document.model_class._invalidate_scope_cache()
+    else:
+        type(document)._invalidate_scope_cache()
+
+
+def _read_only_error(*args, **kwargs):
+    raise TypeError("Read-only models can't be modified or saved")
+
+
+class ReadOnlyModel(object):
+    """
+    Mixin used to build the read-only counterpart of a model class (see
+    Model.read_only). Read-only models are backed by the RawBSONDocument which
+    pymongo returns when the collection's document class is RawBSONDocument,
+    so documents are only decoded once a field is read, and embedded documents
+    and lists of them are left as undecoded RawBSONDocuments until they are
+    themselves accessed.
+
+    Read-only models are plain views of the data: they can't be modified,
+    validated, saved, removed or reloaded, and they don't emit did_init or
+    did_find. Note that the model's top-level fields are only copied into
+    the underlying dict on first access, so use to_dict() rather than passing
+    the model to code which reads dicts directly (e.g. dict(model)).
+    """
+
+    _raw = None
+
+    # Read-only models always read straight from the database.
+    _cache = None
+
+    @classmethod
+    def _from_db(cls, document, partial=False):
+        model = cls.__new__(cls)
+        model._raw = document
+        model._state = Model.PERSISTED
+        return model
+
+    @classmethod
+    def _loaded(cls, model):
+        return model
+
+    @classmethod
+    def get_collection(cls):
+        collection = super(ReadOnlyModel, cls).get_collection()
+        codec_options = collection.codec_options.with_options(
+            document_class=RawBSONDocument)
+        return collection.with_options(codec_options=codec_options)
+
+    @classmethod
+    def read_only(cls):
+        return cls
+
+    def _inflate(self):
+        """Copies the top-level fields of the raw document into this dict."""
+        raw = self._raw
+        if raw is not None:
+            self._raw = None
+            dict.update(self, raw)
+
+    def __getitem__(self, key):
+        self._inflate()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self._inflate()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        self._inflate()
+        return dict.__contains__(self, key)
+
+    def has_key(self, key):
+        return key in self
+
+    def __iter__(self):
+        self._inflate()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._inflate()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self._inflate()
+        if isinstance(other, ReadOnlyModel):
+            other._inflate()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self._inflate()
+        return dict.__repr__(self)
+
+    def keys(self):
+        self._inflate()
+        return dict.keys(self)
+
+    def iterkeys(self):
+        self._inflate()
+        return dict.iterkeys(self)
+
+    def values(self):
+        self._inflate()
+        return dict.values(self)
+
+    def itervalues(self):
+        self._inflate()
+        return dict.itervalues(self)
+
+    def items(self):
+        self._inflate()
+        return dict.items(self)
+
+    def iteritems(self):
+        self._inflate()
+        return dict.iteritems(self)
+
+    def copy(self):
+        self._inflate()
+        return dict.copy(self)
+
+    def to_dict(self):
+        self._inflate()
+        return _decode_raw(self)
+
+    __setitem__ = __delitem__ = setdefault = pop = popitem = clear = \
+        populate = _populate = _read_only_error
+    apply_defaults = validate = save = remove = reload = update_instance = \
+        _read_only_error
+
+
+def _decode_raw(value):
+    """Recursively converts RawBSONDocuments into plain dicts."""
+    if isinstance(value, (RawBSONDocument, dict)):
+        return dict((key, _decode_raw(value[key])) for key in value)
+    if isinstance(value, list):
+        return [_decode_raw(item) for item in value]
+    return value
+
+
 class CursorWrapper(object):
     """
     A wrapper for the standard pymongo Cursor object which ensures all
@@ -307,21 +981,89 @@ class CursorWrapper(object):
                       'limit', 'batch_size', 'skip', 'max_scan', 'sort',
                       'hint', 'where']
 
-    def __init__(self, wrapped_cursor, model_class):
+    # Number of documents per batch when prefetching from a cursor whose batch
+    # size hasn't been set.
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, wrapped_cursor, model_class, batch_size=None, partial=False):
         self._wrapped = wrapped_cursor
         self._model_class = model_class
+        self._batch_size = batch_size
+        # Whether the cursor has a projection, see Model.hydrate
+        self._partial = partial
 
     def __getitem__(self, index):
-        return self._model_class(self._wrapped[index], initial_state=Model.PERSISTED)
+        return self._model_class.hydrate(self._wrapped[index], self._partial)
 
     def __iter__(self):
-        return IteratorWrapper(self._wrapped.__iter__(), self._model_class)
+        return IteratorWrapper(self._wrapped.__iter__(), self._model_class,
+                               self._partial)
+
+    def raw(self):
+        """
+        Returns the underlying pymongo cursor, which yields the documents as
+        plain dicts rather than models. No events are emitted for them.
+        """
+        return self._wrapped
+
+    def to_columns(self, fields, dtypes=None, use_numpy=None):
+        """
+        Reads the given (possibly dotted) fields out of the cursor's documents
+        into columns, without building models, returning a dict of fields to
+        numpy arrays (or array.array buffers when numpy isn't installed) with
+        null masks in its `masks` attribute. See mongothon.columns.to_columns
+        for details.
+
+        Only the given fields need to be fetched, so the cursor should
+        normally have a projection of them.
+        """
+        return to_columns(self._wrapped, fields, dtypes, use_numpy)
+
+    def chunks(self, size):
+        """
+        Iterates over the cursor's models in lists of up to `size` models. The
+        cursor's batch_size is set to `size` so that each list is made from a
+        single batch fetched from the database.
+        """
+        if size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        chunk = []
+        for document in self._wrapped.batch_size(size):
+            chunk.append(self._model_class.hydrate(document, self._partial))
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def prefetch(self, depth=2):
+        """
+        Returns an iterator over the cursor's models which fetches documents
+        on a worker thread, so that the next batches are being fetched from
+        the database and turned into models while the current one is being
+        processed. Batches follow the cursor's batch_size, and at most `depth`
+        of them are held ready at any time.
+
+        The models' did_init and did_find events are still emitted on the
+        iterating thread, as each model is handed out. Close the iterator
+        (or use it as a context manager) to stop early.
+        """
+        if depth < 1:
+            raise ValueError("Prefetch depth must be at least 1")
+        return PrefetchIterator(self._wrapped, self._model_class,
+                                self._batch_size or self.DEFAULT_BATCH_SIZE, depth,
+                                self._partial)
 
     def __getattr__(self, name):
         attr = getattr(self._wrapped, name)
         if name in self.RETURNS_CURSOR:
             def attr_wrapper(*args, **kwargs):
-                return CursorWrapper(attr(*args, **kwargs), self._model_class)
+                # Remember the batch size, see prefetch
+                batch_size = self._batch_size
+                if name == 'batch_size' and args:
+                    batch_size = args[0]
+                return CursorWrapper(attr(*args, **kwargs), self._model_class,
+                                     batch_size, self._partial)
 
             return attr_wrapper
         return attr
@@ -334,9 +1076,104 @@ class IteratorWrapper(object):
     models.
     """
 
-    def __init__(self, wrapped_iterator, model_class):
+    def __init__(self, wrapped_iterator, model_class, partial=False):
         self._wrapped = wrapped_iterator
         self._model_class = model_class
+        self._partial = partial
+
+    def next(self):
+        return self._model_class.hydrate(self._wrapped.next(), self._partial)
+
+
+class _PrefetchFailure(object):
+    """Carries an exception raised on a PrefetchIterator's worker thread."""
+    def __init__(self, error):
+        self.error = error
+
+
+_PREFETCH_DONE = object()
+
+
+def _prefetch(iterator, model_class, batch_size, queue, stopped, partial):
+    """
+    Worker for PrefetchIterator: puts lists of models, built from the given
+    iterator's documents, on the given queue until the iterator is exhausted
+    or `stopped` is set.
+    """
+    def put(item):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    try:
+        batch = []
+        for document in iterator:
+            batch.append(model_class._from_db(document, partial))
+            if len(batch) >= batch_size:
+                if not put(batch):
+                    return
+                batch = []
+        if batch and not put(batch):
+            return
+        put(_PREFETCH_DONE)
+    except Exception as e:
+        put(_PrefetchFailure(e))
+
+
+class PrefetchIterator(object):
+    """
+    Iterator returned by CursorWrapper.prefetch. A worker thread iterates the
+    wrapped cursor, building models a batch at a time, and hands the batches
+    over through a queue holding at most `depth` of them.
+    """
+
+    def __init__(self, wrapped_cursor, model_class, batch_size, depth, partial=False):
+        self._model_class = model_class
+        self._batch = deque()
+        self._done = False
+        self._queue = Queue(maxsize=depth)
+        self._stopped = threading.Event()
+        # The worker mustn't reference the iterator, so that dropping the
+        # iterator stops it.
+        self._thread = threading.Thread(
+            target=_prefetch,
+            args=(iter(wrapped_cursor), model_class, batch_size, self._queue, self._stopped,
+                  partial))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __iter__(self):
+        return self
 
     def next(self):
-        return self._model_class(self._wrapped.next(), initial_state=Model.PERSISTED)
+        while not self._batch:
+            if self._done:
+                raise StopIteration
+            item = self._queue.get()
+            if item is _PREFETCH_DONE:
+                self._done = True
+            elif isinstance(item, _PrefetchFailure):
+                self._done = True
+                raise item.error
+            else:
+                self._batch.extend(item)
+        return self._model_class._loaded(self._batch.popleft())
+
+    def close(self):
+        """Stops the worker thread, discarding anything already fetched."""
+        self._done = True
+        self._batch.clear()
+        self._stopped.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self._stopped.set()
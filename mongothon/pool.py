@@ -0,0 +1,47 @@
+import os
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+# Number of threads in the pool shared by find_by_ids, split scopes and
+# ensure_indexes. Each call also limits how many of its own tasks run at once.
+POOL_SIZE = 16
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def shared_pool():
+    """
+    Returns the thread pool shared by every model, creating it when first
+    needed (and again in a forked process, whose copy has no threads).
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ThreadPool(POOL_SIZE)
+                _pool_pid = pid
+    return _pool
+
+
+def imap(func, items, max_workers):
+    """
+    Returns an iterator over the results of calling `func` on each of the
+    given items, in order, with the calls run on the shared pool. At most
+    `max_workers` of them are started ahead of the result being handed out,
+    so items not yet reached when the iterator is dropped are never run.
+    Exceptions raised by `func` are raised by the iterator.
+    """
+    pool = shared_pool()
+    max_workers = max(1, max_workers)
+    pending = deque()
+    for item in items:
+        if len(pending) >= max_workers:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (item,)))
+    while pending:
+        yield pending.popleft().get()
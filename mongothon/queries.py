@@ -1,4 +1,38 @@
-from copy import deepcopy
+import heapq
+import types
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import Mapping
+from copy import copy, deepcopy
+from hashlib import sha1
+from bson import BSON
+from bson.errors import BSONError
+from .exceptions import UnindexedQueryException
+from . import pool
+from .indexes import ID_INDEX, find_index, plan_stages
+
+def merge_lists(source, dest):
+    """
+    Appends the items of the source list which aren't already in the dest
+    list to it, in order. Hashable items are looked up in a set, so merging
+    long lists (e.g. of $in values) takes linear time; unhashable ones, such
+    as dicts, are searched for in the list.
+    """
+    seen = set()
+    for item in dest:
+        try:
+            seen.add(item)
+        except TypeError:
+            pass
+    for item in source:
+        try:
+            if item in seen:
+                continue
+            seen.add(item)
+        except TypeError:
+            if item in dest:
+                continue
+        dest.append(item)
+
 
 def deep_merge(source, dest):
     """Deep merges source dict into dest dict."""
@@ -8,18 +42,282 @@ def deep_merge(source, dest):
                 deep_merge(value, dest[key])
                 continue
             elif isinstance(value, list) and isinstance(dest[key], list):
-                for item in value:
-                    if item not in dest[key]:
-                        dest[key].append(item)
+                merge_lists(value, dest[key])
                 continue
         dest[key] = value
 
 
+def _merge_shared(source, dest, owned):
+    """
+    Deep merges source dict into dest dict as deep_merge does, but without
+    modifying any dict or list which isn't in `owned` (a set of ids of the
+    ones which may be modified). Values from source are shared rather than
+    copied; dicts and lists which need to be merged into are copied first.
+    """
+    for key, value in source.iteritems():
+        if key in dest:
+            target = dest[key]
+            if isinstance(value, dict) and isinstance(target, dict):
+                if id(target) not in owned:
+                    target = dest[key] = copy(target)
+                    owned.add(id(target))
+                _merge_shared(value, target, owned)
+                continue
+            elif isinstance(value, list) and isinstance(target, list):
+                if id(target) not in owned:
+                    target = dest[key] = list(target)
+                    owned.add(id(target))
+                merge_lists(value, target)
+                continue
+        dest[key] = value
+
+
+def _get_path(document, path):
+    """Returns the value at the given dotted path in the given document."""
+    for key in path.split('.'):
+        if not isinstance(document, Mapping):
+            return None
+        document = document.get(key)
+    return document
+
+
+def encode_page_token(sort, values):
+    """
+    Encodes the given sort and the sort key values of the last document of a
+    page as an opaque, URL-safe continuation token.
+    """
+    return urlsafe_b64encode(BSON.encode({'sort': [list(item) for item in sort],
+                                          'after': values}))
+
+
+def decode_page_token(token, sort):
+    """
+    Returns the sort key values encoded in the given continuation token,
+    raising a ValueError if it is invalid or was made for a different sort.
+    """
+    try:
+        decoded = BSON(urlsafe_b64decode(str(token))).decode()
+    except (TypeError, ValueError, BSONError):
+        raise ValueError("Invalid pagination token")
+    if decoded.get('sort') != [list(item) for item in sort] or \
+            len(decoded.get('after', [])) != len(sort):
+        raise ValueError("Pagination token doesn't match the sort")
+    return decoded['after']
+
+
+def keyset_predicate(sort, values):
+    """
+    Returns a query matching the documents which follow those with the given
+    values for the fields of the given sort, e.g. for a sort of
+    [('a', -1), ('b', 1)]:
+
+        {'$or': [{'a': {'$lt': a}}, {'a': a, 'b': {'$gt': b}}]}
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = dict((sort[j][0], values[j]) for j in range(i))
+        clause[field] = {'$gt' if direction > 0 else '$lt': values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+class _SortKey(object):
+    """
+    The values of a document's sort fields, ordered according to the sort's
+    directions.
+    """
+    __slots__ = ('values', 'directions')
+
+    def __init__(self, values, directions):
+        self.values = values
+        self.directions = directions
+
+    def __eq__(self, other):
+        return self.values == other.values
+
+    def __ne__(self, other):
+        return self.values != other.values
+
+    def __lt__(self, other):
+        for value, other_value, direction in zip(self.values, other.values, self.directions):
+            if value != other_value:
+                return (value < other_value) == (direction > 0)
+        return False
+
+
+class SplitCursor(object):
+    """
+    Runs a query whose `field` has a long list of $in values as several
+    queries, each with a chunk of the values, on the shared thread pool
+    (see mongothon.pool) with up to `max_workers` at a time, iterating
+    over the combined results as models. Results follow the query's sort if
+    it has one, with skip and limit applied to the combined results, and
+    documents matched by more than one of the queries (when `field` holds
+    an array) are only returned once.
+
+    Documents are turned into models on the iterating thread, as they are
+    handed out. When sorted, the first model is only available once every
+    query has returned; otherwise the results of each query are handed out
+    as soon as it and those before it have returned.
+    """
+
+    def __init__(self, model, query, projection, options, field, chunk_size,
+                 max_workers):
+        self.model = model
+        self.query = query
+        self.projection = projection
+        self.options = options
+        self.field = field
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    def queries(self):
+        """Returns the queries to run, one per chunk of the $in values."""
+        condition = self.query[self.field]
+        values = condition['$in']
+        queries = []
+        for start in xrange(0, len(values), self.chunk_size):
+            query = dict(self.query)
+            query[self.field] = dict(condition)
+            query[self.field]['$in'] = values[start:start + self.chunk_size]
+            queries.append(query)
+        return queries
+
+    def __iter__(self):
+        options = dict(self.options)
+        skip = options.pop('skip', 0)
+        limit = options.pop('limit', 0)
+        if limit:
+            options['limit'] = skip + limit
+        sort = options.get('sort')
+
+        def find(query):
+            return list(self.model.collection.find(query, self.projection or None, **options))
+
+        # Queries not yet started when iteration stops are never run
+        found = pool.imap(find, self.queries(), self.max_workers)
+        try:
+            if sort:
+                fields = [field for field, _ in sort]
+                directions = [direction for _, direction in sort]
+                # Results with equal sort keys are taken in the order of their
+                # queries, rather than by comparing the documents themselves
+                results = [((_SortKey([_get_path(document, field) for field in fields],
+                                      directions), i, document)
+                            for document in documents)
+                           for i, documents in enumerate(list(found))]
+                documents = (document for _, _, document in heapq.merge(*results))
+            else:
+                documents = (document for documents in found for document in documents)
+
+            seen = set()
+            returned = 0
+            for document in documents:
+                if self.field != '_id' and '_id' in document:
+                    if document['_id'] in seen:
+                        continue
+                    seen.add(document['_id'])
+                if skip:
+                    skip -= 1
+                    continue
+                yield self.model.hydrate(document, bool(self.projection))
+                returned += 1
+                if limit and returned >= limit:
+                    break
+        finally:
+            found.close()
+
+
+class CachedScope(object):
+    """
+    A scope whose models and counts are cached, see ScopeBuilder.cached.
+    Other methods are passed on to the scope, uncached; scope functions
+    return cached scopes.
+    """
+
+    def __init__(self, builder, ttl=None):
+        self._builder = builder
+        self.ttl = ttl
+
+    def _cached(self, kind, fetch):
+        """
+        Returns the cached value of the given kind for the scope's query,
+        calling `fetch` to get it (as a BSON-encodable dict) if there isn't
+        one.
+        """
+        builder = self._builder
+        model = builder.model
+        digest = sha1(repr((kind, builder.query, builder.projection,
+                            sorted(builder.options.items())))).hexdigest()
+        key = model._scope_cache_key(digest)
+        backend = model._scope_cache_backend()
+        codec_options = model.collection.codec_options
+
+        cached = backend.get(key)
+        if cached is not None:
+            return BSON(cached).decode(codec_options=codec_options)
+        value = fetch()
+        backend.set(key, BSON.encode(value, codec_options=codec_options), self.ttl)
+        return value
+
+    def __iter__(self):
+        builder = self._builder
+
+        def fetch():
+            cursor = builder.model.collection.find(builder.query, builder.projection or None,
+                                                   **builder.options)
+            return {'documents': list(cursor)}
+
+        partial = bool(builder.projection)
+        return iter([builder.model.hydrate(document, partial)
+                     for document in self._cached('find', fetch)['documents']])
+
+    def count(self, **kwargs):
+        """
+        Returns the (cached) number of documents matching the scope, see
+        ScopeBuilder.count.
+        """
+        return self._cached(('count', sorted(kwargs.items())),
+                            lambda: {'count': self._builder.count(**kwargs)})['count']
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def attr_wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if isinstance(result, ScopeBuilder):
+                return CachedScope(result, self.ttl)
+            return result
+
+        return attr_wrapper
+
+
+class WriteBatch(list):
+    """
+    The _ids of a batch of documents updated or removed by a scope's
+    update_all or delete_all in batched mode. Passed to will_update,
+    did_update, will_remove and did_remove handlers in place of a model
+    instance; `model_class` is the model the documents belong to.
+    """
+
+    def __init__(self, model_class, ids):
+        super(WriteBatch, self).__init__(ids)
+        self.model_class = model_class
+
+
 class ScopeBuilder(object):
     """A helper class used to build query scopes. This class is provided with a
     list of scope functions (all of which return query args) which can then
     be chained together using this builder to build up more complex queries."""
 
+    # When iterated, queries with a top-level $in list of more than this many
+    # values are split into queries of up to this many values each, which are
+    # run on up to split_max_workers threads; see split. None disables this.
+    split_in_threshold = 10000
+    split_max_workers = 4
+
     @classmethod
     def unpack_scope(cls, scope):
         """Unpacks the response from a scope function. The function should return
@@ -47,34 +345,88 @@ class ScopeBuilder(object):
 
 
     @classmethod
-    def register_fn(cls, f):
-        """Registers a scope function on this builder."""
+    def scope_method(cls, f):
+        """
+        Returns a builder method which applies the given scope function,
+        returning a new builder.
+        """
         def inner(self, *args, **kwargs):
             try:
                 query, projection, options = cls.unpack_scope(f(*args, **kwargs))
-                new_query = deepcopy(self.query)
-                new_projection = deepcopy(self.projection)
-                new_options = deepcopy(self.options)
-                deep_merge(query, new_query)
-                new_projection.update(projection)
-                new_options.update(options)
-                return ScopeBuilder(self.model, self.fns, new_query,
-                    new_projection, new_options)
             except ValueError:
                 raise ValueError("Scope function \"{}\ returns an invalid scope".format(f.__name__))
+            return type(self)(self.model, self.fns, query, projection, options,
+                              _previous=self._fragments)
 
-        setattr(cls, f.__name__, inner)
+        inner.__name__ = f.__name__
+        inner.__doc__ = f.__doc__
+        return inner
 
+    @classmethod
+    def register_fn(cls, f):
+        """Registers a scope function on this builder class."""
+        setattr(cls, f.__name__, cls.scope_method(f))
 
-    def __init__(self, model, fns, query={}, projection={}, options={}):
+    @classmethod
+    def for_scopes(cls, fns, name='ScopeBuilder'):
+        """
+        Returns a new subclass of this builder with a method for each of the
+        given scope functions. Models compile their scopes into a builder class
+        of their own as they're registered, so that building a chain of scopes
+        does nothing more than call them.
+        """
+        return type(name, (cls,), dict((f.__name__, cls.scope_method(f)) for f in fns))
+
+    def __init__(self, model, fns, query={}, projection={}, options={}, _previous=None):
         self.fns = fns
         self.model = model
-        self.query = query
-        self.projection = projection
-        self.options = options
+        # The query args returned by each scope in the chain are kept, unmerged
+        # and shared with the builders earlier in the chain, in a linked list
+        # of (previous, (query, projection, options)) pairs. They're only merged
+        # once the query is needed (usually when the cursor is created), see
+        # _materialize.
+        self._fragments = (_previous, (query, projection, options))
+        self._materialized = None
         self._active_cursor = None
-        for fn in fns:
-            self.register_fn(fn)
+
+    def _materialize(self):
+        """
+        Merges the query args of every scope in the chain, in order, into a
+        new query, projection and options, caching the result. Parts of the
+        query which aren't changed by later scopes are shared with the query
+        args they came from rather than copied, so the result must not be
+        modified.
+        """
+        if self._materialized is None:
+            fragments = []
+            node = self._fragments
+            while node is not None:
+                node, fragment = node
+                fragments.append(fragment)
+
+            query, projection, options = {}, {}, {}
+            owned = set([id(query)])
+            for fragment_query, fragment_projection, fragment_options in reversed(fragments):
+                _merge_shared(fragment_query, query, owned)
+                projection.update(fragment_projection)
+                options.update(fragment_options)
+            self._materialized = query, projection, options
+        return self._materialized
+
+    @property
+    def query(self):
+        """The currently assembled query."""
+        return self._materialize()[0]
+
+    @property
+    def projection(self):
+        """The currently assembled projection."""
+        return self._materialize()[1]
+
+    @property
+    def options(self):
+        """The currently assembled query options, e.g. sort or limit."""
+        return self._materialize()[2]
 
     @property
     def cursor(self):
@@ -88,13 +440,247 @@ class ScopeBuilder(object):
                                                   **self.options)
         return self._active_cursor
 
+    def paginate(self, sort, page_size, after=None):
+        """
+        Returns a page of up to `page_size` models matching the currently
+        assembled query in the given sort order, and a continuation token to
+        pass back as `after` to get the next page (or None after the last
+        page):
+
+            orders, token = Order.active().paginate([('created_date', -1)], 100)
+            more_orders, token = Order.active().paginate([('created_date', -1)], 100,
+                                                         after=token)
+
+        Rather than skipping over the previous pages, each page is selected
+        using range predicates on the sort fields of the last model of the
+        previous one, so that deep pages are as quick to get as the first
+        one given an index on the sort fields. _id is added to the sort to
+        make it unique if it isn't there already, and the sort fields should
+        be present in every document.
+        """
+        sort = list(sort)
+        if not any(field == '_id' for field, _ in sort):
+            sort.append(('_id', sort[-1][1] if sort else 1))
+
+        query = deepcopy(self.query)
+        if after is not None:
+            values = decode_page_token(after, sort)
+            deep_merge({'$and': [keyset_predicate(sort, values)]}, query)
+
+        projection = deepcopy(self.projection)
+        if projection and any(projection.values()):
+            for field, _ in sort:
+                projection[field] = 1
+
+        options = dict(self.options, sort=sort, limit=page_size + 1)
+        options.pop('skip', None)
+        models = list(self.model.find(query, projection or None, **options))
+
+        token = None
+        if len(models) > page_size:
+            models = models[:page_size]
+            token = encode_page_token(sort, [_get_path(models[-1], field)
+                                             for field, _ in sort])
+        return models, token
+
     def __getitem__(self, index):
         return self.cursor[index]
 
+    def exists(self):
+        """
+        Returns whether any document matches the currently assembled query,
+        fetching at most one document's _id to find out.
+        """
+        kwargs = {'hint': self.options['hint']} if 'hint' in self.options else {}
+        cursor = self.model.collection.find(self.query, {'_id': 1}, **kwargs).limit(1)
+        return any(True for _ in cursor)
+
+    def first(self):
+        """
+        Returns the first model matching the currently assembled query,
+        following its sort and skip options, or None.
+        """
+        options = dict(self.options)
+        options.pop('limit', None)
+        return self.model.find_one(self.query, self.projection or None, **options)
+
+    def count(self, limit=None, hint=None, **kwargs):
+        """
+        Returns the number of documents matching the currently assembled
+        query, counting no more than `limit` of them if given and using the
+        given index `hint` (by default that of the scope's options, if any).
+        Further keyword arguments, e.g. skip or maxTimeMS, are passed to
+        pymongo's count_documents.
+        """
+        if limit:
+            kwargs['limit'] = limit
+        hint = hint or self.options.get('hint')
+        if hint:
+            kwargs['hint'] = hint
+        return self.model.collection.count_documents(self.query, **kwargs)
+
+    def _id_batches(self, batch_size):
+        """
+        Returns WriteBatches of up to `batch_size` of the _ids of the
+        documents matching the currently assembled query. Every _id is read
+        before any batch is returned, so that writing to the documents can't
+        move them within the query's results.
+        """
+        cursor = self.model.collection.find(self.query, {'_id': 1}).batch_size(batch_size)
+        ids = [document['_id'] for document in cursor]
+        return [WriteBatch(self.model, ids[i:i + batch_size])
+                for i in range(0, len(ids), batch_size)]
+
+    def update_all(self, update, batch_size=None, **kwargs):
+        """
+        Applies the given update to every document matching the currently
+        assembled query with a single update_many, returning the number of
+        documents matched. Further keyword arguments are passed to
+        update_many. No models are loaded and no events are emitted, so
+        lookups cached by enable_cache aren't invalidated; cached scope
+        results (see cached) are.
+
+            Order.before(cutoff).unpaid().update_all({'$set': {'status': 'overdue'}})
+
+        With a `batch_size`, the _ids of the matching documents are read
+        first, and then updated `batch_size` at a time with an update_many
+        each. will_update and did_update are emitted once per batch, with a
+        WriteBatch of its _ids in place of a model instance, followed by the
+        update.
+        """
+        model = self.model
+        if not batch_size:
+            result = model.collection.update_many(self.query, update, **kwargs)
+            model._invalidate_scope_cache()
+            return result.matched_count
+
+        matched = 0
+        for batch in self._id_batches(batch_size):
+            model.handler_registrar().apply('will_update', batch, update, **kwargs)
+            result = model.collection.update_many({'_id': {'$in': batch}}, update, **kwargs)
+            model.handler_registrar().apply('did_update', batch, update, **kwargs)
+            matched += result.matched_count
+        return matched
+
+    def delete_all(self, batch_size=None, **kwargs):
+        """
+        Removes every document matching the currently assembled query with a
+        single delete_many, returning the number of documents removed. As
+        with update_all, further keyword arguments are passed to delete_many,
+        no models are loaded and no events are emitted.
+
+        With a `batch_size`, the matching documents are removed `batch_size`
+        at a time, emitting will_remove and did_remove once per batch with a
+        WriteBatch of its _ids in place of a model instance.
+        """
+        model = self.model
+        if not batch_size:
+            result = model.collection.delete_many(self.query, **kwargs)
+            model._invalidate_scope_cache()
+            return result.deleted_count
+
+        deleted = 0
+        for batch in self._id_batches(batch_size):
+            model.handler_registrar().apply('will_remove', batch, **kwargs)
+            result = model.collection.delete_many({'_id': {'$in': batch}}, **kwargs)
+            model.handler_registrar().apply('did_remove', batch, **kwargs)
+            deleted += result.deleted_count
+        return deleted
+
+    def cached(self, ttl=None):
+        """
+        Returns this scope with its models and count cached, for up to `ttl`
+        seconds if given:
+
+            Team.active().cached(ttl=30).count()
+            teams = list(Team.active().cached(ttl=30))
+
+        Results are cached by query, projection and options, as BSON, and
+        models are made afresh from them each time. They're cached in the
+        model's cache if enabled (see Model.enable_cache), or otherwise in an
+        in-process LRUCache of the model's own. Every cached result of a model
+        is invalidated when one of its instances emits did_save, did_update or
+        did_remove; as with enable_cache, other writes aren't seen (unless
+        `ttl` is set).
+        """
+        return CachedScope(self, ttl)
+
+    def explain(self, strict=False):
+        """
+        Explains the currently assembled query, returning a dict of:
+
+         - query, sort: the query and its sort, if any
+         - index: the first of the model's declared indexes (or the _id index)
+           which supports the query and sort on its own, or None
+         - stages: the names of the stages of the server's winning plan
+         - collscan: whether the winning plan scans the whole collection
+         - explain: the server's explain output
+
+        With strict=True, an UnindexedQueryException is raised instead if the
+        winning plan scans the whole collection, e.g. to check in tests that a
+        scope's queries are indexed.
+        """
+        query = self.query
+        sort = self.options.get('sort')
+        explained = self.cursor.explain()
+        plan = explained.get('queryPlanner', {}).get('winningPlan', explained)
+        stages = plan_stages(plan)
+        report = {
+            'query': query,
+            'sort': sort,
+            'index': find_index([ID_INDEX] + list(getattr(self.model, 'indexes', ())),
+                                query, sort),
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages,
+            'explain': explained
+        }
+        if strict and report['collscan']:
+            raise UnindexedQueryException(report)
+        return report
+
+    def _split_field(self, chunk_size):
+        """
+        Returns the first top-level field of the query with more than
+        `chunk_size` $in values, or None.
+        """
+        for field, condition in self.query.iteritems():
+            if isinstance(condition, dict) and \
+                    isinstance(condition.get('$in'), list) and \
+                    len(condition['$in']) > chunk_size:
+                return field
+        return None
+
+    def split(self, chunk_size=None, max_workers=None):
+        """
+        Returns a SplitCursor which runs the currently assembled query as
+        several queries, each with up to `chunk_size` (split_in_threshold by
+        default) of the values of its first top-level $in list with more
+        values than that, on up to `max_workers` threads (split_max_workers by
+        default). The results are combined following the sort, skip and limit
+        options. Returns the regular cursor if there is no $in list to split.
+
+        Scopes are split automatically when iterated, if they have an $in list
+        of more than split_in_threshold values.
+        """
+        chunk_size = chunk_size or self.split_in_threshold
+        field = self._split_field(chunk_size) if chunk_size else None
+        if field is None:
+            return self.cursor
+        return SplitCursor(self.model, self.query, self.projection, self.options,
+                           field, chunk_size, max_workers or self.split_max_workers)
+
     def __iter__(self):
+        if self.split_in_threshold and self._split_field(self.split_in_threshold):
+            return iter(self.split())
         return self.cursor.__iter__()
 
     def __getattr__(self, key):
+        # Scope functions which aren't methods of this builder's class (see
+        # for_scopes) are looked up by name, the latest taking precedence.
+        for fn in reversed(self.__dict__.get('fns', ())):
+            if fn.__name__ == key:
+                return types.MethodType(self.scope_method(fn), self)
+
         # If the method is not one of ours, attempt to find it on the cursor
         # which will mean executing it.
         if hasattr(self.cursor, key):
@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+from .exceptions import BulkSaveException
+
+
+_local = threading.local()
+
+
+def current_session():
+    """Returns the innermost active session on this thread, or None."""
+    sessions = getattr(_local, 'sessions', None)
+    if sessions:
+        return sessions[-1]
+    return None
+
+
+class Session(object):
+    """
+    An identity map for models, scoped to a block of code (typically a single
+    web request) and the thread running it:
+
+        with Model.session() as session:
+            order = Order.find_by_id(order_id)
+            order is Order.find_one({'_id': order_id})  # => True, without a query
+            order['status'] = 'shipped'
+        # order is saved here
+
+    While a session is active, every model loaded from the database is
+    registered against its class and _id, and loading the same document again
+    (through find, find_one, find_by_id, find_by_ids or a scope) returns the
+    instance which was first loaded instead. Lookups by _id alone are answered
+    from the session without querying at all.
+
+    When the block exits without an exception, flush is called to write any
+    changed models. Sessions can be nested, in which case only the innermost
+    one is used.
+    """
+
+    def __init__(self):
+        self._models = OrderedDict()
+
+    def __enter__(self):
+        if not hasattr(_local, 'sessions'):
+            _local.sessions = []
+        _local.sessions.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.sessions.pop()
+        if exc_type is None:
+            self.flush()
+
+    @staticmethod
+    def _key(model_class, id):
+        try:
+            hash(id)
+        except TypeError:
+            return None
+        return model_class, id
+
+    def get(self, model_class, id):
+        """
+        Returns the instance of the given model class with the given _id held
+        by this session, or None.
+        """
+        key = self._key(model_class, id)
+        return self._models.get(key) if key else None
+
+    def add(self, model):
+        """
+        Registers the given model with this session, returning the instance
+        now held by it for the model's _id; if another instance was registered
+        first, that one is kept. Models without an _id, and those loaded with a
+        projection, can't be registered.
+        """
+        if model._partial:
+            return model
+        key = self._key(type(model), model.get('_id'))
+        if key is None or key[1] is None:
+            return model
+        return self._models.setdefault(key, model)
+
+    def discard(self, model):
+        """Removes the given model from this session."""
+        key = self._key(type(model), model.get('_id'))
+        if key and self._models.get(key) is model:
+            del self._models[key]
+
+    def __contains__(self, model):
+        return self.get(type(model), model.get('_id')) is model
+
+    def __iter__(self):
+        return iter(self._models.values())
+
+    def __len__(self):
+        return len(self._models)
+
+    def dirty(self):
+        """
+        Returns the models held by this session which have unsaved changes.
+        """
+        return [model for model in self._models.itervalues()
+                if model.is_new() or (model.is_persisted() and model.to_update())]
+
+    def flush(self, **kwargs):
+        """
+        Saves every changed model held by this session, using one save_many
+        per model class. Any keyword arguments are passed to save_many. If some
+        models can't be saved, a BulkSaveException covering all of the model
+        classes is raised once they've all been written.
+        """
+        by_class = OrderedDict()
+        for model in self.dirty():
+            by_class.setdefault(type(model), []).append(model)
+
+        errors, unsaved = [], []
+        for model_class, models in by_class.iteritems():
+            try:
+                model_class.save_many(models, **kwargs)
+            except BulkSaveException as e:
+                errors.extend(e.errors)
+                unsaved.extend(e.unsaved)
+
+        if errors:
+            raise BulkSaveException(errors, unsaved)
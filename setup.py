@@ -15,7 +15,11 @@ setuptools.setup(
                      "API for Python, loosely based on the awesome " +
                      "mongoose.js library.",
     install_requires=[
-        'pymongo>=3.0.0, <4.0.0', 'inflection==0.2.0', 'schemer>=0.2.0, <0.3.0'
+        'pymongo>=3.7.0, <4.0.0', 'inflection==0.2.0', 'schemer>=0.2.0, <0.3.0'
     ],
-    tests_require=['mock', 'nose']
+    extras_require={
+        'async': ['tornado>=4.3, <6.0.0'],
+        'numpy': ['numpy']
+    },
+    tests_require=['mock', 'nose', 'tornado>=4.3, <6.0.0']
     )
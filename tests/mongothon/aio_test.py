@@ -0,0 +1,254 @@
+from mongothon import Schema, NotFoundException
+from mongothon.aio import create_async_model, AsyncModel, AsyncCursorWrapper
+from schemer import ValidationException
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+from mock import Mock
+from bson import ObjectId
+from .fake import FakeMotorCollection
+
+
+car_schema = Schema({
+    "make":     {"type": basestring, "required": True},
+    "model":    {"type": basestring},
+    "doors":    {"type": int, "default": 4}
+})
+
+
+class TestAsyncModel(AsyncTestCase):
+
+    def setUp(self):
+        super(TestAsyncModel, self).setUp()
+        self.oid = ObjectId()
+        self.collection = FakeMotorCollection("car", [
+            {'_id': self.oid, 'make': 'Peugeot', 'model': '406', 'doors': 5},
+            {'_id': ObjectId(), 'make': 'Peugeot', 'model': '205', 'doors': 3},
+            {'_id': ObjectId(), 'make': 'Volvo', 'model': 'V70', 'doors': 5}])
+        self.Car = create_async_model(car_schema, self.collection)
+
+        @self.Car.scope
+        def by_make(make):
+            return {'make': make}
+
+    def tearDown(self):
+        self.Car.remove_all_handlers()
+        super(TestAsyncModel, self).tearDown()
+
+    def test_create_async_model(self):
+        self.assertTrue(issubclass(self.Car, AsyncModel))
+        self.assertEqual('Car', self.Car.__name__)
+        self.assertEqual('tests.mongothon.aio_test', self.Car.__module__)
+
+    @gen_test
+    def test_find_one(self):
+        car = yield self.Car.find_one({'model': '205'})
+        self.assertIsInstance(car, self.Car)
+        self.assertEqual('Peugeot', car['make'])
+        self.assertTrue(car.is_persisted())
+        self.assertIsNone((yield self.Car.find_one({'model': '106'})))
+
+    @gen_test
+    def test_find_by_id(self):
+        car = yield self.Car.find_by_id(str(self.oid))
+        self.assertEqual('406', car['model'])
+        with self.assertRaises(NotFoundException):
+            yield self.Car.find_by_id(ObjectId())
+
+    @gen_test
+    def test_find_iterates_with_fetch_next(self):
+        cursor = self.Car.find({'make': 'Peugeot'})
+        self.assertIsInstance(cursor, AsyncCursorWrapper)
+        models = []
+        while (yield cursor.fetch_next):
+            models.append(cursor.next_object())
+        self.assertEqual(['406', '205'], [car['model'] for car in models])
+        self.assertIsInstance(models[0], self.Car)
+        self.assertIsNone(cursor.next_object())
+
+    @gen_test
+    def test_find_to_list(self):
+        cars = yield self.Car.find().to_list()
+        self.assertEqual(3, len(cars))
+        cars = yield self.Car.find().to_list(2)
+        self.assertEqual(2, len(cars))
+
+    @gen_test
+    def test_find_prefetches_batches(self):
+        cursor = self.Car.find().batch_size(2)
+        self.assertTrue((yield cursor.fetch_next))
+        # The second batch is requested as soon as the first arrives
+        self.assertEqual([2, 2], cursor._wrapped.to_list_calls)
+        cars = yield cursor.to_list()
+        self.assertEqual(3, len(cars))
+        self.assertEqual([2, 2], cursor._wrapped.to_list_calls)
+
+    @gen_test
+    def test_cursor_methods_return_wrapped_cursors(self):
+        cursor = self.Car.find().limit(1)
+        self.assertIsInstance(cursor, AsyncCursorWrapper)
+        self.assertEqual(1, len((yield cursor.to_list())))
+        self.assertEqual(3, (yield self.Car.find().count()))
+
+    @gen_test
+    def test_raw_cursor(self):
+        documents = yield self.Car.find({'make': 'Volvo'}).raw().to_list(None)
+        self.assertEqual([{'_id': self.collection.documents[2]['_id'], 'make': 'Volvo',
+                           'model': 'V70', 'doors': 5}], documents)
+        self.assertNotIsInstance(documents[0], self.Car)
+
+    @gen_test
+    def test_scopes_can_be_yielded(self):
+        cars = yield self.Car.by_make('Peugeot')
+        self.assertEqual(['406', '205'], [car['model'] for car in cars])
+        cars = yield self.Car.by_make('Volvo').to_list()
+        self.assertEqual(['V70'], [car['model'] for car in cars])
+
+    @gen_test
+    def test_scope_exists_first_and_count(self):
+        self.assertTrue((yield self.Car.by_make('Volvo').exists()))
+        self.assertFalse((yield self.Car.by_make('Rover').exists()))
+        car = yield self.Car.by_make('Peugeot').first()
+        self.assertIsInstance(car, self.Car)
+        self.assertEqual('406', car['model'])
+        self.assertEqual(2, (yield self.Car.by_make('Peugeot').count()))
+
+    @gen_test
+    def test_scope_update_all_and_delete_all(self):
+        matched = yield self.Car.by_make('Peugeot').update_all({'$set': {'doors': 2}})
+        self.assertEqual(2, matched)
+        self.assertEqual([2, 2, 5], [document['doors'] for document in self.collection.documents])
+        self.assertEqual(1, (yield self.Car.by_make('Volvo').delete_all()))
+        self.assertEqual(2, len(self.collection.documents))
+
+    def test_sync_only_scope_methods_are_unsupported(self):
+        scope = self.Car.by_make('Peugeot')
+        self.assertRaises(TypeError, scope.paginate, [('model', 1)], 10)
+        self.assertRaises(TypeError, scope.cached)
+        self.assertRaises(TypeError, scope.explain)
+        self.assertRaises(TypeError, scope.split)
+
+    @gen_test
+    def test_batched_scope_writes_are_unsupported(self):
+        with self.assertRaises(TypeError):
+            yield self.Car.by_make('Peugeot').update_all({'$set': {'doors': 2}}, batch_size=10)
+        with self.assertRaises(TypeError):
+            yield self.Car.by_make('Peugeot').delete_all(batch_size=10)
+
+    @gen_test
+    def test_save_new(self):
+        car = self.Car({'make': 'Rover'})
+        yield car.save()
+        self.assertTrue(car.is_persisted())
+        self.assertEqual(4, car['doors'])
+        self.assertIn('_id', car)
+        stored = yield self.Car.find_by_id(car['_id'])
+        self.assertEqual(car, stored)
+
+    @gen_test
+    def test_save_persisted_writes_changes(self):
+        car = yield self.Car.find_by_id(self.oid)
+        car['model'] = '405'
+        yield car.save()
+        self.assertFalse(car.changed)
+        stored = yield self.Car.find_by_id(self.oid)
+        self.assertEqual('405', stored['model'])
+
+    @gen_test
+    def test_save_validates(self):
+        car = self.Car({'model': '406'})
+        with self.assertRaises(ValidationException):
+            yield car.save()
+        with self.assertRaises(ValidationException):
+            yield car.validate()
+        self.assertTrue(car.is_new())
+
+    @gen_test
+    def test_remove(self):
+        car = yield self.Car.find_by_id(self.oid)
+        yield car.remove()
+        self.assertTrue(car.is_deleted())
+        self.assertIsNone((yield self.Car.find_one({'_id': self.oid})))
+
+    @gen_test
+    def test_update_instance(self):
+        car = yield self.Car.find_by_id(self.oid)
+        handler = Mock()
+        self.Car.on('did_update', handler)
+        yield car.update_instance({'$set': {'model': '407'}})
+        stored = yield self.Car.find_by_id(self.oid)
+        self.assertEqual('407', stored['model'])
+        handler.assert_called_once_with(car, {'$set': {'model': '407'}})
+
+    @gen_test
+    def test_reload(self):
+        car = yield self.Car.find_by_id(self.oid)
+        self.collection.documents[0]['model'] = '407'
+        yield car.reload()
+        self.assertEqual('407', car['model'])
+
+    @gen_test
+    def test_coroutine_handlers_are_waited_for(self):
+        calls = []
+
+        @self.Car.on('will_save')
+        @gen.coroutine
+        def will_save(working):
+            yield gen.moment
+            working['model'] = 'updated'
+            calls.append('will_save')
+
+        @self.Car.on('did_find')
+        @gen.coroutine
+        def did_find(car):
+            yield gen.moment
+            calls.append('did_find')
+
+        car = yield self.Car.find_by_id(self.oid)
+        self.assertEqual(['did_find'], calls)
+        yield car.save()
+        self.assertEqual(['did_find', 'will_save'], calls)
+        self.assertEqual('updated', car['model'])
+
+    @gen_test
+    def test_emit_async(self):
+        handler = Mock()
+        self.Car.on('custom', handler)
+        car = self.Car({'make': 'Rover'})
+        yield car.emit_async('custom', 1)
+        handler.assert_called_once_with(car, 1)
+
+    def test_coroutine_handlers_of_synchronous_events_raise(self):
+        @gen.coroutine
+        def handler(car):
+            yield gen.moment
+
+        self.Car.on('did_init', handler)
+        self.assertRaises(TypeError, self.Car, {'make': 'Rover'})
+        self.Car.remove_handler('did_init', handler)
+
+        car = self.Car({'make': 'Rover'})
+        self.Car.on('will_apply_defaults', handler)
+        self.assertRaises(TypeError, car.apply_defaults)
+        self.Car.on('custom', handler)
+        self.assertRaises(TypeError, car.emit, 'custom')
+
+    @gen_test
+    def test_coroutine_handlers_of_did_init_are_waited_for_when_loading(self):
+        calls = []
+
+        @self.Car.on('did_init')
+        @gen.coroutine
+        def did_init(car):
+            yield gen.moment
+            calls.append('did_init')
+
+        yield self.Car.find_by_id(self.oid)
+        self.assertEqual(['did_init'], calls)
+
+    def test_sync_only_methods_are_unsupported(self):
+        self.assertRaises(TypeError, self.Car.find_by_ids, [self.oid])
+        self.assertRaises(TypeError, self.Car.save_many, [])
+        self.assertRaises(TypeError, self.Car.enable_cache)
+        self.assertRaises(TypeError, self.Car.session)
+        with self.assertRaisesRegexp(TypeError, 'read_only is only supported by synchronous models'):
+            self.Car.read_only()
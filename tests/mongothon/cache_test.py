@@ -0,0 +1,77 @@
+from mongothon.cache import CacheBackend, LRUCache
+from unittest import TestCase
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCacheBackend(TestCase):
+
+    def test_interface_is_abstract(self):
+        backend = CacheBackend()
+        self.assertRaises(NotImplementedError, backend.get, 'a')
+        self.assertRaises(NotImplementedError, backend.set, 'a', 'b')
+        self.assertRaises(NotImplementedError, backend.delete, 'a')
+        self.assertRaises(NotImplementedError, backend.clear)
+
+
+class TestLRUCache(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LRUCache(max_size=3, clock=self.clock)
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 'x')
+        self.assertEqual('x', self.cache.get('a'))
+        self.cache.set('a', 'y')
+        self.assertEqual('y', self.cache.get('a'))
+
+    def test_delete(self):
+        self.cache.set('a', 'x')
+        self.cache.delete('a')
+        self.cache.delete('b')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_clear(self):
+        self.cache.set('a', 'x')
+        self.cache.set('b', 'y')
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+
+    def test_evicts_least_recently_used(self):
+        for key in 'abc':
+            self.cache.set(key, key)
+        self.cache.get('a')
+        self.cache.set('d', 'd')
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual('a', self.cache.get('a'))
+        self.assertEqual('d', self.cache.get('d'))
+
+    def test_values_expire_after_ttl(self):
+        self.cache.set('a', 'x', ttl=10)
+        self.clock.now += 9
+        self.assertEqual('x', self.cache.get('a'))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_default_ttl(self):
+        cache = LRUCache(ttl=5, clock=self.clock)
+        cache.set('a', 'x')
+        cache.set('b', 'y', ttl=50)
+        self.clock.now += 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual('y', cache.get('b'))
+
+    def test_values_without_ttl_never_expire(self):
+        self.cache.set('a', 'x')
+        self.clock.now += 10 ** 9
+        self.assertEqual('x', self.cache.get('a'))
@@ -0,0 +1,56 @@
+from mongothon import columns
+from mongothon.columns import to_columns, Columns
+from unittest import TestCase, skipIf
+from array import array
+from datetime import datetime
+
+
+documents = [
+    {'total_due': 10.5, 'items': 2, 'customer': {'region': 'EU'}, 'lines': [{'sku': 'a'}]},
+    {'total_due': None, 'items': 3, 'customer': {}},
+    {'items': 1, 'customer': {'region': 'US'}, 'lines': []},
+]
+
+
+class TestToColumns(TestCase):
+
+    def test_columns_without_numpy(self):
+        result = to_columns(iter(documents), ['total_due', 'items'],
+                            dtypes={'items': 'l'}, use_numpy=False)
+        self.assertIsInstance(result, Columns)
+        self.assertEqual(3, result.length)
+        self.assertEqual(2, len(result))
+        self.assertEqual(array('d', [10.5, 0, 0]), result['total_due'])
+        self.assertEqual(array('l', [2, 3, 1]), result['items'])
+        self.assertEqual(array('b', [False, True, True]), result.masks['total_due'])
+        self.assertEqual(array('b', [False, False, False]), result.masks['items'])
+
+    def test_dotted_paths(self):
+        result = to_columns(documents, ['customer.region', 'lines.0.sku', 'lines.1.sku'],
+                            dtypes=dict.fromkeys(['customer.region', 'lines.0.sku', 'lines.1.sku'], object),
+                            use_numpy=False)
+        self.assertEqual(['EU', None, 'US'], result['customer.region'])
+        self.assertEqual(array('b', [False, True, False]), result.masks['customer.region'])
+        self.assertEqual(['a', None, None], result['lines.0.sku'])
+        self.assertEqual([None, None, None], result['lines.1.sku'])
+
+    def test_no_documents(self):
+        result = to_columns([], ['total_due'], use_numpy=False)
+        self.assertEqual(0, result.length)
+        self.assertEqual(array('d'), result['total_due'])
+
+    @skipIf(columns.numpy is not None, "numpy is installed")
+    def test_use_numpy_requires_numpy(self):
+        self.assertRaises(ImportError, to_columns, documents, ['items'], use_numpy=True)
+
+    @skipIf(columns.numpy is None, "numpy is not installed")
+    def test_numpy_columns_grow(self):
+        numpy = columns.numpy
+        many = [{'n': i, 'at': datetime(2016, 1, 1) if i % 2 else None}
+                for i in range(columns.INITIAL_CAPACITY + 10)]
+        result = to_columns(many, ['n', 'at'], dtypes={'n': 'int64', 'at': 'datetime64[ms]'})
+        self.assertEqual(len(many), result.length)
+        self.assertTrue((numpy.arange(len(many)) == result['n']).all())
+        self.assertEqual(numpy.dtype('datetime64[ms]'), result['at'].dtype)
+        self.assertEqual([True, False], list(result.masks['at'][:2]))
+        self.assertFalse(result.masks['n'].any())
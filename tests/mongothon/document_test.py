@@ -240,6 +240,222 @@ class TestDocument(unittest.TestCase):
         self.assertEquals({}, doc['e'][0].changed)
         self.assertEquals({}, doc.deleted)
 
+    def test_setdefault_notes_addition(self):
+        doc = Document({'a': 'b'})
+        doc.setdefault('a', 'c')
+        doc.setdefault('d', 'e')
+        self.assertEqual({'d': 'e'}, doc.added)
+
+    def test_pop_notes_deletion(self):
+        doc = Document({'a': 'b', 'c': 'd'})
+        self.assertEqual('b', doc.pop('a'))
+        self.assertEqual('x', doc.pop('missing', 'x'))
+        self.assertEqual({'a': 'b'}, doc.deleted)
+
+    def test_clear_notes_deletions(self):
+        doc = Document({'a': 'b', 'c': 'd'})
+        doc.clear()
+        self.assertEqual({'a': 'b', 'c': 'd'}, doc.deleted)
+
+    def test_to_update_without_changes(self):
+        doc = Document({'a': 'b', 'c': {'d': 'e'}, 'f': [{'g': 'h'}]})
+        self.assertEqual({}, doc.to_update())
+
+    def test_to_update(self):
+        doc = Document({'a': 'b', 'c': 'd'})
+        doc['a'] = 'e'
+        doc['f'] = {'g': 'h'}
+        del doc['c']
+        self.assertEqual({'$set': {'a': 'e', 'f': {'g': 'h'}},
+                          '$unset': {'c': ''}},
+                         doc.to_update())
+        self.assertNotIsInstance(doc.to_update()['$set']['f'], Document)
+
+    def test_to_update_uses_dotted_paths_for_nested_documents(self):
+        doc = Document({'a': {'b': {'c': 'd', 'e': 'f'}}, 'g': 'h'})
+        doc['a']['b']['c'] = 'i'
+        del doc['a']['b']['e']
+        self.assertEqual({'$set': {'a.b.c': 'i'}, '$unset': {'a.b.e': ''}},
+                         doc.to_update())
+
+    def test_to_update_reaches_into_documents_within_lists(self):
+        doc = Document({'a': [{'b': 'c'}, {'b': 'd'}]})
+        doc['a'][1]['b'] = 'e'
+        self.assertEqual({'$set': {'a.1.b': 'e'}}, doc.to_update())
+
+    def test_to_update_writes_replaced_subdocument_in_full(self):
+        doc = Document({'a': {'b': 'c'}})
+        doc['a'] = {'d': 'e'}
+        doc['a']['f'] = 'g'
+        self.assertEqual({'$set': {'a': {'d': 'e', 'f': 'g'}}}, doc.to_update())
+
+    def test_to_update_after_reset_all_changes(self):
+        doc = Document({'a': [{'b': 'c'}], 'd': {'e': 'f'}})
+        doc['a'].append({'g': 'h'})
+        doc['d']['e'] = 'i'
+        doc.reset_all_changes()
+        self.assertEqual({}, doc.to_update())
+
+    def test_copy_on_write(self):
+        doc = Document({'a': 'b', 'c': {'d': 'e'}, 'f': [{'g': 'h'}]})
+        doc['a'] = 'i'
+        copy = doc.copy_on_write()
+        self.assertIsInstance(copy, Document)
+        self.assertEqual(doc, copy)
+        self.assertEqual({'a': 'i'}, copy.changed)
+        self.assertIs(dict.__getitem__(doc, 'c'), dict.__getitem__(copy, 'c'))
+
+        copy['c']['d'] = 'j'
+        copy['f'][0]['g'] = 'k'
+        copy['l'] = 'm'
+        self.assertEqual({'a': 'i', 'c': {'d': 'e'}, 'f': [{'g': 'h'}]}, doc)
+        self.assertEqual({'a': 'i', 'c': {'d': 'j'}, 'f': [{'g': 'k'}], 'l': 'm'}, copy)
+        self.assertEqual({}, doc['c'].changed)
+        self.assertEqual({'d': 'j'}, copy['c'].changed)
+        self.assertEqual({'$set': {'a': 'i', 'c.d': 'j', 'f.0.g': 'k', 'l': 'm'}},
+                         copy.to_update())
+
+    def test_copy_on_write_copies_values_handed_out(self):
+        accessors = [
+            lambda d: d.get('a'),
+            lambda d: d.setdefault('a', {}),
+            lambda d: d.pop('a'),
+            lambda d: dict(d.items())['a'],
+            lambda d: dict(d.iteritems())['a'],
+            lambda d: d.values()[0],
+            lambda d: list(d.itervalues())[0],
+            lambda d: d['b'][0],
+            lambda d: d['b'][-1],
+            lambda d: d['b'][0:1][0],
+            lambda d: d['b'][::-1][0],
+            lambda d: list(d['b'])[0],
+            lambda d: list(reversed(d['b']))[0],
+            lambda d: d['b'].pop(),
+        ]
+        for access in accessors:
+            doc = Document({'a': {'c': 'd'}, 'b': [{'c': 'd'}]})
+            copy = doc.copy_on_write()
+            access(copy)['c'] = 'e'
+            self.assertEqual({'a': {'c': 'd'}, 'b': [{'c': 'd'}]}, doc)
+
+    def test_copy_on_write_carries_over_list_changes(self):
+        doc = Document({'a': [1]})
+        doc['a'].append(2)
+        copy = doc.copy_on_write()
+        copy['a'].append(3)
+        self.assertEqual([1, 2], doc['a'])
+        self.assertEqual({'$push': {'a': {'$each': [2, 3]}}}, copy.to_update())
+
+    def test_populate_from_copy_on_write(self):
+        doc = Document({'a': {'b': 'c'}, 'd': {'e': 'f'}})
+        copy = doc.copy_on_write()
+        copy['a']['b'] = 'g'
+        doc.populate(copy)
+        self.assertEqual({'a': {'b': 'g'}, 'd': {'e': 'f'}}, doc)
+        self.assertEqual({}, doc.to_update())
+        self.assertIsNone(doc._cow_shared)
+        self.assertIsNone(doc['a']._cow_shared)
+
+    def test_hydrate(self):
+        raw = {'a': 'b', 'c': {'d': 'e'}, 'f': [{'g': 'h'}, ['i']]}
+        doc = Document.hydrate(raw)
+        self.assertEqual(raw, doc)
+        self.assertIsInstance(doc['c'], Document)
+        self.assertIsInstance(doc['f'], DocumentList)
+        self.assertIsInstance(doc['f'][0], Document)
+        self.assertIsInstance(doc['f'][1], DocumentList)
+        self.assertNotIn('_change_tracker', doc.__dict__)
+        self.assertNotIn('_change_tracker', doc['c'].__dict__)
+
+    def test_hydrate_wraps_nested_values_on_first_access(self):
+        raw = {'a': {'b': {'c': 'd'}}, 'e': [{'f': 'g'}, {'h': 'i'}]}
+        doc = Document.hydrate(raw)
+        self.assertIs(raw['a'], dict.__getitem__(doc, 'a'))
+        self.assertIs(raw['e'], dict.__getitem__(doc, 'e'))
+
+        a = doc['a']
+        self.assertIsInstance(a, Document)
+        self.assertIs(a, doc['a'])
+        self.assertIs(raw['a']['b'], dict.__getitem__(a, 'b'))
+
+        e = doc.get('e')
+        self.assertIsInstance(e, DocumentList)
+        self.assertIs(raw['e'][1], list.__getitem__(e, 1))
+        self.assertIsInstance(e[1], Document)
+        self.assertIs(e[1], list.__getitem__(e, 1))
+
+    def test_hydrate_wraps_nested_values_on_iteration(self):
+        doc = Document.hydrate({'a': {'b': 'c'}, 'd': [{'e': 'f'}]})
+        for key, value in doc.iteritems():
+            self.assertNotIn(type(value), (dict, list))
+        for item in doc['d']:
+            self.assertIsInstance(item, Document)
+        self.assertTrue(all(type(value) is not dict for value in doc.values()))
+
+    def test_hydrated_document_never_changes_raw_values(self):
+        raw = {'a': {'b': {'c': 'd'}}, 'e': [{'f': 'g'}]}
+        doc = Document.hydrate(raw)
+        doc['a']['b']['c'] = 'x'
+        doc['e'][0]['f'] = 'y'
+        doc['e'].append({'z': 'z'})
+        self.assertEqual({'a': {'b': {'c': 'd'}}, 'e': [{'f': 'g'}]}, raw)
+        self.assertEqual({'$set': {'a.b.c': 'x', 'e': [{'f': 'y'}, {'z': 'z'}]}},
+                         doc.to_update())
+
+    def test_to_dict_copies_untouched_values(self):
+        raw = {'a': {'b': 'c'}, 'd': {'e': 'f'}, 'g': [{'h': 'i'}]}
+        doc = Document.hydrate(raw)
+        doc['d']['e'] = 'j'
+        output = doc.to_dict()
+        self.assertEqual({'b': 'c'}, output['a'])
+        self.assertIsNot(raw['a'], output['a'])
+        self.assertIsNot(raw['g'], output['g'])
+        self.assertEqual({'e': 'j'}, output['d'])
+        self.assertNotIsInstance(output['d'], Document)
+
+    def test_changing_to_dict_result_leaves_document_unchanged(self):
+        doc = Document.hydrate({'address': {'city': 'London'}, 'tags': [{'a': 'b'}]})
+        output = doc.to_dict()
+        output['address']['city'] = 'X'
+        output['tags'][0]['a'] = 'c'
+        self.assertEqual({'city': 'London'}, doc['address'])
+        self.assertEqual([{'a': 'b'}], doc['tags'])
+        self.assertEqual({}, doc.to_update())
+
+    def test_hydrated_document_tracks_changes(self):
+        doc = Document.hydrate({'a': 'b', 'c': {'d': 'e'}, 'f': [1]})
+        self.assertEqual({}, doc.changed)
+        self.assertEqual({}, doc.to_update())
+        doc['a'] = 'x'
+        doc['c']['d'] = 'y'
+        doc['f'].append(2)
+        self.assertEqual({'a': 'x'}, doc.changed)
+        self.assertEqual({'$set': {'a': 'x', 'c.d': 'y'}, '$push': {'f': {'$each': [2]}}},
+                         doc.to_update())
+
+    def test_populate(self):
+        doc = Document({'a': 'b', 'c': 'd'})
+        doc['a'] = 'e'
+        doc.populate({'f': {'g': 'h'}})
+        self.assertEqual({'f': {'g': 'h'}}, doc)
+        self.assertIsInstance(doc['f'], Document)
+        self.assertEqual({}, doc.changed)
+        self.assertEqual({}, doc.deleted)
+
+    def test_populate_copies_values(self):
+        src = {'a': {'b': 'c'}, 'd': [{'e': 'f'}]}
+        doc = Document.hydrate({'x': 'y'})
+        doc.populate(src)
+        src['a']['b'] = 'changed'
+        src['d'][0]['e'] = 'changed'
+        self.assertEqual({'a': {'b': 'c'}, 'd': [{'e': 'f'}]}, doc)
+
+    def test_populate_with_none_clears(self):
+        doc = Document({'a': 'b'})
+        doc.populate(None)
+        self.assertEqual({}, doc)
+        self.assertEqual({}, doc.deleted)
+
     def test_pickleable(self):
         doc = Document({
             'a': 'b',
@@ -255,6 +471,65 @@ class TestDocument(unittest.TestCase):
         self.assertFalse(codeced.changed)
         self.assertFalse(codeced.deleted)
 
+    def test_pickleable_with_changes(self):
+        doc = Document({'a': 'b', 'c': [1]})
+        doc['a'] = 'x'
+        doc['c'].append(2)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            codeced = pickle.loads(pickle.dumps(doc, protocol))
+            self.assertEqual({'a': ('b', 'x')}, codeced.changes)
+            self.assertEqual({'$set': {'a': 'x'}, '$push': {'c': {'$each': [2]}}},
+                             codeced.to_update())
+
+    def test_pickle_does_not_track_contents_of_unchanged_documents(self):
+        doc = Document({'a': 'b', 'c': [1, 2], 'd': {'e': 'f'}})
+        doc['a'] = 'x'
+        doc.reset_all_changes()
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            codeced = pickle.loads(pickle.dumps(doc, protocol))
+            self.assertEqual(doc, codeced)
+            self.assertEqual({}, codeced.added)
+            self.assertEqual({}, codeced.to_update())
+            codeced['d']['e'] = 'g'
+            self.assertEqual({'$set': {'d.e': 'g'}}, codeced.to_update())
+
+    def test_pickle_hydrated_document(self):
+        doc = Document.hydrate({'a': 'b', 'c': [1, 2], 'd': {'e': 'f'}})
+        codeced = pickle.loads(pickle.dumps(doc, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual({'a': 'b', 'c': [1, 2], 'd': {'e': 'f'}}, codeced)
+        codeced['a'] = 'x'
+        self.assertEqual({'$set': {'a': 'x'}}, codeced.to_update())
+
+    def test_change_tracker_only_created_on_first_change(self):
+        doc = Document({'a': 'b', 'c': {'d': 'e'}, 'f': [1]})
+        self.assertEqual({}, doc.changed)
+        self.assertEqual({}, doc.added)
+        self.assertEqual({}, doc.deleted)
+        self.assertEqual({}, doc.to_update())
+        doc.reset_all_changes()
+        self.assertIsNone(doc._change_tracker)
+        self.assertIsNone(doc['c']._change_tracker)
+        self.assertIsNone(doc['f']._change_tracker)
+
+        doc['c']['d'] = 'x'
+        self.assertIsNone(doc._change_tracker)
+        self.assertIsNotNone(doc['c']._change_tracker)
+        self.assertEqual({'$set': {'c.d': 'x'}}, doc.to_update())
+
+    def test_deleted_of_unchanged_document_is_not_shared(self):
+        doc = Document({'a': 'b'})
+        doc.deleted['x'] = 'y'
+        self.assertEqual({}, Document({'a': 'b'}).deleted)
+
+    def test_add_and_delete_many_fields(self):
+        doc = Document()
+        for i in range(1000):
+            doc[str(i)] = i
+        for i in range(0, 1000, 2):
+            del doc[str(i)]
+        self.assertEqual(dict((str(i), i) for i in range(1, 1000, 2)), doc.added)
+        self.assertEqual({}, doc.deleted)
+
     def test_to_dict(self):
         doc = Document({
             'a': 'b',
@@ -327,3 +602,87 @@ class TestDocumentList(unittest.TestCase):
         dlist.pop(0)
         self.assertEquals(dlist, [{'a': 'c'}])
 
+    def test_to_update_pushes_appended_items(self):
+        doc = Document({'a': [{'b': 'c'}]})
+        doc['a'].append({'d': 'e'})
+        doc['a'].extend([{'f': 'g'}])
+        doc['a'][2]['f'] = 'h'
+        self.assertEqual({'$push': {'a': {'$each': [{'d': 'e'}, {'f': 'h'}]}}},
+                         doc.to_update())
+
+    def test_to_update_pulls_removed_items(self):
+        doc = Document({'a': ['b', 'c', 'd', 'e']})
+        doc['a'].remove('c')
+        doc['a'].pop(0)
+        del doc['a'][-1]
+        self.assertEqual({'$pull': {'a': {'$in': ['c', 'b', 'e']}}}, doc.to_update())
+
+    def test_to_update_rewrites_list_when_pulled_value_remains(self):
+        doc = Document({'a': ['b', 'c', 'b']})
+        doc['a'].remove('b')
+        self.assertEqual({'$set': {'a': ['c', 'b']}}, doc.to_update())
+
+    def test_to_update_rewrites_list_when_removing_documents(self):
+        doc = Document({'a': [{'b': 'c'}, {'d': 'e'}]})
+        doc['a'].pop()
+        self.assertEqual({'$set': {'a': [{'b': 'c'}]}}, doc.to_update())
+
+    def test_to_update_sets_replaced_items_by_position(self):
+        doc = Document({'a': [{'b': 1}, {'b': 2}, {'b': 3}, {'b': 4}]})
+        doc['a'][3] = {'b': 5}
+        doc['a'][-3] = {'b': 6}
+        doc['a'][2]['b'] = 7
+        self.assertEqual({'$set': {'a.1': {'b': 6}, 'a.2.b': 7, 'a.3': {'b': 5}}},
+                         doc.to_update())
+
+    def test_to_update_ignores_appended_then_removed_items(self):
+        doc = Document({'a': ['b']})
+        doc['a'].append('c')
+        doc['a'].append('d')
+        doc['a'].remove('c')
+        doc['a'][1] = 'e'
+        self.assertEqual({'$push': {'a': {'$each': ['e']}}}, doc.to_update())
+        doc['a'].pop()
+        self.assertEqual({}, doc.to_update())
+
+    def test_to_update_rewrites_list_on_mixed_changes(self):
+        doc = Document({'a': ['b', 'c']})
+        doc['a'].append('d')
+        doc['a'].remove('b')
+        self.assertEqual({'$set': {'a': ['c', 'd']}}, doc.to_update())
+
+        doc = Document({'a': [{'b': 'c'}]})
+        doc['a'][0]['b'] = 'd'
+        doc['a'].append('e')
+        self.assertEqual({'$set': {'a': [{'b': 'd'}, 'e']}}, doc.to_update())
+
+    def test_to_update_rewrites_list_after_reordering(self):
+        for reorder in [lambda l: l.sort(), lambda l: l.reverse(),
+                        lambda l: l.insert(0, 'd'), lambda l: l.__setslice__(0, 1, ['d']),
+                        lambda l: l.__delslice__(0, 1), lambda l: l.__imul__(2)]:
+            doc = Document({'a': ['c', 'b']})
+            reorder(doc['a'])
+            self.assertEqual({'$set': {'a': list(doc['a'])}}, doc.to_update())
+
+    def test_to_update_within_nested_lists(self):
+        doc = Document({'a': [{'b': [1, 2]}, {'b': [3]}]})
+        doc['a'][1]['b'].append(4)
+        doc['a'][0]['b'][0] = 5
+        self.assertEqual({'$set': {'a.0.b.0': 5}, '$push': {'a.1.b': {'$each': [4]}}},
+                         doc.to_update())
+
+    def test_deepcopy_keeps_list_changes(self):
+        from copy import deepcopy
+        doc = Document({'a': [1]})
+        doc['a'].append(2)
+        self.assertEqual({'$push': {'a': {'$each': [2]}}}, deepcopy(doc).to_update())
+
+    def test_to_update_of_unchanged_list_with_changed_items(self):
+        doc = Document({'a': [{'b': 1}]})
+        doc['a'][0]['b'] = 2
+        self.assertEqual({'$set': {'a.0.b': 2}}, doc.to_update())
+        self.assertIsNone(doc['a']._change_tracker)
+
+    def test_pop_from_empty_list(self):
+        with self.assertRaises(IndexError):
+            DocumentList().pop()
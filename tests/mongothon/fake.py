@@ -30,3 +30,108 @@ class FakeCursor(object):
 
     def count(self):
         return len(self._contents)
+
+
+def _resolved(value):
+    from tornado.concurrent import Future
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _roundtrip(document):
+    """Returns a copy of the given document as Mongo would store it."""
+    from bson import BSON
+    return BSON.encode(document).decode()
+
+
+class FakeMotorCursor(object):
+    """A fake cursor which emulates a motor cursor."""
+    def __init__(self, contents):
+        self._contents = contents
+        self._next = 0
+        self.to_list_calls = []
+
+    def batch_size(self, batch_size):
+        return self
+
+    def limit(self, limit):
+        self._contents = self._contents[:limit]
+        return self
+
+    def to_list(self, length):
+        self.to_list_calls.append(length)
+        end = len(self._contents) if length is None else self._next + length
+        batch = self._contents[self._next:end]
+        self._next += len(batch)
+        return _resolved(batch)
+
+    def count(self):
+        return _resolved(len(self._contents))
+
+
+class FakeMotorCollection(object):
+    """
+    An in-memory stand-in for a motor collection, supporting equality queries
+    and $set/$unset updates of top-level fields.
+    """
+    def __init__(self, name, documents=()):
+        self.name = name
+        self.documents = [_roundtrip(document) for document in documents]
+
+    def _matching(self, spec):
+        return [document for document in self.documents
+                if all(document.get(key) == value for key, value in (spec or {}).items())]
+
+    def find_one(self, spec=None, *args, **kwargs):
+        matching = self._matching(spec)
+        return _resolved(_roundtrip(matching[0]) if matching else None)
+
+    def find(self, spec=None, *args, **kwargs):
+        return FakeMotorCursor([_roundtrip(document) for document in self._matching(spec)])
+
+    def insert_one(self, document, **kwargs):
+        from bson import ObjectId
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        self.documents.append(_roundtrip(document))
+        return _resolved(None)
+
+    def replace_one(self, spec, document, upsert=False, **kwargs):
+        matching = self._matching(spec)
+        if matching:
+            self.documents[self.documents.index(matching[0])] = _roundtrip(document)
+        elif upsert:
+            self.documents.append(_roundtrip(document))
+        return _resolved(None)
+
+    def update_one(self, spec, update, **kwargs):
+        for document in self._matching(spec)[:1]:
+            document.update(update.get('$set', {}))
+            for key in update.get('$unset', {}):
+                del document[key]
+        return _resolved(None)
+
+    def delete_one(self, spec, **kwargs):
+        for document in self._matching(spec)[:1]:
+            self.documents.remove(document)
+        return _resolved(None)
+
+    def update_many(self, spec, update, **kwargs):
+        matching = self._matching(spec)
+        for document in matching:
+            document.update(update.get('$set', {}))
+            for key in update.get('$unset', {}):
+                del document[key]
+        from pymongo.results import UpdateResult
+        return _resolved(UpdateResult({'n': len(matching), 'nModified': len(matching)}, True))
+
+    def delete_many(self, spec, **kwargs):
+        matching = self._matching(spec)
+        for document in matching:
+            self.documents.remove(document)
+        from pymongo.results import DeleteResult
+        return _resolved(DeleteResult({'n': len(matching)}, True))
+
+    def count_documents(self, spec, **kwargs):
+        return _resolved(len(self._matching(spec)))
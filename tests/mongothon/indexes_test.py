@@ -0,0 +1,66 @@
+from mongothon.indexes import Index, query_fields, find_index, plan_stages
+from unittest import TestCase
+
+
+class TestIndex(TestCase):
+
+    def test_keys(self):
+        self.assertEqual([('email', 1)], Index('email').keys)
+        self.assertEqual([('team_id', 1), ('created_date', -1)],
+                         Index(['team_id', ('created_date', -1)]).keys)
+        self.assertEqual('team_id_1_created_date_-1',
+                         Index([('team_id', 1), ('created_date', -1)]).name)
+        self.assertEqual('by_email', Index('email', name='by_email').name)
+
+    def test_index_model(self):
+        document = Index('created_date', ttl=3600, unique=True, sparse=True,
+                         partial={'status': 'new'}, background=True).index_model().document
+        self.assertEqual({'created_date': 1}, dict(document['key']))
+        self.assertEqual('created_date_1', document['name'])
+        self.assertEqual(3600, document['expireAfterSeconds'])
+        self.assertEqual({'status': 'new'}, document['partialFilterExpression'])
+        self.assertTrue(document['unique'])
+        self.assertTrue(document['sparse'])
+        self.assertTrue(document['background'])
+
+    def test_supports_queries_on_its_fields(self):
+        index = Index([('team_id', 1), ('status', 1), ('created_date', -1)])
+        self.assertTrue(index.supports({'team_id': 1}))
+        self.assertTrue(index.supports({'team_id': 1, 'status': {'$in': ['a', 'b']}}))
+        self.assertTrue(index.supports({'$and': [{'team_id': 1}, {'created_date': {'$gt': 1}}]}))
+        self.assertFalse(index.supports({'status': 'new'}))
+        self.assertFalse(index.supports({'team_id': 1, 'other': 2}))
+        self.assertFalse(index.supports({'$or': [{'team_id': 1}, {'team_id': 2}]}))
+        self.assertFalse(index.supports({}))
+
+    def test_supports_sorts_following_equality_fields(self):
+        index = Index([('team_id', 1), ('status', 1), ('created_date', -1)])
+        self.assertTrue(index.supports({'team_id': 1, 'status': 'new'}, [('created_date', -1)]))
+        self.assertTrue(index.supports({'team_id': 1, 'status': 'new'}, [('created_date', 1)]))
+        self.assertTrue(index.supports({'team_id': 1}, [('status', -1), ('created_date', 1)]))
+        self.assertTrue(index.supports({}, [('team_id', 1)]))
+        self.assertFalse(index.supports({'team_id': 1}, [('status', 1), ('created_date', 1)]))
+        self.assertFalse(index.supports({'team_id': 1}, [('created_date', -1)]))
+        self.assertFalse(index.supports({'team_id': {'$gt': 1}, 'status': 'new'},
+                                        [('created_date', -1)]))
+
+    def test_partial_index_only_supports_queries_on_its_filter(self):
+        index = Index('due_date', partial={'status': 'unpaid'})
+        self.assertFalse(index.supports({'due_date': {'$lt': 5}}))
+        self.assertTrue(index.supports({'due_date': {'$lt': 5}, 'status': 'unpaid'}))
+
+    def test_query_fields(self):
+        self.assertEqual({'a': True, 'b': False, 'c': True, 'd': True},
+                         query_fields({'a': 1, 'b': {'$gt': 1}, 'c': {'$eq': 2},
+                                       '$and': [{'d': {'x': 1}}]}))
+        self.assertIsNone(query_fields({'$where': 'true'}))
+
+    def test_find_index(self):
+        indexes = [Index('a'), Index('b')]
+        self.assertIs(indexes[1], find_index(indexes, {'b': 1}))
+        self.assertIsNone(find_index(indexes, {'c': 1}))
+
+    def test_plan_stages(self):
+        plan = {'stage': 'FETCH', 'inputStage': {'stage': 'OR', 'inputStages': [
+            {'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'}]}}
+        self.assertEqual(['FETCH', 'OR', 'IXSCAN', 'COLLSCAN'], plan_stages(plan))
@@ -1,11 +1,23 @@
 from mongothon import create_model, create_model_offline
-from pickle import dumps, loads
+from pickle import dumps, loads, HIGHEST_PROTOCOL
 from unittest import TestCase
-from mock import Mock, ANY, call, NonCallableMock
-from mongothon import Document, Schema, NotFoundException, Array
+from mock import Mock, ANY, call, patch, NonCallableMock
+from mongothon import Document, Schema, NotFoundException, BulkSaveException, Array
+from mongothon import Index, UnindexedQueryException
+from pymongo import InsertOne, ReplaceOne, UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError
+from schemer import ValidationException
 from mongothon.validators import one_of
 from mongothon.scopes import STANDARD_SCOPES
-from bson import ObjectId
+from mongothon.cache import LRUCache
+from mongothon.model import CursorWrapper, CACHE_INVALIDATING_EVENTS
+from mongothon.queries import ScopeBuilder, WriteBatch
+from mongothon import pool
+import threading
+import time
+from bson import ObjectId, BSON
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
 from copy import deepcopy
 from .fake import FakeCursor
 
@@ -89,6 +101,17 @@ class TestModel(TestCase):
         unpickled = loads(pickled)
         self.assertEqual(unpickled, Pickleable)
 
+    def test_saved_model_is_pickleable(self):
+        model = Pickleable.hydrate({'_id': ObjectId(), 'name': 'a', 'items': [1, 2]})
+        model['name'] = 'b'
+        model.save()
+        unpickled = loads(dumps(model, HIGHEST_PROTOCOL))
+        self.assertEqual(model, unpickled)
+        unpickled['name'] = 'c'
+        unpickled.save()
+        mock_collection.update_one.assert_called_with(
+            {'_id': model['_id']}, {'$set': {'name': 'c'}})
+
     def test_class_name_defaults_to_camelcased_collection_name(self):
         mock_collection = Mock()
         mock_collection.name = "some_model"
@@ -157,10 +180,117 @@ class TestModel(TestCase):
         except:
             self.assertFalse('doors' in self.car['trim'])
 
+    def test_save_rolls_back_handler_changes_if_save_fails(self):
+        @self.Car.on('will_save')
+        def handler(working):
+            working['wheels'][0]['tire'] = 'Goodyear'
+            working['options'].append('sunroof')
+
+        self.mock_collection.save = Mock(side_effect=Exception('IO error'))
+        with self.assertRaises(Exception):
+            self.car.save()
+        self.assertEqual(doc, self.car)
+
+    def test_working_copy_does_not_emit_did_init(self):
+        handler = Mock()
+        self.Car.on('did_init', handler)
+        self.car.save()
+        self.car.validate()
+        self.assertFalse(handler.called)
+
     def test_save_passes_arguments_to_collection(self):
         self.car.save(manipulate=False, safe=True, check_keys=False)
         self.mock_collection.save.assert_called_with(ANY, manipulate=False, safe=True, check_keys=False)
 
+    def test_save_persisted_sends_only_changes(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        car['make'] = 'Rover'
+        car['trim']['ac'] = True
+        car['wheels'][2]['tire'] = 'Goodyear'
+        del car['options']
+        car.save()
+        self.assertFalse(self.mock_collection.save.called)
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid},
+            {'$set': {'make': 'Rover', 'trim.ac': True, 'wheels.2.tire': 'Goodyear'},
+             '$unset': {'options': ''}})
+
+    def test_save_persisted_pushes_appended_list_items(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        car['options'].append('sunroof')
+        car['wheels'][0]['diameter'] = 23
+        car.save()
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid},
+            {'$set': {'wheels.0.diameter': 23},
+             '$push': {'options': {'$each': ['sunroof']}}})
+
+    def test_save_persisted_includes_applied_defaults(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        del car['trim']['doors']
+        car.save()
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid}, {'$set': {'trim.doors': 4}})
+        self.assertEqual(4, car['trim']['doors'])
+
+    def test_save_persisted_includes_will_save_changes(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+
+        @self.Car.on('will_save')
+        def touch(working):
+            working['model'] = '407'
+
+        car.save()
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid}, {'$set': {'model': '407'}})
+        self.assertEqual('407', car['model'])
+
+    def test_save_persisted_without_changes_skips_write(self):
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=ObjectId())
+        car.save()
+        self.assertFalse(self.mock_collection.update_one.called)
+        self.assertFalse(self.mock_collection.save.called)
+
+    def test_save_persisted_passes_arguments_to_update(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        car['make'] = 'Rover'
+        car.save(upsert=True)
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid}, {'$set': {'make': 'Rover'}}, upsert=True)
+
+    def test_save_persisted_translates_save_arguments(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        car['make'] = 'Rover'
+        car.save(False, w=1, j=True, manipulate=False, check_keys=False)
+        self.mock_collection.with_options.assert_called_once_with(
+            write_concern=WriteConcern(w=1, j=True))
+        self.mock_collection.with_options.return_value.update_one.assert_called_once_with(
+            {'_id': oid}, {'$set': {'make': 'Rover'}})
+        self.assertFalse(self.mock_collection.update_one.called)
+
+    def test_save_persisted_with_changed_id_saves_in_full(self):
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=ObjectId())
+        car['_id'] = ObjectId()
+        car.save()
+        self.mock_collection.save.assert_called_once_with(car)
+        self.assertFalse(self.mock_collection.update_one.called)
+
+    def test_save_persisted_then_save_again_sends_only_new_changes(self):
+        oid = ObjectId()
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        car['make'] = 'Rover'
+        car.save()
+        car['model'] = '75'
+        car.save()
+        self.mock_collection.update_one.assert_called_with(
+            {'_id': oid}, {'$set': {'model': '75'}})
+
     def test_save_changes_state_to_persisted(self):
         self.car.save()
         self.assert_predicates(self.car, is_persisted=True)
@@ -172,6 +302,106 @@ class TestModel(TestCase):
         self.assertFalse(self.car['trim'].changed)
         self.assertFalse(self.car.changed)
 
+    def test_save_many(self):
+        oid, new_oid = ObjectId(), ObjectId()
+        new_car = self.Car(doc)
+        new_car_with_id = self.Car(doc, _id=new_oid)
+        persisted_car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=oid)
+        persisted_car['make'] = 'Rover'
+        self.Car.save_many([new_car, new_car_with_id, persisted_car])
+        self.mock_collection.bulk_write.assert_called_once_with([
+            InsertOne(doc),
+            ReplaceOne({'_id': new_oid}, dict(doc, _id=new_oid), upsert=True),
+            UpdateOne({'_id': oid}, {'$set': {'make': 'Rover'}})], ordered=False)
+        for car in [new_car, new_car_with_id, persisted_car]:
+            self.assert_predicates(car, is_persisted=True)
+            self.assertFalse(car.changed)
+
+    def test_save_many_applies_defaults_and_emits_events(self):
+        will_save, did_save = Mock(), Mock()
+        self.Car.on('will_save', will_save)
+        self.Car.on('did_save', did_save)
+        del self.car['trim']['doors']
+        self.Car.save_many([self.car])
+        self.assertEqual(4, self.car['trim']['doors'])
+        self.assertEqual(1, will_save.call_count)
+        self.assertEqual(1, did_save.call_count)
+        self.assertEqual(4, will_save.call_args[0][0]['trim']['doors'])
+
+    def test_save_many_in_batches(self):
+        cars = [self.Car(doc) for _ in range(5)]
+        self.Car.save_many(cars, batch_size=2, bypass_document_validation=True)
+        self.assertEqual([2, 2, 1], [len(c[0][0]) for c in self.mock_collection.bulk_write.call_args_list])
+        self.mock_collection.bulk_write.assert_called_with(
+            ANY, ordered=False, bypass_document_validation=True)
+
+    def test_save_many_skips_unchanged_persisted_models(self):
+        car = self.Car(doc, initial_state=self.Car.PERSISTED, _id=ObjectId())
+        did_save = Mock()
+        self.Car.on('did_save', did_save)
+        self.Car.save_many([car])
+        self.assertFalse(self.mock_collection.bulk_write.called)
+        did_save.assert_called_once_with(ANY)
+
+    def _car_without_make(self):
+        # Uses its own schema since some tests stub out car_schema.validate
+        Car = create_model(Schema({"make": {"type": basestring, "required": True}}),
+                           self.mock_collection)
+        return Car, [Car(make='Peugeot'), Car(), Car(make='Volvo')]
+
+    def test_save_many_reports_validation_errors(self):
+        Car, cars = self._car_without_make()
+        invalid_car = cars[1]
+        with self.assertRaises(BulkSaveException) as context:
+            Car.save_many(cars)
+        [(model, error)] = context.exception.errors
+        self.assertIs(invalid_car, model)
+        self.assertIsInstance(error, ValidationException)
+        self.assertEqual([invalid_car], context.exception.unsaved)
+        self.assertEqual(2, len(self.mock_collection.bulk_write.call_args[0][0]))
+        self.assert_predicates(cars[0], is_persisted=True)
+        self.assert_predicates(invalid_car, is_new=True)
+        self.assert_predicates(cars[2], is_persisted=True)
+
+    def test_save_many_reports_write_errors(self):
+        write_error = {'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}
+        self.mock_collection.bulk_write.side_effect = BulkWriteError(
+            {'writeErrors': [write_error]})
+        did_save = Mock()
+        self.Car.on('did_save', did_save)
+        cars = [self.Car(doc) for _ in range(3)]
+        with self.assertRaises(BulkSaveException) as context:
+            self.Car.save_many(cars)
+        self.assertEqual([(cars[1], write_error)], context.exception.errors)
+        self.assertEqual([cars[1]], context.exception.unsaved)
+        self.assertEqual(2, did_save.call_count)
+        self.assert_predicates(cars[1], is_new=True)
+
+    def test_save_many_ordered_stops_at_first_write_error(self):
+        write_error = {'index': 0, 'code': 11000, 'errmsg': 'duplicate key'}
+        self.mock_collection.bulk_write.side_effect = BulkWriteError(
+            {'writeErrors': [write_error]})
+        cars = [self.Car(doc) for _ in range(4)]
+        with self.assertRaises(BulkSaveException) as context:
+            self.Car.save_many(cars, ordered=True, batch_size=2)
+        self.assertEqual([(cars[0], write_error)], context.exception.errors)
+        self.assertEqual(cars, context.exception.unsaved)
+        self.assertEqual(1, self.mock_collection.bulk_write.call_count)
+
+    def test_save_many_ordered_stops_at_first_invalid_model(self):
+        Car, cars = self._car_without_make()
+        with self.assertRaises(BulkSaveException) as context:
+            Car.save_many(cars, ordered=True)
+        self.assertEqual(cars[1:], context.exception.unsaved)
+        self.mock_collection.bulk_write.assert_called_once_with(
+            [InsertOne({'make': 'Peugeot'})], ordered=True)
+
+    def test_save_many_raises_unattributable_bulk_errors(self):
+        self.mock_collection.bulk_write.side_effect = BulkWriteError(
+            {'writeConcernErrors': [{'errmsg': 'timed out'}]})
+        with self.assertRaises(BulkWriteError):
+            self.Car.save_many([self.car])
+
     def test_remove(self):
         oid = ObjectId()
         self.car['_id'] = oid
@@ -209,8 +439,16 @@ class TestModel(TestCase):
             {'_id': oid}, {'model': '106'})
 
     def test_count(self):
-        self.mock_collection.count.return_value = 45
+        self.mock_collection.count_documents.return_value = 45
         self.assertEquals(45, self.Car.count())
+        self.mock_collection.count_documents.assert_called_with({})
+        self.Car.count({'make': 'Peugeot'}, limit=10)
+        self.mock_collection.count_documents.assert_called_with({'make': 'Peugeot'}, limit=10)
+
+    def test_estimated_count(self):
+        self.mock_collection.estimated_document_count.return_value = 45
+        self.assertEquals(45, self.Car.estimated_count())
+        self.mock_collection.estimated_document_count.assert_called_once_with()
 
     def test_find_one(self):
         self.mock_collection.find_one.return_value = doc
@@ -219,6 +457,27 @@ class TestModel(TestCase):
         self.assert_predicates(loaded_car, is_persisted=True)
         self.mock_collection.find_one.assert_called_with({'make': 'Peugeot'})
 
+    def test_find_one_result_tracks_changes(self):
+        oid = ObjectId()
+        self.mock_collection.find_one.return_value = dict(doc, _id=oid)
+        loaded_car = self.Car.find_one({'_id': oid})
+        self.assertEqual({}, loaded_car.changed)
+        loaded_car['trim']['doors'] = 3
+        loaded_car.save()
+        self.mock_collection.update_one.assert_called_once_with(
+            {'_id': oid}, {'$set': {'trim.doors': 3}})
+
+    def test_hydrate(self):
+        init_handler, find_handler = Mock(), Mock()
+        self.Car.on('did_init', init_handler)
+        self.Car.on('did_find', find_handler)
+        car = self.Car.hydrate(doc)
+        self.assertIsInstance(car, self.Car)
+        self.assertEqual(doc, car)
+        self.assert_predicates(car, is_persisted=True)
+        init_handler.assert_called_once_with(car)
+        find_handler.assert_called_once_with(car)
+
     def test_find_one_missing_record(self):
         self.mock_collection.find_one.return_value = None
         loaded_car = self.Car.find_one({'make': 'Peugeot'})
@@ -245,6 +504,145 @@ class TestModel(TestCase):
         self.assertIsInstance(iter1.next(), self.Car)
         self.assertIsInstance(iter2.next(), self.Car)
 
+    def test_prefetch(self):
+        thread_names = []
+        self.Car.on('did_find', lambda car: thread_names.append(threading.current_thread().name))
+        docs = [{'make': 'Peugeot', 'model': str(i)} for i in range(25)]
+        self.mock_collection.find.return_value = FakeCursor(docs)
+        cars = list(self.Car.find().batch_size(10).prefetch())
+        self.assertEqual(docs, cars)
+        for car in cars:
+            self.assertIsInstance(car, self.Car)
+            self.assert_predicates(car, is_persisted=True)
+        self.assertEqual([threading.current_thread().name] * 25, thread_names)
+
+    def test_prefetch_is_bounded(self):
+        fetched = []
+
+        def documents():
+            for i in range(100):
+                fetched.append(i)
+                yield {'make': str(i)}
+
+        cars = CursorWrapper(documents(), self.Car, batch_size=10).prefetch(depth=2)
+        self.assertEqual('0', cars.next()['make'])
+        time.sleep(0.2)
+        # The batch being handed out, two queued and one waiting to be queued
+        self.assertLessEqual(len(fetched), 40)
+        self.assertEqual(range(1, 100), [int(car['make']) for car in cars])
+
+    def test_prefetch_rejects_invalid_depth(self):
+        self.mock_collection.find.return_value = FakeCursor([])
+        with self.assertRaises(ValueError):
+            self.Car.find().prefetch(depth=0)
+
+    def test_prefetch_raises_cursor_errors(self):
+        def documents():
+            yield {'make': 'Peugeot'}
+            raise ValueError('cursor error')
+
+        cars = CursorWrapper(documents(), self.Car, batch_size=1).prefetch()
+        self.assertEqual('Peugeot', cars.next()['make'])
+        self.assertRaises(ValueError, cars.next)
+        self.assertRaises(StopIteration, cars.next)
+
+    def test_prefetch_close_stops_worker(self):
+        def documents():
+            while True:
+                yield {'make': 'Peugeot'}
+
+        with CursorWrapper(documents(), self.Car, batch_size=5).prefetch() as cars:
+            cars.next()
+        cars._thread.join(2)
+        self.assertFalse(cars._thread.is_alive())
+        self.assertRaises(StopIteration, cars.next)
+
+    def test_prefetch_within_session(self):
+        oid = ObjectId()
+        self.mock_collection.find_one.return_value = {'_id': oid, 'make': 'Peugeot'}
+        self.mock_collection.find.return_value = FakeCursor([{'_id': oid, 'make': 'Peugeot'}])
+        with self.Car.session():
+            car = self.Car.find_by_id(oid)
+            self.assertIs(car, list(self.Car.find().prefetch())[0])
+
+    def _raw_collection(self):
+        self.mock_collection.codec_options = CodecOptions()
+        raw_collection = Mock()
+        self.mock_collection.with_options.return_value = raw_collection
+        return raw_collection
+
+    def test_find_one_raw(self):
+        raw_collection = self._raw_collection()
+        raw_collection.find_one.return_value = RawBSONDocument(BSON.encode(doc))
+        car = self.Car.find_one({'make': 'Peugeot'}, raw=True)
+        self.assertIsInstance(car, self.Car)
+        self.assert_predicates(car, is_persisted=True)
+        self.assertEqual('Peugeot', car['make'])
+        self.assertIsInstance(car['trim'], RawBSONDocument)
+        self.assertEqual(5, car['trim']['doors'])
+        self.assertEqual(doc, car.to_dict())
+        raw_collection.find_one.assert_called_once_with({'make': 'Peugeot'})
+        codec_options = self.mock_collection.with_options.call_args[1]['codec_options']
+        self.assertIs(RawBSONDocument, codec_options.document_class)
+
+    def test_find_one_raw_missing_record(self):
+        self._raw_collection().find_one.return_value = None
+        self.assertIsNone(self.Car.find_one({'make': 'Peugeot'}, raw=True))
+
+    def test_find_raw(self):
+        raw_collection = self._raw_collection()
+        raw_collection.find.return_value = FakeCursor([
+            RawBSONDocument(BSON.encode({'make': 'Peugeot', 'model': '405'})),
+            RawBSONDocument(BSON.encode({'make': 'Peugeot', 'model': '205'}))])
+        cars = self.Car.find({'make': 'Peugeot'}, raw=True)
+        self.assertEqual(['405', '205'], [car['model'] for car in cars])
+        self.assertIsInstance(cars[0], self.Car)
+        self.assertEqual({'make': 'Peugeot', 'model': '405'}, cars[0])
+        raw_collection.find.assert_called_once_with({'make': 'Peugeot'})
+        self.assertFalse(self.mock_collection.find.called)
+
+    def test_raw_models_behave_as_mappings(self):
+        self._raw_collection().find_one.return_value = RawBSONDocument(
+            BSON.encode({'make': 'Peugeot', 'model': '405'}))
+        car = self.Car.find_one({}, raw=True)
+        self.assertIn('make', car)
+        self.assertEqual(2, len(car))
+        self.assertEqual(set(['make', 'model']), set(car))
+        self.assertEqual('405', car.get('model'))
+        self.assertIsNone(car.get('trim'))
+        self.assertEqual({'make': 'Peugeot', 'model': '405'}, dict(car.items()))
+
+    def test_raw_models_are_read_only(self):
+        self._raw_collection().find_one.return_value = RawBSONDocument(BSON.encode(doc))
+        car = self.Car.find_one({}, raw=True)
+
+        def set_make():
+            car['make'] = 'Volvo'
+
+        def del_make():
+            del car['make']
+
+        for operation in [set_make, del_make, lambda: car.update(make='Volvo'),
+                          lambda: car.pop('make'), car.clear, car.save, car.remove,
+                          car.validate, car.reload]:
+            self.assertRaises(TypeError, operation)
+        self.assertFalse(self.mock_collection.save.called)
+        self.assertEqual('Peugeot', car['make'])
+
+    def test_raw_models_do_not_emit_events(self):
+        handler = Mock()
+        self.Car.on('did_init', handler)
+        self.Car.on('did_find', handler)
+        self._raw_collection().find_one.return_value = RawBSONDocument(BSON.encode(doc))
+        self.Car.find_one({}, raw=True)
+        self.assertFalse(handler.called)
+
+    def test_read_only_class_is_reused(self):
+        ReadOnlyCar = self.Car.read_only()
+        self.assertIs(ReadOnlyCar, self.Car.read_only())
+        self.assertIs(ReadOnlyCar, ReadOnlyCar.read_only())
+        self.assertTrue(issubclass(ReadOnlyCar, self.Car))
+        self.assertEqual('ReadOnlyCar', ReadOnlyCar.__name__)
 
     def test_find_by_id(self):
         self.mock_collection.find_one.return_value = doc
@@ -254,6 +652,295 @@ class TestModel(TestCase):
         self.assert_predicates(loaded_car, is_persisted=True)
         self.mock_collection.find_one.assert_called_with({'_id': oid})
 
+    def _find_by_query(self, docs):
+        def find(query, **kwargs):
+            return FakeCursor([d for d in docs if d['_id'] in query['_id']['$in']])
+        self.mock_collection.find.side_effect = find
+
+    def test_find_by_ids(self):
+        oids = [ObjectId() for _ in range(3)]
+        self._find_by_query([{'_id': oid, 'make': str(i)} for i, oid in enumerate(oids)])
+        cars = self.Car.find_by_ids([oids[2], str(oids[0]), oids[1]])
+        self.assertEqual(['2', '0', '1'], [car['make'] for car in cars])
+        for car in cars:
+            self.assertIsInstance(car, self.Car)
+            self.assert_predicates(car, is_persisted=True)
+        self.mock_collection.find.assert_called_once_with(
+            {'_id': {'$in': [oids[2], oids[0], oids[1]]}})
+
+    def test_find_by_ids_in_chunks(self):
+        oids = [ObjectId() for _ in range(7)]
+        self._find_by_query([{'_id': oid} for oid in oids])
+        cars = self.Car.find_by_ids(oids, chunk_size=3, projection={'make': 1})
+        self.assertEqual(oids, [car['_id'] for car in cars])
+        self.assertEqual(3, self.mock_collection.find.call_count)
+        self.mock_collection.find.assert_any_call(
+            {'_id': {'$in': oids[6:]}}, projection={'make': 1})
+
+    def test_find_by_ids_queries_chunks_on_shared_pool(self):
+        oids = [ObjectId() for _ in range(7)]
+        self._find_by_query([{'_id': oid} for oid in oids])
+        with patch('mongothon.pool.imap', wraps=pool.imap) as imap:
+            cars = self.Car.find_by_ids(oids, chunk_size=3, max_workers=2)
+        self.assertEqual(oids, [car['_id'] for car in cars])
+        imap.assert_called_once_with(ANY, ANY, 2)
+
+    def test_find_by_ids_with_duplicate_ids(self):
+        oid = ObjectId()
+        self._find_by_query([{'_id': oid}])
+        cars = self.Car.find_by_ids([oid, oid])
+        self.assertIs(cars[0], cars[1])
+        self.mock_collection.find.assert_called_once_with({'_id': {'$in': [oid]}})
+
+    def test_find_by_ids_raises_for_missing_ids(self):
+        oids = [ObjectId() for _ in range(3)]
+        self._find_by_query([{'_id': oids[1]}])
+        with self.assertRaises(NotFoundException) as context:
+            self.Car.find_by_ids(oids)
+        self.assertEqual([oids[0], oids[2]], context.exception._id)
+
+    def test_find_by_ids_skips_missing_ids(self):
+        oids = [ObjectId() for _ in range(3)]
+        self._find_by_query([{'_id': oids[1]}])
+        cars = self.Car.find_by_ids(oids, missing='skip')
+        self.assertEqual([oids[1]], [car['_id'] for car in cars])
+
+    def test_find_by_ids_returns_none_for_missing_ids(self):
+        oids = [ObjectId() for _ in range(3)]
+        self._find_by_query([{'_id': oids[1]}])
+        cars = self.Car.find_by_ids(oids, missing='none')
+        self.assertEqual([None, oids[1], None], [car and car['_id'] for car in cars])
+
+    def test_find_by_ids_unordered(self):
+        oids = [ObjectId() for _ in range(3)]
+        self._find_by_query([{'_id': oids[2]}, {'_id': oids[0]}])
+        cars = self.Car.find_by_ids(oids, ordered=False, missing='none')
+        self.assertEqual([oids[2], oids[0]], [car['_id'] for car in cars])
+
+    def test_find_by_ids_rejects_unknown_missing_option(self):
+        with self.assertRaises(ValueError):
+            self.Car.find_by_ids([], missing='ignore')
+
+    def test_find_by_ids_without_ids(self):
+        self.assertEqual([], self.Car.find_by_ids([]))
+        self.assertFalse(self.mock_collection.find.called)
+
+    def _enable_cache(self, **kwargs):
+        self.mock_collection.codec_options = CodecOptions()
+        self.oid = ObjectId()
+        self.mock_collection.find_one.return_value = dict(doc, _id=self.oid)
+        return self.Car.enable_cache(**kwargs)
+
+    def test_find_by_id_cached(self):
+        self._enable_cache()
+        car = self.Car.find_by_id(self.oid)
+        cached_car = self.Car.find_by_id(self.oid)
+        self.assertEqual(dict(doc, _id=self.oid), cached_car)
+        self.assertIsInstance(cached_car, self.Car)
+        self.assert_predicates(cached_car, is_persisted=True)
+        self.assertIsNot(car, cached_car)
+        self.mock_collection.find_one.assert_called_once_with({'_id': self.oid})
+
+    def test_cached_models_are_independent_copies(self):
+        self._enable_cache()
+        self.Car.find_by_id(self.oid)['trim']['doors'] = 3
+        self.Car.find_by_id(self.oid)['trim']['doors'] = 2
+        self.assertEqual(5, self.Car.find_by_id(self.oid)['trim']['doors'])
+
+    def test_find_one_only_cached_for_id_lookups(self):
+        self._enable_cache()
+        self.Car.find_one({'_id': self.oid, 'make': 'Peugeot'})
+        self.Car.find_one({'_id': self.oid, 'make': 'Peugeot'})
+        self.Car.find_one({'_id': {'$in': [self.oid]}})
+        self.Car.find_one({'_id': {'$in': [self.oid]}})
+        self.Car.find_one({'_id': self.oid}, projection={'make': 1})
+        self.Car.find_one({'_id': self.oid}, projection={'make': 1})
+        self.assertEqual(6, self.mock_collection.find_one.call_count)
+
+    def test_missing_documents_are_not_cached(self):
+        self._enable_cache()
+        self.mock_collection.find_one.return_value = None
+        self.assertIsNone(self.Car.find_one({'_id': self.oid}))
+        self.assertIsNone(self.Car.find_one({'_id': self.oid}))
+        self.assertEqual(2, self.mock_collection.find_one.call_count)
+
+    def test_cache_uses_given_backend_and_ttl(self):
+        backend = Mock()
+        backend.get.return_value = None
+        self._enable_cache(backend=backend, ttl=60)
+        self.Car.find_by_id(self.oid)
+        version_key = self.Car._cache_key(self.oid)
+        self.assertEqual(2, backend.set.call_count)
+        backend.set.assert_any_call(version_key, ANY, 60)
+        version = [args[1] for args, _ in backend.set.call_args_list
+                   if args[0] == version_key][0]
+        backend.set.assert_any_call(u"{}:{}".format(version_key, version), ANY, 60)
+
+    def test_cache_fill_racing_invalidation_is_not_used(self):
+        cache = self._enable_cache()
+
+        def find_one(spec):
+            # The document is written, and its cached copy invalidated, after
+            # the lookup has fetched it but before it is cached.
+            self.Car(doc, _id=self.oid).save()
+            return dict(doc, _id=self.oid)
+
+        self.mock_collection.find_one.side_effect = find_one
+        self.Car.find_by_id(self.oid)
+        self.assertIsNone(cache.get(self.Car._document_cache_key(self.oid)))
+        self.mock_collection.find_one.side_effect = None
+        self.Car.find_by_id(self.oid)
+        self.Car.find_by_id(self.oid)
+        self.assertEqual(2, self.mock_collection.find_one.call_count)
+
+    def test_cache_invalidated_on_save(self):
+        cache = self._enable_cache()
+        car = self.Car.find_by_id(self.oid)
+        car['make'] = 'Rover'
+        car.save()
+        self.assertIsNone(cache.get(self.Car._document_cache_key(self.oid)))
+
+    def test_cache_invalidated_on_update_and_remove(self):
+        cache = self._enable_cache()
+        self.Car.find_by_id(self.oid).update_instance({'$set': {'make': 'Rover'}})
+        self.assertIsNone(cache.get(self.Car._document_cache_key(self.oid)))
+        self.Car.find_by_id(self.oid).remove()
+        self.assertIsNone(cache.get(self.Car._document_cache_key(self.oid)))
+
+    def test_cache_keys_are_independent_of_string_type(self):
+        self.assertEqual(self.Car._cache_key('abc'), self.Car._cache_key(u'abc'))
+        self.assertNotEqual(self.Car._cache_key('abc'), self.Car._cache_key(u'abd'))
+
+    def test_cache_invalidated_on_save_with_unicode_id(self):
+        self.mock_collection.codec_options = CodecOptions()
+        Plate = create_model(Schema({'_id': {'type': basestring}, 'make': {'type': basestring}}),
+                             self.mock_collection, 'Plate')
+        cache = Plate.enable_cache()
+        self.mock_collection.find_one.return_value = {'_id': u'abc', 'make': 'Peugeot'}
+        plate = Plate.find_by_id('abc')
+        self.assertIsNotNone(cache.get(Plate._document_cache_key(u'abc')))
+        plate['make'] = 'Rover'
+        plate.save()
+        self.assertIsNone(cache.get(Plate._document_cache_key(u'abc')))
+        Plate.find_by_id('abc')
+        self.assertEqual(2, self.mock_collection.find_one.call_count)
+
+    def test_cache_not_invalidated_for_other_documents(self):
+        cache = self._enable_cache()
+        self.Car.find_by_id(self.oid)
+        self.Car(doc, _id=ObjectId()).save()
+        self.assertIsNotNone(cache.get(self.Car._document_cache_key(self.oid)))
+
+    def test_disable_cache(self):
+        self._enable_cache()
+        self.Car.disable_cache()
+        self.Car.find_by_id(self.oid)
+        self.Car.find_by_id(self.oid)
+        self.assertEqual(2, self.mock_collection.find_one.call_count)
+        self.assertEqual([], self.Car.handlers('did_save'))
+
+    def test_enable_cache_defaults_to_lru_cache(self):
+        self.assertIsInstance(self._enable_cache(), LRUCache)
+
+    def test_raw_lookups_bypass_cache(self):
+        cache = self._enable_cache()
+        raw_collection = self._raw_collection()
+        raw_collection.find_one.return_value = RawBSONDocument(BSON.encode(doc))
+        self.Car.find_one({'_id': self.oid}, raw=True)
+        self.assertEqual(0, len(cache))
+
+    def _cached_scope_setup(self):
+        self.mock_collection.codec_options = CodecOptions()
+        self.oid = ObjectId()
+        self.mock_collection.find.side_effect = lambda *args, **kwargs: FakeCursor(
+            [dict(doc, _id=self.oid)])
+
+        @self.Car.scope
+        def peugeot():
+            return {'make': 'Peugeot'}, {}, {'sort': [('model', 1)]}
+
+        @self.Car.scope
+        def five_door():
+            return {'trim.doors': 5}
+
+    def test_cached_scope_results(self):
+        self._cached_scope_setup()
+        handler = Mock()
+        self.Car.on('did_find', handler)
+        cars = list(self.Car.peugeot().cached(ttl=30))
+        cached_cars = list(self.Car.peugeot().cached(ttl=30))
+        self.assertEqual([dict(doc, _id=self.oid)], cached_cars)
+        self.assertIsInstance(cached_cars[0], self.Car)
+        self.assertIsNot(cars[0], cached_cars[0])
+        self.assertEqual(2, handler.call_count)
+        self.mock_collection.find.assert_called_once_with(
+            {'make': 'Peugeot'}, None, sort=[('model', 1)])
+
+    def test_cached_scopes_are_keyed_by_query(self):
+        self._cached_scope_setup()
+        list(self.Car.peugeot().cached())
+        list(self.Car.peugeot().cached().five_door())
+        list(self.Car.peugeot().five_door().cached())
+        self.assertEqual(2, self.mock_collection.find.call_count)
+
+    def test_cached_scope_count(self):
+        self._cached_scope_setup()
+        self.mock_collection.count_documents.return_value = 1
+        self.assertEqual(1, self.Car.peugeot().cached().count())
+        self.assertEqual(1, self.Car.peugeot().cached().count())
+        self.assertEqual(1, self.mock_collection.count_documents.call_count)
+        self.assertEqual(1, self.Car.peugeot().cached().count(limit=5))
+        self.assertEqual(2, self.mock_collection.count_documents.call_count)
+
+    def test_cached_scopes_invalidated_by_writes(self):
+        self._cached_scope_setup()
+        cars = list(self.Car.peugeot().cached())
+        cars[0]['model'] = '405'
+        cars[0].save()
+        list(self.Car.peugeot().cached())
+        self.assertEqual(2, self.mock_collection.find.call_count)
+        self.Car(doc).save()
+        list(self.Car.peugeot().cached())
+        self.assertEqual(3, self.mock_collection.find.call_count)
+
+    def test_cached_scopes_invalidated_by_other_processes_sharing_the_cache(self):
+        self._cached_scope_setup()
+        backend = LRUCache()
+        self.Car.enable_cache(backend=backend)
+        # Another process with the same model and cache backend, which never
+        # caches scopes itself
+        OtherCar = create_model(car_schema, self.mock_collection, 'Car')
+        OtherCar.enable_cache(backend=backend)
+        try:
+            list(self.Car.peugeot().cached())
+            OtherCar(doc).save()
+            list(self.Car.peugeot().cached())
+            self.assertEqual(2, self.mock_collection.find.call_count)
+        finally:
+            OtherCar.remove_all_handlers()
+
+    def test_cached_scopes_register_handlers_once(self):
+        self._cached_scope_setup()
+        self.Car.on = Mock(wraps=self.Car.on)
+        try:
+            for _ in range(3):
+                list(self.Car.peugeot().cached())
+            self.assertEqual(len(CACHE_INVALIDATING_EVENTS), self.Car.on.call_count)
+        finally:
+            del self.Car.on
+
+    def test_cached_scopes_expire(self):
+        self._cached_scope_setup()
+        now = [1000.0]
+        self.Car.enable_cache(backend=LRUCache(clock=lambda: now[0]))
+        list(self.Car.peugeot().cached(ttl=30))
+        now[0] += 29
+        list(self.Car.peugeot().cached(ttl=30))
+        self.assertEqual(1, self.mock_collection.find.call_count)
+        now[0] += 2
+        list(self.Car.peugeot().cached(ttl=30))
+        self.assertEqual(2, self.mock_collection.find.call_count)
+
     def test_find_by_id_handles_integer_id(self):
         self.mock_collection.find_one.return_value = doc
         loaded_car = self.Car.find_by_id(33)
@@ -295,6 +982,13 @@ class TestModel(TestCase):
         self.mock_collection.find_one.assert_has_calls([
             call({'_id': oid}), call({'_id': oid})])
 
+    def test_reload_deleted_document(self):
+        oid = ObjectId()
+        self.mock_collection.find_one.side_effect = [dict(doc, _id=oid), None]
+        car = self.Car.find_by_id(oid)
+        car.reload()
+        self.assertEqual({}, car)
+
     def assert_returns_wrapped_cursor(self, attr_name):
         cursor = FakeCursor([{'make': 'Peugeot', 'model': '405'}, {'make': 'Peugeot', 'model': '205'}])
         self.mock_collection.find.return_value = cursor
@@ -618,10 +1312,183 @@ class TestModel(TestCase):
             {"trim.ac": True, "trim.doors": {"$in": [3, 5]}, "year": 2005},
             None,
             sort=[("make", -1)])
-        self.assertEqual(2, cars.count())
         for car in cars:
             self.assertIsInstance(car, self.Car)
 
+    def test_scope_exists(self):
+        @self.Car.scope
+        def with_ac(available=True):
+            return {"trim.ac": available}, {}, {"sort": [("make", -1)], "hint": "trim.ac_1"}
+
+        self.mock_collection.find.return_value = Mock(wraps=FakeCursor([{'_id': 1}]))
+        self.assertTrue(self.Car.with_ac().exists())
+        self.mock_collection.find.assert_called_once_with(
+            {"trim.ac": True}, {'_id': 1}, hint="trim.ac_1")
+        self.mock_collection.find.return_value.limit.assert_called_once_with(1)
+        self.mock_collection.find.return_value = FakeCursor([])
+        self.assertFalse(self.Car.with_ac(False).exists())
+
+    def test_scope_first(self):
+        @self.Car.scope
+        def with_ac(available=True):
+            return {"trim.ac": available}, {'make': 1}, {"sort": [("make", -1)], "limit": 5}
+
+        self.mock_collection.find_one.return_value = {'make': 'Peugeot'}
+        car = self.Car.with_ac().first()
+        self.assertIsInstance(car, self.Car)
+        self.assertEqual('Peugeot', car['make'])
+        self.mock_collection.find_one.assert_called_once_with(
+            {"trim.ac": True}, {'make': 1}, sort=[("make", -1)])
+        self.mock_collection.find_one.return_value = None
+        self.assertIsNone(self.Car.with_ac().first())
+
+    def test_scope_count(self):
+        @self.Car.scope
+        def with_ac(available=True):
+            return {"trim.ac": available}, {}, {"sort": [("make", -1)], "hint": "trim.ac_1"}
+
+        self.mock_collection.count_documents.return_value = 2
+        self.assertEqual(2, self.Car.with_ac().count())
+        self.mock_collection.count_documents.assert_called_with({"trim.ac": True}, hint="trim.ac_1")
+        self.Car.with_ac().count(limit=1, hint=[("trim.ac", 1)], maxTimeMS=100)
+        self.mock_collection.count_documents.assert_called_with(
+            {"trim.ac": True}, limit=1, hint=[("trim.ac", 1)], maxTimeMS=100)
+        self.assertFalse(self.mock_collection.find.called)
+
+    def _unpaid_scope_setup(self):
+        @self.Car.scope
+        def peugeot():
+            return {'make': 'Peugeot'}, {}, {'sort': [('model', 1)]}
+
+        self.ids = [ObjectId() for _ in range(5)]
+        self.mock_collection.find.return_value = FakeCursor([{'_id': id} for id in self.ids])
+        self.mock_collection.update_many.return_value = Mock(matched_count=2)
+        self.mock_collection.delete_many.return_value = Mock(deleted_count=2)
+        self.handler = Mock()
+        for event in ['will_update', 'did_update', 'will_remove', 'did_remove']:
+            self.Car.on(event, self.handler)
+
+    def test_scope_update_all(self):
+        self._unpaid_scope_setup()
+        self.assertEqual(2, self.Car.peugeot().update_all({'$set': {'doors': 3}}, upsert=True))
+        self.mock_collection.update_many.assert_called_once_with(
+            {'make': 'Peugeot'}, {'$set': {'doors': 3}}, upsert=True)
+        self.assertFalse(self.mock_collection.find.called)
+        self.assertFalse(self.handler.called)
+
+    def test_scope_update_all_in_batches(self):
+        self._unpaid_scope_setup()
+        update = {'$set': {'doors': 3}}
+        self.assertEqual(6, self.Car.peugeot().update_all(update, batch_size=2))
+        self.mock_collection.find.assert_called_once_with({'make': 'Peugeot'}, {'_id': 1})
+        self.assertEqual([call({'_id': {'$in': self.ids[:2]}}, update),
+                          call({'_id': {'$in': self.ids[2:4]}}, update),
+                          call({'_id': {'$in': self.ids[4:]}}, update)],
+                         self.mock_collection.update_many.call_args_list)
+        self.assertEqual(6, self.handler.call_count)
+        batch = self.handler.call_args[0][0]
+        self.assertIsInstance(batch, WriteBatch)
+        self.assertIs(self.Car, batch.model_class)
+        self.assertEqual(self.ids[4:], batch)
+        self.assertEqual(update, self.handler.call_args[0][1])
+
+    def test_scope_delete_all(self):
+        self._unpaid_scope_setup()
+        self.assertEqual(2, self.Car.peugeot().delete_all())
+        self.mock_collection.delete_many.assert_called_once_with({'make': 'Peugeot'})
+        self.assertFalse(self.handler.called)
+
+    def test_scope_delete_all_in_batches(self):
+        self._unpaid_scope_setup()
+        self.assertEqual(4, self.Car.peugeot().delete_all(batch_size=3))
+        self.assertEqual([call({'_id': {'$in': self.ids[:3]}}),
+                          call({'_id': {'$in': self.ids[3:]}})],
+                         self.mock_collection.delete_many.call_args_list)
+        self.assertEqual([call(self.ids[:3]), call(self.ids[:3]),
+                          call(self.ids[3:]), call(self.ids[3:])],
+                         self.handler.call_args_list)
+
+    def test_scope_writes_invalidate_caches(self):
+        cache = self._enable_cache()
+        self._unpaid_scope_setup()
+        self.ids[0] = self.oid
+        self.mock_collection.find.return_value = FakeCursor([{'_id': id} for id in self.ids])
+        self.Car.find_by_id(self.oid)
+        self.Car.peugeot().update_all({'$set': {'doors': 3}})
+        self.assertIsNotNone(cache.get(self.Car._document_cache_key(self.oid)))
+        self.Car.peugeot().update_all({'$set': {'doors': 3}}, batch_size=2)
+        self.assertIsNone(cache.get(self.Car._document_cache_key(self.oid)))
+
+    def test_scope_writes_invalidate_cached_scopes(self):
+        self._cached_scope_setup()
+        self.mock_collection.update_many.return_value = Mock(matched_count=1)
+        list(self.Car.peugeot().cached())
+        self.Car.peugeot().update_all({'$set': {'doors': 3}})
+        list(self.Car.peugeot().cached())
+        self.assertEqual(2, self.mock_collection.find.call_count)
+
+    def test_find_chunks(self):
+        cursor = Mock(wraps=FakeCursor([{'make': str(i)} for i in range(5)]))
+        self.mock_collection.find.return_value = cursor
+        chunks = list(self.Car.find({'make': 'Peugeot'}).chunks(2))
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual(['0', '1', '2', '3', '4'], [car['make'] for chunk in chunks for car in chunk])
+        self.assertIsInstance(chunks[0][0], self.Car)
+        cursor.batch_size.assert_called_once_with(2)
+
+    def test_find_chunks_without_results(self):
+        self.mock_collection.find.return_value = FakeCursor([])
+        self.assertEqual([], list(self.Car.find().chunks(10)))
+
+    def test_find_chunks_rejects_invalid_size(self):
+        self.mock_collection.find.return_value = FakeCursor([])
+        with self.assertRaises(ValueError):
+            list(self.Car.find().chunks(0))
+
+    def test_scope_chunks(self):
+        @self.Car.scope
+        def with_ac(available=True):
+            return {"trim.ac": available}
+
+        self.mock_collection.find.return_value = FakeCursor([{'make': str(i)} for i in range(3)])
+        chunks = list(self.Car.with_ac().chunks(2))
+        self.assertEqual([['0', '1'], ['2']], [[car['make'] for car in chunk] for chunk in chunks])
+        self.mock_collection.find.assert_called_once_with({"trim.ac": True}, None)
+
+    def test_find_raw_cursor(self):
+        handler = Mock()
+        self.Car.on('did_find', handler)
+        docs = [{'make': 'Peugeot', 'model': '405'}, {'make': 'Peugeot', 'model': '205'}]
+        cursor = FakeCursor(docs)
+        self.mock_collection.find.return_value = cursor
+        raw = self.Car.find({'make': 'Peugeot'}, {'model': 1}).raw()
+        self.assertIs(cursor, raw)
+        results = list(raw)
+        self.assertEqual(docs, results)
+        self.assertNotIsInstance(results[0], self.Car)
+        self.assertFalse(handler.called)
+
+    def test_find_to_columns(self):
+        handler = Mock()
+        self.Car.on('did_init', handler)
+        self.mock_collection.find.return_value = FakeCursor([
+            {'trim': {'doors': 5}}, {'trim': {}}])
+        columns = self.Car.find({}, ['trim.doors']).to_columns(
+            ['trim.doors'], dtypes={'trim.doors': 'i'}, use_numpy=False)
+        self.assertEqual([5, 0], list(columns['trim.doors']))
+        self.assertEqual([False, True], list(columns.masks['trim.doors']))
+        self.assertFalse(handler.called)
+
+    def test_scope_raw(self):
+        @self.Car.scope
+        def hatchback():
+            return {"trim.doors": {"$in": [3, 5]}}, {"make": 1}, {"limit": 5}
+
+        self.mock_collection.find.return_value = FakeCursor([{'make': 'Peugeot'}])
+        self.assertEqual([{'make': 'Peugeot'}], list(self.Car.hatchback().raw()))
+        self.mock_collection.find.assert_called_once_with(
+            {"trim.doors": {"$in": [3, 5]}}, {"make": 1}, limit=5)
+
     def test_scope_with_other_decorator(self):
         outer_decorator = Mock()
 
@@ -648,6 +1515,96 @@ class TestModel(TestCase):
         self.assertEquals(STANDARD_SCOPES + [scope_a], CarA.scopes)
         self.assertEquals(STANDARD_SCOPES + [scope_b], CarB.scopes)
 
+    def test_models_have_their_own_scope_builder_classes(self):
+        CarA = create_model(car_schema, Mock())
+        CarB = create_model(car_schema, Mock())
+
+        @CarA.scope
+        def blue():
+            return {"colour": "blue"}
+
+        @CarB.scope
+        def red():
+            return {"colour": "red"}
+
+        builder = CarA.blue()
+        self.assertIsInstance(builder, ScopeBuilder)
+        self.assertIsNot(ScopeBuilder, type(builder))
+        self.assertIs(type(builder), type(builder.where({'make': 'Peugeot'})))
+        self.assertFalse(hasattr(ScopeBuilder, 'blue'))
+        self.assertFalse(hasattr(type(CarB.red()), 'blue'))
+        self.assertFalse(hasattr(type(builder), 'red'))
+
+    def test_scopes_registered_later_can_be_chained_from_earlier_builders(self):
+        @self.Car.scope
+        def peugeot():
+            return {"make": "Peugeot"}
+
+        builder = self.Car.peugeot()
+
+        @self.Car.scope
+        def five_door():
+            return {"trim.doors": 5}
+
+        self.assertEqual({"make": "Peugeot", "trim.doors": 5}, builder.five_door().query)
+
+    def test_ensure_indexes(self):
+        indexes = [Index('make'), Index([('make', 1), ('model', -1)], unique=True)]
+        Car = create_model(car_schema, self.mock_collection, indexes=indexes)
+        self.assertEqual(indexes, Car.indexes)
+        self.assertEqual([], self.Car.indexes)
+        self.mock_collection.create_indexes.side_effect = \
+            lambda models: [models[0].document['name']]
+        self.assertEqual(['make_1', 'make_1_model_-1'], Car.ensure_indexes())
+        self.assertEqual(2, self.mock_collection.create_indexes.call_count)
+        created = [c[0][0][0].document for c in self.mock_collection.create_indexes.call_args_list]
+        self.assertEqual(['make_1', 'make_1_model_-1'], sorted(doc['name'] for doc in created))
+        self.assertEqual([], self.Car.ensure_indexes())
+
+    def test_explain_scope(self):
+        Car = create_model(car_schema, self.mock_collection,
+                           indexes=[Index([('make', 1), ('model', 1)])])
+
+        @Car.scope
+        def by_make(make):
+            return {'make': make}, {}, {'sort': [('model', 1)]}
+
+        cursor = Mock()
+        cursor.explain.return_value = {'queryPlanner': {'winningPlan': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}}
+        self.mock_collection.find.return_value = cursor
+        report = Car.by_make('Peugeot').explain(strict=True)
+        self.assertEqual({'make': 'Peugeot'}, report['query'])
+        self.assertEqual([('model', 1)], report['sort'])
+        self.assertIs(Car.indexes[0], report['index'])
+        self.assertEqual(['FETCH', 'IXSCAN'], report['stages'])
+        self.assertFalse(report['collscan'])
+
+        @Car.scope
+        def by_id(id):
+            return {'_id': id}
+
+        @Car.scope
+        def by_model(model):
+            return {'model': model}
+
+        self.assertEqual('_id_', Car.by_id(1).explain()['index'].name)
+        self.assertIsNone(Car.by_model('406').explain()['index'])
+
+    def test_explain_scope_strict_raises_on_collection_scan(self):
+        @self.Car.scope
+        def by_colour(colour):
+            return {'colour': colour}
+
+        cursor = Mock()
+        cursor.explain.return_value = {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}
+        self.mock_collection.find.return_value = cursor
+        self.assertTrue(self.Car.by_colour('red').explain()['collscan'])
+        with self.assertRaises(UnindexedQueryException) as context:
+            self.Car.by_colour('red').explain(strict=True)
+        self.assertIsNone(context.exception.report['index'])
+        self.assertIn("scans the whole collection", str(context.exception))
+
     def test_find_one_from_offline_model(self):
         self.mock_collection.find_one.return_value = doc
         loaded_car = self.CarOffline.find_one({'make': 'Peugeot'})
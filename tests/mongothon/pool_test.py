@@ -0,0 +1,55 @@
+from mongothon import pool
+from unittest import TestCase
+import threading
+import time
+
+
+class TestPool(TestCase):
+
+    def test_shared_pool_is_created_once(self):
+        self.assertIs(pool.shared_pool(), pool.shared_pool())
+
+    def test_imap_returns_results_in_order(self):
+        def slow_square(n):
+            time.sleep(0.01 * (5 - n))
+            return n * n
+
+        self.assertEqual([0, 1, 4, 9, 16], list(pool.imap(slow_square, range(5), 3)))
+
+    def test_imap_runs_calls_on_pool_threads(self):
+        names = list(pool.imap(lambda n: threading.current_thread().name, range(3), 3))
+        self.assertNotIn(threading.current_thread().name, names)
+
+    def test_imap_limits_concurrent_calls(self):
+        lock = threading.Lock()
+        running = [0]
+        most = [0]
+
+        def call(n):
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        list(pool.imap(call, range(10), 2))
+        self.assertLessEqual(most[0], 2)
+
+    def test_imap_does_not_start_calls_once_dropped(self):
+        called = []
+        results = pool.imap(called.append, range(10), 2)
+        results.next()
+        results.close()
+        time.sleep(0.05)
+        self.assertLessEqual(len(called), 3)
+
+    def test_imap_raises_errors(self):
+        def fail(n):
+            if n == 1:
+                raise ValueError(n)
+            return n
+
+        results = pool.imap(fail, range(3), 2)
+        self.assertEqual(0, results.next())
+        self.assertRaises(ValueError, results.next)
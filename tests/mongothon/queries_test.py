@@ -1,8 +1,9 @@
-from mongothon.queries import ScopeBuilder
+from mongothon.queries import ScopeBuilder, SplitCursor, merge_lists, keyset_predicate
 from mongothon.scopes import where
 from unittest import TestCase
 from mock import Mock, call
 from .fake import FakeCursor
+from datetime import datetime
 
 
 class TestScopeBuilder(TestCase):
@@ -33,6 +34,30 @@ class TestScopeBuilder(TestCase):
         self.assertEquals({"thing": "blah"}, bldr2.query)
 
 
+    def test_scope_functions_are_not_set_on_the_builder_class(self):
+        def sample_scope():
+            return {"thing": "blah"}
+
+        bldr = ScopeBuilder(Mock(), [sample_scope]).sample_scope()
+        self.assertEquals({"thing": "blah"}, bldr.query)
+        self.assertFalse(hasattr(ScopeBuilder, 'sample_scope'))
+
+    def test_for_scopes_compiles_a_builder_class(self):
+        def scope_a():
+            """Scope A"""
+            return {"thing": "blah"}
+
+        def scope_b():
+            return {"woo": "ha"}
+
+        builder_class = ScopeBuilder.for_scopes([scope_a, scope_b], 'SampleScopeBuilder')
+        self.assertTrue(issubclass(builder_class, ScopeBuilder))
+        self.assertEqual('SampleScopeBuilder', builder_class.__name__)
+        self.assertEqual('Scope A', builder_class.scope_a.__doc__)
+        bldr = builder_class(Mock(), [scope_a, scope_b]).scope_a().scope_b()
+        self.assertIsInstance(bldr, builder_class)
+        self.assertEquals({"thing": "blah", "woo": "ha"}, bldr.query)
+
     def test_scope_builder_with_projection_and_options(self):
         mock_model = Mock()
 
@@ -93,6 +118,35 @@ class TestScopeBuilder(TestCase):
                                                     'someotherfield': 10}}},
                           bldr.query)
 
+    def test_chained_scopes_do_not_modify_shared_queries(self):
+        mock_model = Mock()
+        elem_match = {"$elemMatch": {'somefield': 1}}
+        in_list = {"$in": [1, 2]}
+
+        bldr = ScopeBuilder(mock_model, [where]).where({"thing": elem_match, "other": in_list})
+        first = bldr.where({"thing": {"$elemMatch": {'x': 2}}})
+        second = bldr.where({"other": {"$in": [3]}})
+        self.assertEquals({"thing": {"$elemMatch": {'somefield': 1, 'x': 2}},
+                           "other": {"$in": [1, 2]}}, first.query)
+        self.assertEquals({"thing": {"$elemMatch": {'somefield': 1}},
+                           "other": {"$in": [1, 2, 3]}}, second.query)
+        self.assertEquals({"thing": {"$elemMatch": {'somefield': 1}},
+                           "other": {"$in": [1, 2]}}, bldr.query)
+        self.assertEquals({"$elemMatch": {'somefield': 1}}, elem_match)
+        self.assertEquals({"$in": [1, 2]}, in_list)
+        # Subtrees which aren't merged into are shared rather than copied
+        self.assertIs(in_list["$in"], first.query["other"]["$in"])
+
+    def test_query_is_merged_once_when_needed(self):
+        mock_model = Mock()
+        scope_a = Mock(__name__='scope_a', return_value={"thing": "blah"})
+
+        bldr = ScopeBuilder(mock_model, [scope_a]).scope_a().scope_a()
+        self.assertIsNone(bldr._materialized)
+        bldr.cursor
+        self.assertIs(bldr.query, bldr.query)
+        mock_model.find.assert_called_once_with({"thing": "blah"}, None)
+
     def test_queries_combined_with_where_scope(self):
         mock_model = Mock()
 
@@ -225,7 +279,7 @@ class TestScopeBuilder(TestCase):
 
         bldr = ScopeBuilder(mock_model, [scope_a, scope_b])
         result = bldr.scope_a().scope_b()
-        self.assertEqual(result.count(), 2)
+        self.assertEqual(len(list(result)), 2)
         self.assertEqual(result.limit(1), cursor)
         mock_model.find.assert_called_once_with(
             {"thing": "blah", "woo": "ha"},
@@ -247,12 +301,12 @@ class TestScopeBuilder(TestCase):
         bldr = ScopeBuilder(mock_model, [scope_a, scope_b])
         result_a = bldr.scope_a()
 
-        self.assertEqual(result_a.count(), 2)
+        self.assertEqual(len(list(result_a)), 2)
         self.assertEqual(result_a[1], {'_id': 2})
         self.assertEqual(result_a.limit(1), cursor_a)
 
         result_b = result_a.scope_b()
-        self.assertEqual(result_b.count(), 1)
+        self.assertEqual(len(list(result_b)), 1)
         self.assertEqual(result_b[0], {'_id': 1})
         self.assertEqual(result_b.limit(1), cursor_b)
 
@@ -262,6 +316,67 @@ class TestScopeBuilder(TestCase):
         ], mock_model.find.mock_calls)
 
 
+    def test_paginate(self):
+        mock_model = Mock()
+        mock_model.find.return_value = FakeCursor([
+            {'_id': 1, 'created': datetime(2016, 1, 3)},
+            {'_id': 2, 'created': datetime(2016, 1, 2)},
+            {'_id': 3, 'created': datetime(2016, 1, 1)}])
+
+        def scope_a():
+            return {"thing": "blah"}, {"thing": 1}, {"skip": 10}
+
+        bldr = ScopeBuilder(mock_model, [scope_a]).scope_a()
+        page, token = bldr.paginate([('created', -1)], 2)
+        self.assertEqual([1, 2], [doc['_id'] for doc in page])
+        mock_model.find.assert_called_once_with(
+            {"thing": "blah"}, {"thing": 1, "created": 1, "_id": 1},
+            sort=[('created', -1), ('_id', -1)], limit=3)
+
+        mock_model.find.reset_mock()
+        mock_model.find.return_value = FakeCursor([{'_id': 3, 'created': datetime(2016, 1, 1)}])
+        page, token = bldr.paginate([('created', -1)], 2, after=token)
+        self.assertEqual([3], [doc['_id'] for doc in page])
+        self.assertIsNone(token)
+        mock_model.find.assert_called_once_with(
+            {"thing": "blah", "$and": [{"$or": [
+                {"created": {"$lt": datetime(2016, 1, 2)}},
+                {"created": datetime(2016, 1, 2), "_id": {"$lt": 2}}]}]},
+            {"thing": 1, "created": 1, "_id": 1},
+            sort=[('created', -1), ('_id', -1)], limit=3)
+
+    def test_paginate_merges_with_existing_and(self):
+        mock_model = Mock()
+        mock_model.find.return_value = FakeCursor([{'_id': 5}, {'_id': 6}])
+
+        def scope_a():
+            return {"$and": [{"a": 1}]}
+
+        bldr = ScopeBuilder(mock_model, [scope_a]).scope_a()
+        page, token = bldr.paginate([('_id', 1)], 1)
+        bldr.paginate([('_id', 1)], 1, after=token)
+        mock_model.find.assert_called_with(
+            {"$and": [{"a": 1}, {"_id": {"$gt": 5}}]}, None,
+            sort=[('_id', 1)], limit=2)
+        self.assertEqual({"$and": [{"a": 1}]}, bldr.query)
+
+    def test_paginate_rejects_bad_tokens(self):
+        mock_model = Mock()
+        mock_model.find.return_value = FakeCursor([{'_id': 5, 'a': 1}, {'_id': 6, 'a': 2}])
+        bldr = ScopeBuilder(mock_model, [])
+        page, token = bldr.paginate([('a', 1)], 1)
+        with self.assertRaises(ValueError):
+            bldr.paginate([('a', -1)], 1, after=token)
+        with self.assertRaises(ValueError):
+            bldr.paginate([('a', 1)], 1, after='not a token')
+
+    def test_keyset_predicate(self):
+        self.assertEqual({'a': {'$gt': 1}}, keyset_predicate([('a', 1)], [1]))
+        self.assertEqual({'$or': [{'a': {'$lt': 1}},
+                                  {'a': 1, 'b': {'$gt': 2}},
+                                  {'a': 1, 'b': 2, 'c': {'$lt': 3}}]},
+                         keyset_predicate([('a', -1), ('b', 1), ('c', -1)], [1, 2, 3]))
+
     def test_unpack_scope_with_just_query(self):
         bldr = ScopeBuilder(Mock(), [])
         query, projection, options = bldr.unpack_scope({"thing": "blah"})
@@ -294,3 +409,79 @@ class TestScopeBuilder(TestCase):
 
         with self.assertRaises(ValueError):
             bldr.unpack_scope(({}, {}, {}, {}))
+
+
+class TestMergeLists(TestCase):
+    def test_appends_new_items_in_order(self):
+        dest = [3, 1, 2]
+        merge_lists([2, 5, 4, 5, 1, 6], dest)
+        self.assertEqual([3, 1, 2, 5, 4, 6], dest)
+
+    def test_unhashable_items(self):
+        dest = [{"a": 1}, 1]
+        merge_lists([{"a": 1}, {"b": 2}, 1, [3], [3], 4], dest)
+        self.assertEqual([{"a": 1}, 1, {"b": 2}, [3], 4], dest)
+
+
+class TestSplitCursor(TestCase):
+    def setUp(self):
+        self.documents = [{'_id': i, 'n': i % 4, 'tags': [i, i + 1]} for i in range(10)]
+        self.model = Mock()
+        self.model.collection.find.side_effect = self.find
+        self.model.hydrate.side_effect = lambda document, partial: dict(document, hydrated=True)
+        self.builder_class = ScopeBuilder.for_scopes([where])
+        self.builder_class.split_in_threshold = 3
+
+    def find(self, query, projection, **options):
+        field, condition = [(field, condition) for field, condition in query.items()
+                            if isinstance(condition, dict)][0]
+        values = condition['$in']
+        results = [doc for doc in self.documents
+                   if set(doc[field] if isinstance(doc[field], list) else [doc[field]]) & set(values)]
+        for sort_field, direction in reversed(options.get('sort', [])):
+            results.sort(key=lambda doc: doc[sort_field], reverse=direction < 0)
+        if options.get('limit'):
+            results = results[:options['limit']]
+        return results
+
+    def test_scopes_with_long_in_lists_are_split_when_iterated(self):
+        scope = self.builder_class(self.model, [where]).where({'_id': {'$in': range(10)}, 'x': 1})
+        results = list(scope)
+        self.assertEqual(range(10), [doc['_id'] for doc in results])
+        self.assertTrue(all(doc['hydrated'] for doc in results))
+        self.assertEqual([call({'_id': {'$in': [0, 1, 2]}, 'x': 1}, None),
+                          call({'_id': {'$in': [3, 4, 5]}, 'x': 1}, None),
+                          call({'_id': {'$in': [6, 7, 8]}, 'x': 1}, None),
+                          call({'_id': {'$in': [9]}, 'x': 1}, None)],
+                         sorted(self.model.collection.find.mock_calls))
+        self.assertFalse(self.model.find.called)
+
+    def test_sort_skip_and_limit_apply_to_combined_results(self):
+        def sorted_page():
+            return ({'_id': {'$in': range(10)}}, {'n': 1},
+                    {'sort': [('n', -1), ('_id', 1)], 'skip': 2, 'limit': 4})
+
+        builder_class = ScopeBuilder.for_scopes([sorted_page])
+        builder_class.split_in_threshold = 3
+        scope = builder_class(self.model, [sorted_page]).sorted_page()
+        self.assertEqual([2, 6, 1, 5], [doc['_id'] for doc in scope])
+        self.model.collection.find.assert_called_with(
+            {'_id': {'$in': [9]}}, {'n': 1}, sort=[('n', -1), ('_id', 1)], limit=6)
+
+    def test_documents_matched_by_several_queries_are_returned_once(self):
+        scope = self.builder_class(self.model, [where]).where({'tags': {'$in': range(11)}})
+        self.assertEqual(range(10), sorted(doc['_id'] for doc in scope))
+
+    def test_short_in_lists_are_not_split(self):
+        self.model.find.return_value = FakeCursor([{'_id': 1}])
+        scope = self.builder_class(self.model, [where]).where({'_id': {'$in': [1, 2, 3]}})
+        self.assertEqual([{'_id': 1}], list(scope))
+        self.assertIs(self.model.find.return_value, scope.split())
+        self.assertFalse(self.model.collection.find.called)
+
+    def test_split_with_chunk_size(self):
+        scope = ScopeBuilder(self.model, [where]).where({'_id': {'$in': range(10)}})
+        cursor = scope.split(chunk_size=5, max_workers=2)
+        self.assertIsInstance(cursor, SplitCursor)
+        self.assertEqual(2, len(cursor.queries()))
+        self.assertEqual(range(10), [doc['_id'] for doc in cursor])
@@ -0,0 +1,171 @@
+from mongothon import create_model, Schema, Session, BulkSaveException
+from mongothon.session import current_session
+from unittest import TestCase
+from mock import Mock
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from .fake import FakeCursor
+
+
+car_schema = Schema({
+    "make":     {"type": basestring, "required": True},
+    "model":    {"type": basestring}
+})
+
+
+class TestSession(TestCase):
+
+    def setUp(self):
+        self.mock_collection = Mock()
+        self.mock_collection.name = "car"
+        self.Car = create_model(car_schema, self.mock_collection)
+        self.oid = ObjectId()
+        self.doc = {'_id': self.oid, 'make': 'Peugeot', 'model': '406'}
+
+    def tearDown(self):
+        self.Car.remove_all_handlers()
+
+    def test_no_session_by_default(self):
+        self.assertIsNone(current_session())
+        self.mock_collection.find_one.return_value = self.doc
+        self.assertIsNot(self.Car.find_by_id(self.oid), self.Car.find_by_id(self.oid))
+
+    def test_session_is_current_within_block(self):
+        with self.Car.session() as session:
+            self.assertIsInstance(session, Session)
+            self.assertIs(session, current_session())
+            with Session() as inner:
+                self.assertIs(inner, current_session())
+            self.assertIs(session, current_session())
+        self.assertIsNone(current_session())
+
+    def test_find_by_id_returns_loaded_instance_without_query(self):
+        self.mock_collection.find_one.return_value = self.doc
+        with self.Car.session() as session:
+            car = self.Car.find_by_id(self.oid)
+            self.assertIs(car, self.Car.find_by_id(str(self.oid)))
+            self.assertIs(car, self.Car.find_one({'_id': self.oid}))
+            self.assertIn(car, session)
+        self.mock_collection.find_one.assert_called_once_with({'_id': self.oid})
+
+    def test_other_queries_return_loaded_instances(self):
+        self.mock_collection.find_one.return_value = self.doc
+        self.mock_collection.find.return_value = FakeCursor([dict(self.doc), {'_id': ObjectId(), 'make': 'Volvo'}])
+        handler = Mock()
+        self.Car.on('did_find', handler)
+        with self.Car.session():
+            car = self.Car.find_by_id(self.oid)
+            car['model'] = '405'
+            cars = list(self.Car.find({'make': {'$exists': True}}))
+            self.assertIs(car, cars[0])
+            self.assertEqual('405', cars[0]['model'])
+            self.assertIs(car, self.Car.find_one({'make': 'Peugeot'}))
+        self.assertEqual(2, handler.call_count)
+
+    def test_models_loaded_with_projection_are_not_registered(self):
+        self.mock_collection.find_one.return_value = {'_id': self.oid, 'make': 'Peugeot'}
+        self.mock_collection.find.return_value = FakeCursor([{'_id': self.oid, 'make': 'Peugeot'}])
+        with self.Car.session() as session:
+            partial = self.Car.find_one({'make': 'Peugeot'}, {'make': 1})
+            self.assertNotIn(partial, session)
+            self.assertNotIn(list(self.Car.find({}, projection={'make': 1}))[0], session)
+            self.assertEqual(0, len(session))
+
+            self.mock_collection.find_one.return_value = self.doc
+            car = self.Car.find_by_id(self.oid)
+            self.assertIsNot(partial, car)
+            self.assertEqual('406', car['model'])
+
+    def test_loads_with_projection_do_not_reuse_loaded_instances(self):
+        self.mock_collection.find_one.return_value = self.doc
+        self.mock_collection.find.return_value = FakeCursor([{'_id': self.oid, 'make': 'Peugeot'}])
+        with self.Car.session() as session:
+            car = self.Car.find_by_id(self.oid)
+            partial = list(self.Car.find({}, {'make': 1}))[0]
+            self.assertIsNot(car, partial)
+            self.assertIs(car, session.get(self.Car, self.oid))
+
+    def test_saving_partial_model_does_not_register_it(self):
+        self.mock_collection.find_one.return_value = {'_id': self.oid, 'make': 'Peugeot'}
+        with self.Car.session() as session:
+            partial = self.Car.find_one({'make': 'Peugeot'}, {'make': 1})
+            partial['make'] = 'Volvo'
+            partial.save()
+            self.assertNotIn(partial, session)
+
+    def test_find_by_ids_only_queries_unknown_ids(self):
+        other_oid = ObjectId()
+        self.mock_collection.find_one.return_value = self.doc
+        self.mock_collection.find.return_value = FakeCursor([{'_id': other_oid, 'make': 'Volvo'}])
+        with self.Car.session():
+            car = self.Car.find_by_id(self.oid)
+            cars = self.Car.find_by_ids([self.oid, other_oid])
+            self.assertIs(car, cars[0])
+            self.assertEqual('Volvo', cars[1]['make'])
+        self.mock_collection.find.assert_called_once_with({'_id': {'$in': [other_oid]}})
+
+    def test_models_are_kept_per_class(self):
+        other_collection = Mock()
+        other_collection.name = "truck"
+        Truck = create_model(car_schema, other_collection)
+        self.mock_collection.find_one.return_value = self.doc
+        other_collection.find_one.return_value = self.doc
+        with self.Car.session():
+            self.assertIsInstance(self.Car.find_by_id(self.oid), self.Car)
+            self.assertIsInstance(Truck.find_by_id(self.oid), Truck)
+
+    def test_exit_flushes_changed_models(self):
+        self.mock_collection.find.return_value = FakeCursor([
+            dict(self.doc), {'_id': ObjectId(), 'make': 'Volvo'}])
+        with self.Car.session():
+            cars = list(self.Car.find())
+            cars[0]['model'] = '405'
+        self.mock_collection.bulk_write.assert_called_once_with(
+            [UpdateOne({'_id': self.oid}, {'$set': {'model': '405'}})], ordered=False)
+        self.assertFalse(cars[0].changed)
+
+    def test_exit_without_changes_does_not_write(self):
+        self.mock_collection.find_one.return_value = self.doc
+        with self.Car.session():
+            self.Car.find_by_id(self.oid)
+        self.assertFalse(self.mock_collection.bulk_write.called)
+
+    def test_exit_with_exception_discards_changes(self):
+        self.mock_collection.find_one.return_value = self.doc
+        with self.assertRaises(KeyError):
+            with self.Car.session():
+                self.Car.find_by_id(self.oid)['model'] = '405'
+                raise KeyError()
+        self.assertFalse(self.mock_collection.bulk_write.called)
+        self.assertIsNone(current_session())
+
+    def test_flush_saves_added_new_models(self):
+        with self.Car.session() as session:
+            car = session.add(self.Car(self.doc))
+            session.flush()
+            self.assertTrue(car.is_persisted())
+            self.assertEqual([], session.dirty())
+
+    def test_saved_models_are_registered(self):
+        with self.Car.session():
+            car = self.Car(self.doc)
+            car.save()
+            self.assertIs(car, self.Car.find_by_id(self.oid))
+        self.assertFalse(self.mock_collection.find_one.called)
+
+    def test_removed_models_are_discarded(self):
+        self.mock_collection.find_one.return_value = self.doc
+        with self.Car.session() as session:
+            car = self.Car.find_by_id(self.oid)
+            car.remove()
+            self.assertNotIn(car, session)
+            self.assertIsNot(car, self.Car.find_by_id(self.oid))
+
+    def test_exit_raises_flush_errors(self):
+        self.mock_collection.bulk_write.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 0, 'errmsg': 'duplicate key'}]})
+        with self.assertRaises(BulkSaveException) as context:
+            with self.Car.session() as session:
+                car = session.add(self.Car(self.doc))
+        self.assertEqual([car], context.exception.unsaved)